@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of randoms in apertures around many centers.
+
+NCENTERS centers are drawn in the footprint, with radii between 0.1 and
+1 degree, and SIZE random points are drawn in the aperture of each one
+with DR.aperture_random. The loop over the centers calling DR.box_random
+on the bounding box of each aperture and cutting by radius, topping up
+until it is full, is timed on LOOP_CENTERS of them and scaled to all.
+
+Usage: python benchmarks/bench_aperture.py [NCENTERS] [SIZE] [DR] [CATALOG]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import geometry
+
+LOOP_CENTERS = 100
+
+
+def box_loop(footprint, ra_c, dec_c, radius, size, seed):
+    """Points of each aperture from box_random in its bounding box."""
+    rng = np.random.default_rng(seed)
+    center = geometry.radec_to_xyz(ra_c, dec_c)
+    points = []
+    for i in range(len(ra_c)):
+        half = radius[i] / np.cos(
+            np.deg2rad(min(abs(dec_c[i]) + radius[i], 89.9))
+        )
+        box = (
+            (ra_c[i] - half) % 360,
+            (ra_c[i] + half) % 360,
+            max(dec_c[i] - radius[i], -90),
+            min(dec_c[i] + radius[i], 90),
+        )
+        found = []
+        while sum(len(ra) for ra, _ in found) < size:
+            ra, dec = footprint.box_random(
+                *box, size=size, seed=rng.integers(2**32)
+            )
+            cos = geometry.radec_to_xyz(ra, dec) @ center[i]
+            inside = cos >= np.cos(np.deg2rad(radius[i]))
+            found.append((ra[inside], dec[inside]))
+        points.append(np.concatenate([ra for ra, _ in found])[:size])
+    return points
+
+
+def main(ncenters="20000", size="100", dr="DR14", catalog="LRG_S"):
+    ncenters, size = int(ncenters), int(size)
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    ra_c, dec_c = footprint.sky_random(ncenters, seed=1)
+    radius = np.random.default_rng(2).uniform(0.1, 1.0, ncenters)
+    footprint.aperture_random(ra_c[:1], dec_c[:1], 1.0, 1)  # build the grid
+
+    start = time.perf_counter()
+    ra, _, _ = footprint.aperture_random(ra_c, dec_c, radius, size, seed=3)
+    t_aperture = time.perf_counter() - start
+
+    loop = slice(0, LOOP_CENTERS)
+    start = time.perf_counter()
+    box_loop(footprint, ra_c[loop], dec_c[loop], radius[loop], size, seed=3)
+    t_loop = (time.perf_counter() - start) * ncenters / LOOP_CENTERS
+
+    print(f"{dr} {catalog}, {ncenters} centers, {size} points each")
+    print(f"aperture_random {t_aperture:>9.2f} s ({len(ra)} points)")
+    print(f"box_random loop {t_loop:>9.2f} s (scaled from {LOOP_CENTERS})")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
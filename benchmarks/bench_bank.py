@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of serving random catalogs from a RandomBank versus drawing them.
+
+A bank of BANK_SIZE points is created in a temporary cache (build) and
+opened again (load). Then REQUESTS catalogs of each of SIZES points are
+drawn with different seeds by DR.sky_random and by the bank, and with the
+weights of half of the polygons lowered, which the bank follows by
+thinning its points.
+
+Usage: python benchmarks/bench_bank.py [BANK_SIZE] [DR] [CATALOG]
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import data
+
+SIZES = [1_000, 10_000, 100_000]
+
+REQUESTS = 10
+
+
+def timeit(func):
+    """Time of func in seconds, and its result."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def requests(sky_random, size):
+    """Mean time of REQUESTS catalogs of size points with other seeds."""
+    start = time.perf_counter()
+    for seed in range(REQUESTS):
+        sky_random(size, seed=seed)
+    return (time.perf_counter() - start) / REQUESTS
+
+
+def main(bank_size="10000000", dr="DR14", catalog="LRG_N"):
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    with tempfile.TemporaryDirectory() as tmp:
+        data.CACHE_PATH = pathlib.Path(tmp)
+        t_build, bank = timeit(
+            lambda: randomsdss.RandomBank(footprint, size=int(bank_size))
+        )
+        t_load, _ = timeit(
+            lambda: randomsdss.RandomBank(footprint, size=int(bank_size))
+        )
+        print(f"{dr} {catalog}, bank of {bank_size} points")
+        print(f"build {t_build:.2f} s, load {t_load:.4f} s")
+        print(
+            f"{'weights':>8} {'size':>8} {'sky_random [s]':>15}"
+            f" {'bank [s]':>9}"
+        )
+        for weights in ["bank", "lowered"]:
+            if weights == "lowered":
+                positive = np.asarray(footprint.weights, dtype=float) > 0
+                footprint.set_weights(
+                    lambda p: 0.5 * p.weight,
+                    polyids=footprint.polygons_.ids[positive][::2],
+                )
+            for size in SIZES:
+                t_fresh = requests(footprint.sky_random, size)
+                t_bank = requests(bank.sky_random, size)
+                print(
+                    f"{weights:>8} {size:>8} {t_fresh:>15.4f}"
+                    f" {t_bank:>9.4f}"
+                )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Cost per point of the redshift to comoving distance conversion.
+
+The cached table lookup of randomsdss.cosmology is timed against
+numpy.interp on the same table and against integrating the distance of
+each point with scipy.integrate.quad, which is only run on QUAD_SIZE
+points and extrapolated. The last part times DR.cartesian_random against
+sky_random with the same size, showing that the conversion adds little to
+the generation of the directions.
+
+Usage: python benchmarks/bench_cartesian.py [MAX_SIZE] [DR] [CATALOG]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import cosmology
+
+from scipy.integrate import quad
+
+SIZES = [10**6, 10**7, 10**8]
+
+QUAD_SIZE = 1_000
+
+SKY_SIZE = 100_000
+
+
+def timeit(func):
+    """Time of func in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def integrate(z, H0=70.0, Om0=0.3):
+    """Comoving distance of each redshift, integrated one by one."""
+    hubble_distance = cosmology.SPEED_OF_LIGHT / H0
+    return np.array(
+        [
+            hubble_distance
+            * quad(lambda x: (Om0 * (1 + x) ** 3 + 1 - Om0) ** -0.5, 0, zi)[0]
+            for zi in z
+        ]
+    )
+
+
+def main(max_size="100000000", dr="DR14", catalog="LRG_N"):
+    rng = np.random.default_rng(0)
+    t_build = timeit(lambda: cosmology.distance_table.__wrapped__())
+    table = cosmology.distance_table()
+    grid = np.arange(len(table.distance)) * table.step
+    z = rng.uniform(0, 1, QUAD_SIZE)
+    t_quad = timeit(lambda: integrate(z)) / QUAD_SIZE
+    print(f"table built in {1e3 * t_build:.1f} ms")
+    print(f"quad per point: {1e9 * t_quad:.0f} ns")
+    print(f"{'size':>10} {'table [ns]':>11} {'interp [ns]':>12}")
+    for size in SIZES:
+        if size > int(max_size):
+            break
+        z = rng.uniform(0, 1, size)
+        out = np.empty(size)
+        t_table = timeit(lambda: table(z, out=out)) / size
+        t_interp = timeit(lambda: np.interp(z, grid, table.distance)) / size
+        print(f"{size:>10} {1e9 * t_table:>11.1f} {1e9 * t_interp:>12.1f}")
+        z = out = None  # free them before the next size
+
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    sample = rng.normal(0.5, 0.1, 100_000)
+    t_sky = timeit(
+        lambda: footprint.sky_random(SKY_SIZE, seed=1, output="xyz")
+    )
+    t_cartesian = timeit(
+        lambda: footprint.cartesian_random(SKY_SIZE, sample, seed=1)
+    )
+    print(
+        f"{dr} {catalog}, {SKY_SIZE} points: sky_random {t_sky:.2f} s,"
+        f" cartesian_random {t_cartesian:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
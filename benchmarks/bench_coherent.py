@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of DR.polyid with and without the coherent order.
+
+The points are randoms of the footprint, either shuffled or sorted by
+DEC and RA as a catalog often is. For each order, the script times
+pymangle on the points as given and with coherent=True, which sorts them
+along a space-filling curve first and scatters the result back, unless
+geometry.is_coherent finds them already coherent. The time of the sort
+alone is shown too.
+
+Usage: python benchmarks/bench_coherent.py [DR] [CATALOG] [MAX_SIZE]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import geometry
+
+SIZES = [1_000_000, 10_000_000, 100_000_000]
+
+
+def timeit(func):
+    """Time of func in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(dr="DR14", catalog="LRG_N", max_size="100000000"):
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    rng = np.random.default_rng(0)
+    print(f"{dr} {catalog}: {footprint.npoly} polygons")
+    print(
+        f"{'size':>10} {'order':>9} {'pymangle [s]':>13}"
+        f" {'curve sort [s]':>15} {'coherent [s]':>13}"
+    )
+    for size in SIZES:
+        if size > int(max_size):
+            break
+        ra, dec = footprint.sky_random(size)
+        for order in ("shuffled", "sorted"):
+            if order == "sorted":
+                index = np.lexsort((ra, dec))
+                ra, dec = ra[index], dec[index]
+            else:
+                index = rng.permutation(size)
+                ra, dec = ra[index], dec[index]
+            index = None
+            t_mangle = timeit(lambda: footprint.polyid(ra, dec))
+            t_sort = timeit(lambda: geometry.curve_order(ra, dec))
+            t_coherent = timeit(
+                lambda: footprint.polyid(ra, dec, coherent=True)
+            )
+            print(
+                f"{size:>10} {order:>9} {t_mangle:>13.2f}"
+                f" {t_sort:>15.2f} {t_coherent:>13.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
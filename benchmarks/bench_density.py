@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of randoms following a density map versus rejection sampling.
+
+The density maps are log-normal-like fields of increasing contrast at
+NSIDE. For each one, SIZE points are drawn with the density argument of
+DR.sky_random and by drawing uniform randoms with pymangle and keeping
+each one with its polygon weight times its map value over the maximum of
+the map, as done when downsampling a catalog. The fraction of points in
+the pixels above the median density checks that both follow the same
+distribution.
+
+Usage: python benchmarks/bench_density.py [SIZE] [NSIDE] [DR] [CATALOG]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import geometry
+
+CONTRASTS = [0.2, 0.5, 1.0, 2.0]
+
+
+def timeit(func):
+    """Time of func in seconds, and its result."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def density_map(nside, contrast):
+    """Smooth positive map with a log amplitude of contrast."""
+    ra, dec = np.deg2rad(
+        geometry.healpix_to_radec(nside, np.arange(12 * nside**2))
+    )
+    field = np.sin(7 * ra) * np.cos(5 * dec) + 0.5 * np.sin(23 * ra + 11 * dec)
+    return np.exp(contrast * field)
+
+
+def rejection(footprint, density, size, rng):
+    """Downsample uniform randoms by weight and density; the number drawn."""
+    nside = int(np.sqrt(len(density) / 12))
+    scale = density.max()
+    kept, ndrawn = [], 0
+    while size > 0:
+        ra, dec = footprint.sky_random(4 * size)
+        ndrawn += len(ra)
+        value = density[geometry.radec_to_healpix(nside, ra, dec)]
+        value *= np.asarray(footprint.weight(ra, dec), dtype=float)
+        keep = rng.random(len(ra)) * scale < value
+        ra, dec = ra[keep][:size], dec[keep][:size]
+        kept.append((ra, dec))
+        size -= len(ra)
+    ra, dec = (np.concatenate(col) for col in zip(*kept))
+    return (ra, dec), ndrawn
+
+
+def high_fraction(density, ra, dec):
+    """Fraction of points in the pixels above the median of the map."""
+    nside = int(np.sqrt(len(density) / 12))
+    value = density[geometry.radec_to_healpix(nside, ra, dec)]
+    return np.mean(value > np.median(density))
+
+
+def main(size="100000", nside="256", dr="DR14", catalog="LRG_N"):
+    size, nside = int(size), int(nside)
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    rng = np.random.default_rng(0)
+    # build the cached pixels near the polygons before timing
+    footprint.sky_random(1, seed=0, density=np.ones(12 * nside**2))
+    print(f"{dr} {catalog}, {size} points, nside {nside}")
+    print(
+        f"{'contrast':>9} {'max/mean':>9} {'density [s]':>12}"
+        f" {'rejection [s]':>14} {'drawn':>10} {'high (d/r)':>14}"
+    )
+    for contrast in CONTRASTS:
+        density = density_map(nside, contrast)
+        t_density, direct = timeit(
+            lambda: footprint.sky_random(size, seed=1, density=density)
+        )
+        t_reject, (rejected, ndrawn) = timeit(
+            lambda: rejection(footprint, density, size, rng)
+        )
+        high = f"{high_fraction(density, *direct):.3f}/" + (
+            f"{high_fraction(density, *rejected):.3f}"
+        )
+        print(
+            f"{contrast:>9} {density.max() / density.mean():>9.2f}"
+            f" {t_density:>12.2f} {t_reject:>14.2f} {ndrawn:>10} {high:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of DR.edge_distance on random points of the footprint.
+
+For each step, the edges of the footprint are split and indexed once
+(build), and the distances of SIZES random points are computed for each
+maximum distance. The largest difference with the distances of the
+smallest step, on CHECK_SIZE points, shows the effect of the step.
+
+Usage: python benchmarks/bench_edges.py [MAX_SIZE] [DR] [CATALOG]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+
+SIZES = [1_000_000, 10_000_000]
+
+STEPS = [0.05, 0.01, 0.002]
+
+MAX_DISTANCES = [0.1, 1.0, 5.0]
+
+CHECK_SIZE = 10_000
+
+
+def timeit(func):
+    """Time of func in seconds, and its result."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(max_size="10000000", dr="DR16", catalog="eBOSS"):
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    sizes = [size for size in SIZES if size <= int(max_size)]
+    ra, dec = footprint.sky_random(sizes[-1])
+    print(f"{dr} {catalog}: {footprint.npoly} polygons")
+
+    check = slice(0, CHECK_SIZE)
+    reference = footprint.edge_distance(
+        ra[check], dec[check], max_distance=MAX_DISTANCES[-1], step=STEPS[-1]
+    )
+    print(
+        f"{'step':>6} {'build [s]':>10} {'pieces':>9} {'size':>10}"
+        f" {'max dist':>9} {'query [s]':>10} {'max error':>10}"
+    )
+    for step in STEPS:
+        footprint._edges.clear()
+        t_build, (_, pieces) = timeit(lambda: footprint._edge_tree(step))
+        for size in sizes:
+            for max_distance in MAX_DISTANCES:
+                t_query, distance = timeit(
+                    lambda: footprint.edge_distance(
+                        ra[:size], dec[:size], max_distance, step
+                    )
+                )
+                error = np.abs(
+                    distance[check] - np.minimum(reference, max_distance)
+                ).max()
+                print(
+                    f"{step:>6} {t_build:>10.2f} {len(pieces):>9} {size:>10}"
+                    f" {max_distance:>9} {t_query:>10.2f} {error:>10.5f}"
+                )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
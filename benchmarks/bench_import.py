@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Import time of randomsdss and cost of the deferred imports.
+
+Each measure runs in a new interpreter, as imports are cached. The
+import time is read from ``python -X importtime``; the test suite checks
+it against IMPORT_TIME_BUDGET. The first use of a footprint and of
+z_random pays for importing pymangle and scipy, shown separately.
+
+Usage: python benchmarks/bench_import.py [N_RUNS]
+"""
+
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+FIRST_USE = {
+    "DR14('LRG_N')": "randomsdss.DR14('LRG_N')",
+    "z_random": "randomsdss.z_random(np.linspace(0.1, 0.5, 100), 10)",
+}
+
+
+def import_times():
+    """Cumulative import time in seconds of the top level modules."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import randomsdss"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+    times = {}
+    for match in re.finditer(r"\|\s*(\d+) \|\s+(\S+)$", stderr, re.M):
+        times[match.group(2)] = int(match.group(1)) * 1e-6
+    return times
+
+
+def first_use_time(statement):
+    """Time in seconds of statement, run just after the import."""
+    code = (
+        "import time; import numpy as np; import randomsdss; "
+        f"start = time.perf_counter(); {statement}; "
+        "print(time.perf_counter() - start)"
+    )
+    stdout = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True
+    ).stdout
+    return float(stdout)
+
+
+def main(n_runs="5"):
+    n_runs = int(n_runs)
+    runs = [import_times() for _ in range(n_runs)]
+    print(f"median of {n_runs} runs")
+    for module in ("randomsdss", "numpy", "attr"):
+        median = np.median([run.get(module, np.nan) for run in runs])
+        print(f"import {module:<20} {median:8.3f} s")
+    for name, statement in FIRST_USE.items():
+        median = np.median([first_use_time(statement) for _ in range(n_runs)])
+        print(f"first {name:<21} {median:8.3f} s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
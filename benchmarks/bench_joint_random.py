@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of joint_random versus a KDE in several dimensions.
+
+The sample has correlated redshift, stellar mass and magnitude columns.
+For each number of properties and output size, joint_random is timed
+against scipy.stats.gaussian_kde. Its resample draws from the kernels
+directly, and the inverse CDF approach of z_random needs the KDE
+evaluated on a grid of BINS**ncols points, timed once per number of
+properties.
+
+Usage: python benchmarks/bench_joint_random.py [N_GALAXIES] [BINS]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+
+from scipy.stats import gaussian_kde
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+
+def timeit(func):
+    """Time of func in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(n_galaxies="100000", bins="32"):
+    rng = np.random.default_rng(0)
+    n_galaxies, bins = int(n_galaxies), int(bins)
+    z = rng.normal(0.5, 0.1, n_galaxies)
+    mass = 10 + 2 * z + rng.normal(0, 0.2, n_galaxies)
+    mag = -20 - mass / 5 + rng.normal(0, 0.3, n_galaxies)
+    weights = rng.uniform(0.5, 1.5, n_galaxies)
+    sample = [z, mass, mag]
+
+    print(f"{n_galaxies} galaxies, {bins} bins per property")
+    for ncols in (2, 3):
+        columns = sample[:ncols]
+        kde = gaussian_kde(np.array(columns), weights=weights)
+        grid = np.meshgrid(
+            *[np.linspace(c.min(), c.max(), bins) for c in columns]
+        )
+        t_grid = timeit(lambda: kde(np.array([g.ravel() for g in grid])))
+        print(f"{ncols} columns: KDE on the grid {t_grid:.3f} s")
+        print(f"{'size':>10} {'joint [s]':>10} {'kde resample [s]':>17}")
+        for size in SIZES:
+            t_joint = timeit(
+                lambda: randomsdss.joint_random(
+                    columns, size, weights=weights, bins=bins, seed=1
+                )
+            )
+            t_kde = timeit(lambda: kde.resample(size, seed=1))
+            print(f"{size:>10} {t_joint:>10.3f} {t_kde:>17.3f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Throughput of masking a catalog file to file.
+
+A structured .npy catalog of SIZE rows with RA, DEC and a few other
+columns is written to a temporary directory. It is masked by loading it
+whole, calling DR.polyid_and_weight and saving a new array, and with
+masking.mask_catalog for each number of processes in JOBS. The rows per
+second of each one are shown.
+
+Usage: python benchmarks/bench_mask.py [SIZE] [DR] [CATALOG]
+"""
+
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import masking
+
+JOBS = [1, 2, 4, 8]
+
+EXTRA_COLUMNS = ["z", "mag_g", "mag_r", "mag_i"]
+
+
+def in_memory(path, output, footprint):
+    """Mask the whole catalog at once."""
+    table = np.load(path)
+    pid, weight = footprint.polyid_and_weight(table["ra"], table["dec"])
+    dtype = table.dtype.descr + [("polyid", "i8"), ("weight", "f8")]
+    masked = np.empty(len(table), dtype=dtype)
+    for name in table.dtype.names:
+        masked[name] = table[name]
+    masked["polyid"], masked["weight"] = pid, weight
+    np.save(output, masked)
+
+
+def main(size="10000000", dr="DR14", catalog="LRG_N"):
+    size = int(size)
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    rng = np.random.default_rng(0)
+    names = ["ra", "dec"] + EXTRA_COLUMNS
+    table = np.empty(size, dtype=[(name, "f8") for name in names])
+    ra, dec = footprint.sky_random(size // 2, seed=1)
+    table["ra"] = np.concatenate([ra, rng.uniform(0, 360, size - len(ra))])
+    table["dec"] = np.concatenate([dec, rng.uniform(-90, 90, size - len(ra))])
+    for name in EXTRA_COLUMNS:
+        table[name] = rng.random(size)
+
+    print(f"{dr} {catalog}, {size} rows")
+    print(f"{'method':>12} {'time [s]':>9} {'rows/s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = pathlib.Path(tmp) / "catalog.npy"
+        output = pathlib.Path(tmp) / "masked.npy"
+        np.save(path, table)
+        table = ra = dec = None  # free them before masking
+
+        start = time.perf_counter()
+        in_memory(path, output, footprint)
+        elapsed = time.perf_counter() - start
+        print(f"{'in memory':>12} {elapsed:>9.2f} {size / elapsed:>10.0f}")
+
+        for n_jobs in JOBS:
+            if n_jobs > (os.cpu_count() or 1):
+                break
+            report = masking.mask_catalog(
+                path,
+                output,
+                [footprint],
+                columns=["polyid", "weight"],
+                n_jobs=n_jobs,
+                overwrite=True,
+            )
+            print(
+                f"{f'{n_jobs} jobs':>12} {report['seconds']:>9.2f}"
+                f" {report['rows_per_second']:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
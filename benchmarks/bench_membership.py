@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of FootprintSet.membership versus one contains call per footprint.
+
+Every footprint of PLY_PATH whose file is available is added to the set.
+The points are half uniform on the sky and half inside the first
+footprint. The first membership call also builds the grid of polygons of
+each footprint, shown separately.
+
+Usage: python benchmarks/bench_membership.py [N_POINTS] [MAX_WORKERS]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import store
+from randomsdss.data import PLY_PATH
+
+
+def main(n_points="1000000", max_workers="0"):
+    n_points, max_workers = int(n_points), int(max_workers) or None
+    footprints = [
+        randomsdss.DR(dr=dr, catalog=catalog)
+        for dr, catalogs in PLY_PATH.items()
+        for catalog in catalogs
+        if store.is_available(dr, catalog)
+    ]
+    footprint_set = randomsdss.FootprintSet(footprints)
+    print(f"{len(footprints)} footprints: {', '.join(footprint_set.names)}")
+
+    rng = np.random.default_rng(0)
+    half = n_points // 2
+    ra, dec = footprints[0].sky_random(n_points - half, seed=1)
+    ra = np.concatenate([ra, rng.uniform(0.0, 360.0, half)])
+    sin_dec = rng.uniform(-1.0, 1.0, half)
+    dec = np.concatenate([dec, np.rad2deg(np.arcsin(sin_dec))])
+
+    start = time.perf_counter()
+    footprint_set.membership(ra[:1], dec[:1])
+    print(f"build grids {time.perf_counter() - start:8.3f} s")
+
+    start = time.perf_counter()
+    for footprint in footprints:
+        footprint.contains(ra, dec)
+    loop = time.perf_counter() - start
+    start = time.perf_counter()
+    footprint_set.membership(ra, dec, polyid=True, max_workers=max_workers)
+    single = time.perf_counter() - start
+    print(f"{n_points} points")
+    print(f"contains per footprint {loop:8.3f} s")
+    print(f"membership             {single:8.3f} s")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
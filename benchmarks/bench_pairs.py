@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of the angular RR pair counts versus a naive O(N^2) count.
+
+The randoms are drawn in the footprint as unit vectors. Up to NAIVE_MAX_SIZE
+points, the counts of pairs.count_pairs are checked against the histogram
+of all the separations, and both are timed. Above it, only count_pairs is
+timed, with the randoms in memory-mapped files to show that the count
+only holds two blocks in memory.
+
+Usage: python benchmarks/bench_pairs.py [DR] [CATALOG] [MAX_SIZE] [WORKERS]
+"""
+
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import pairs
+
+SIZES = [1_000, 5_000, 100_000, 1_000_000, 10_000_000]
+
+NAIVE_MAX_SIZE = 5_000
+
+BINS = np.logspace(-2, 0, 11)
+
+
+def timeit(func):
+    """Time of func in seconds, and its result."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def naive(xyz):
+    """Counts of all the pairs, from the matrix of their separations."""
+    theta = np.degrees(np.arccos(np.clip(xyz @ xyz.T, -1, 1)))
+    upper = np.triu(np.ones(theta.shape, dtype=bool), 1)
+    return np.histogram(theta[upper], BINS)[0]
+
+
+def main(dr="DR14", catalog="LRG_N", max_size="10000000", workers=None):
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    max_size = int(max_size)
+    workers = workers and int(workers)
+    pairs.count_pairs(np.eye(3), BINS)  # import scipy beforehand
+    print(f"{dr} {catalog}, bins from {BINS[0]} to {BINS[-1]} deg")
+    print(f"{'size':>10} {'naive [s]':>10} {'pairs [s]':>10} {'RR':>14}")
+    for size in SIZES:
+        if size > max_size:
+            break
+        if size <= NAIVE_MAX_SIZE:
+            xyz = np.column_stack(
+                footprint.sky_random(size, seed=1, output="xyz")
+            )
+            t_naive, expected = timeit(lambda: naive(xyz))
+            t_pairs, counts = timeit(
+                lambda: pairs.count_pairs(xyz, BINS, max_workers=workers)
+            )
+            assert np.array_equal(counts, expected)
+        else:
+            t_naive = np.nan
+            with tempfile.TemporaryDirectory() as tmp:
+                out = [
+                    np.lib.format.open_memmap(
+                        f"{tmp}/{axis}.npy", "w+", float, (size,)
+                    )
+                    for axis in "xyz"
+                ]
+                footprint.sky_random(size, seed=1, output="xyz", out=out)
+                t_pairs, counts = timeit(
+                    lambda: pairs.count_pairs(out, BINS, max_workers=workers)
+                )
+                del out
+        print(
+            f"{size:>10} {t_naive:>10.3f} {t_pairs:>10.3f}"
+            f" {counts.sum():>14}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
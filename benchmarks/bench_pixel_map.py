@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time and accuracy of DR.to_pixel_map versus histogramming randoms.
+
+For each nside, the covered fraction of every pixel is computed with
+to_pixel_map (without the cache) and from the histogram of sky_random
+points, scaled by the area of the footprint. Both are compared with the
+map at REFERENCE_LEVEL sub-pixels, taking the RMS error over the pixels
+it covers.
+
+Usage: python benchmarks/bench_pixel_map.py [DR] [CATALOG] [MAX_NSIDE]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import geometry
+
+NSIDES = [64, 128, 256, 512, 1024]
+
+LEVELS = [1, 2, 3]
+
+REFERENCE_LEVEL = 5
+
+N_RANDOMS = [1_000_000, 10_000_000]
+
+
+def timeit(func):
+    """Time of func in seconds, and its result."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def rms(values, reference):
+    """RMS difference over the pixels covered in the reference."""
+    covered = reference > 0
+    return np.sqrt(np.mean((values[covered] - reference[covered]) ** 2))
+
+
+def monte_carlo(footprint, nside, size, area):
+    """Covered fraction of each pixel from the histogram of randoms."""
+    counts = np.zeros(12 * nside**2)
+    for start in range(0, size, randomsdss.CHUNK_SIZE * 16):
+        n = min(randomsdss.CHUNK_SIZE * 16, size - start)
+        ra, dec = footprint.sky_random(n)
+        pixels = geometry.radec_to_healpix(nside, ra, dec)
+        counts += np.bincount(pixels, minlength=len(counts))
+    pixel_area = 4 * np.pi * np.rad2deg(1) ** 2 / len(counts)
+    return counts / size * area / pixel_area
+
+
+def main(dr="DR14", catalog="LRG_N", max_nside="1024"):
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    print(f"{dr} {catalog}: {footprint.npoly} polygons")
+    print(f"{'nside':>6} {'method':>16} {'time [s]':>9} {'rms':>9}")
+    for nside in NSIDES:
+        if nside > int(max_nside):
+            break
+        reference, _ = footprint.to_pixel_map(
+            nside, level=REFERENCE_LEVEL, cache=False
+        )
+        pixel_area = 4 * np.pi * np.rad2deg(1) ** 2 / len(reference)
+        area = reference.sum() * pixel_area
+        for level in LEVELS:
+            elapsed, (fraction, _) = timeit(
+                lambda: footprint.to_pixel_map(nside, level=level, cache=False)
+            )
+            error = rms(fraction, reference)
+            print(
+                f"{nside:>6} {f'level {level}':>16} {elapsed:>9.2f}"
+                f" {error:>9.4f}"
+            )
+        for size in N_RANDOMS:
+            elapsed, fraction = timeit(
+                lambda: monte_carlo(footprint, nside, size, area)
+            )
+            error = rms(fraction, reference)
+            print(
+                f"{nside:>6} {f'{size:.0e} randoms':>16} {elapsed:>9.2f}"
+                f" {error:>9.4f}"
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Latency and throughput of the local server versus in-process calls.
+
+A server is started in a subprocess with the footprint already loaded.
+For each request size the script measures the median latency of
+sky_random and contains, in process and through the client, and the
+throughput of several client threads sending requests at once. The
+start-up cost that the server saves, loading the footprint, is shown
+first.
+
+Usage: python benchmarks/bench_server.py [DR] [CATALOG] [N_CLIENTS]
+"""
+
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import randomsdss
+from randomsdss import server
+
+SIZES = [100, 10_000]
+
+N_REQUESTS = 10
+
+
+def start_server(dr, catalog, socket_path):
+    """Start a server in a subprocess and wait until it answers."""
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "randomsdss.cli",
+            "serve",
+            "--footprint",
+            f"{dr}/{catalog}",
+            "--unix-socket",
+            socket_path,
+        ],
+        stdout=subprocess.PIPE,
+    )
+    process.stdout.readline()
+    return process
+
+
+def latency(func, n_requests=N_REQUESTS):
+    """Median time of func in seconds."""
+    times = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def throughput(func, n_clients, n_requests=N_REQUESTS):
+    """Requests per second of n_clients threads calling func."""
+    with ThreadPoolExecutor(n_clients) as executor:
+        start = time.perf_counter()
+        futures = [
+            executor.submit(func) for _ in range(n_clients * n_requests)
+        ]
+        for future in futures:
+            future.result()
+        return n_clients * n_requests / (time.perf_counter() - start)
+
+
+def main(dr="DR14", catalog="LRG_N", n_clients="4"):
+    n_clients = int(n_clients)
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = f"{tmp}/randomsdss.sock"
+        process = start_server(dr, catalog, socket_path)
+        try:
+            client = server.Client(f"unix://{socket_path}")
+
+            start = time.perf_counter()
+            local = randomsdss.DR(dr=dr, catalog=catalog)
+            load = time.perf_counter() - start
+            start = time.perf_counter()
+            remote = client.DR(dr, catalog)
+            connect = time.perf_counter() - start
+            print(
+                f"{dr} {catalog}: load {load:.4f} s, connect {connect:.4f} s"
+            )
+
+            print(
+                f"{'request':>18} {'size':>8} {'local [ms]':>11} "
+                f"{'server [ms]':>12} {'server req/s':>13}"
+            )
+            rng = np.random.default_rng(0)
+            for size in SIZES:
+                ra, dec = 360 * rng.random(size), 90 * rng.random(size)
+                requests = {
+                    "sky_random": lambda fp: fp.sky_random(size),
+                    "contains": lambda fp: fp.contains(ra, dec),
+                }
+                for name, request in requests.items():
+                    t_local = latency(lambda: request(local))
+                    t_remote = latency(lambda: request(remote))
+                    rate = throughput(lambda: request(remote), n_clients)
+                    print(
+                        f"{name:>18} {size:>8} {1e3 * t_local:>11.2f} "
+                        f"{1e3 * t_remote:>12.2f} {rate:>13.1f}"
+                    )
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Number of polygons, load and query time of simplified footprints.
+
+Every footprint of PLY_PATH whose file is available is simplified, keeping
+the zero weight polygons (as DR(simplified=True) does) and dropping them.
+The query time is that of DR.contains on uniform points of the sky.
+
+Usage: python benchmarks/bench_simplify.py [N_POINTS]
+"""
+
+import pathlib
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from pymangle import Mangle
+
+from randomsdss import geometry, store
+from randomsdss.data import PLY_PATH
+
+
+def measure(path, ra, dec):
+    """Load and contains time of a .ply file, and its number of polygons."""
+    start = time.perf_counter()
+    mangle = Mangle(str(path))
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    mangle.contains(ra, dec)
+    query = time.perf_counter() - start
+    return mangle.npoly, load, query
+
+
+def main(n_points="1000000"):
+    rng = np.random.default_rng(0)
+    n_points = int(n_points)
+    ra = rng.uniform(0.0, 360.0, n_points)
+    dec = np.rad2deg(np.arcsin(rng.uniform(-1.0, 1.0, n_points)))
+
+    print(f"contains of {n_points} points")
+    print(
+        f"{'footprint':>12} {'version':>16} {'npoly':>7} {'simplify [s]':>13}"
+        f" {'load [s]':>9} {'query [s]':>10}"
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        for dr, catalogs in PLY_PATH.items():
+            for catalog in catalogs:
+                if not store.is_available(dr, catalog):
+                    continue
+                path = store.ply_file(dr, catalog)
+                name = f"{dr}/{catalog}"
+                npoly, load, query = measure(path, ra, dec)
+                print(
+                    f"{name:>12} {'original':>16} {npoly:>7} {'':>13}"
+                    f" {load:>9.3f} {query:>10.3f}"
+                )
+                for drop in (False, True):
+                    start = time.perf_counter()
+                    polygons = geometry.simplify(
+                        geometry.read_ply(path), drop_zero_weight=drop
+                    )
+                    elapsed = time.perf_counter() - start
+                    out = pathlib.Path(tmp) / f"{dr}.{catalog}.{drop}.ply"
+                    geometry.write_ply(polygons, out)
+                    npoly, load, query = measure(out, ra, dec)
+                    version = "drop zero weight" if drop else "simplified"
+                    print(
+                        f"{name:>12} {version:>16} {npoly:>7} {elapsed:>13.2f}"
+                        f" {load:>9.3f} {query:>10.3f}"
+                    )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Variance of the RR pair counts versus catalog size for each sky method.
+
+For every method and size, several catalogs are generated with different
+seeds and the normalized pair counts RR(theta) / (N (N - 1)) are measured
+in a few angular bins. The scatter between seeds is the shot noise of the
+random catalog, which is what forces large random catalogs.
+
+Usage: python benchmarks/bench_sky_methods.py [DR] [CATALOG]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss.geometry import radec_to_xyz
+
+from scipy.spatial import cKDTree
+
+SIZES = [2_000, 8_000, 32_000]
+
+N_SEEDS = 10
+
+THETA = np.array([0.5, 1.0, 2.0, 4.0])  # degrees
+
+
+def rr_counts(ra, dec):
+    """Normalized RR pair counts in the THETA bins."""
+    tree = cKDTree(radec_to_xyz(ra, dec))
+    chord = 2 * np.sin(np.deg2rad(THETA) / 2)
+    pairs = tree.count_neighbors(tree, chord) - len(ra)
+    return np.diff(pairs) / (len(ra) * (len(ra) - 1.0))
+
+
+def main(dr="DR14", catalog="LRG_N"):
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    print(f"{dr} {catalog}: relative std of RR between {N_SEEDS} seeds")
+    print(f"{'method':>10} {'size':>7} {'time [s]':>9}  bins " + str(THETA))
+    for method in randomsdss.SKY_METHODS:
+        for size in SIZES:
+            start = time.perf_counter()
+            rr = []
+            for seed in range(N_SEEDS):
+                ra, dec = footprint.sky_random(size, seed=seed, method=method)
+                rr.append(rr_counts(ra, dec))
+            elapsed = (time.perf_counter() - start) / N_SEEDS
+            rel_std = np.std(rr, axis=0) / np.mean(rr, axis=0)
+            print(
+                f"{method:>10} {size:>7} {elapsed:>9.3f}  "
+                + " ".join(f"{v:.2e}" for v in rel_std)
+            )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
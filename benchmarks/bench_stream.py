@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of growing a random catalog with a RandomStream.
+
+A catalog of SIZE points is grown by each step of STEPS, either drawing
+the whole larger catalog again with DR.sky_random and a seed, or drawing
+only the new points with RandomStream.extend, which also draws again the
+first points of the block where the catalog ends. The grown catalogs are
+checked against the stream drawn in one go.
+
+Usage: python benchmarks/bench_stream.py [SIZE] [BLOCK_SIZE] [DR] [CATALOG]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+
+STEPS = [0.1, 0.5, 1.0]
+
+
+def timeit(func):
+    """Time of func in seconds, and its result."""
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(size="1000000", block_size="262144", dr="DR14", catalog="LRG_N"):
+    size = int(size)
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    stream = randomsdss.RandomStream(footprint, 42, block_size)
+    existing = stream.points(0, size)
+    print(f"{dr} {catalog}, catalog of {size} points, blocks of {block_size}")
+    print(f"{'extra':>10} {'regenerate [s]':>15} {'extend [s]':>11}")
+    for step in STEPS:
+        extra = int(step * size)
+        t_full, _ = timeit(
+            lambda: footprint.sky_random(size + extra, seed=42)
+        )
+        t_extend, new = timeit(lambda: stream.extend(existing, extra))
+        expected = stream.points(size, size + extra)
+        assert all(np.array_equal(a, b) for a, b in zip(new, expected))
+        print(f"{extra:>10} {t_full:>15.2f} {t_extend:>11.2f}")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Cost of updating the weights of some polygons.
+
+For each number of polygons changed, the script times DR.set_weights with
+polyids, which updates the sampling table in place, against replacing the
+whole weights array and rebuilding the table. The update of the table
+alone is shown too, as pymangle copies the whole array of weights in both
+cases.
+
+Usage: python benchmarks/bench_weights.py [DR] [CATALOG] [N_REPEATS]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+from randomsdss import SamplingTable
+
+N_CHANGED = [1, 10, 100, 1_000, 10_000]
+
+
+def timeit(func, n_repeats):
+    """Median time of func in seconds."""
+    times = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+def main(dr="DR14", catalog="LRG_N", n_repeats="20"):
+    n_repeats = int(n_repeats)
+    footprint = randomsdss.DR(dr=dr, catalog=catalog)
+    footprint.sampling_table_, footprint.polygons_  # build them beforehand
+    rng = np.random.default_rng(0)
+    print(f"{dr} {catalog}: {footprint.npoly} polygons")
+    print(
+        f"{'changed':>8} {'full [ms]':>10} {'partial [ms]':>13}"
+        f" {'rebuild table [ms]':>19} {'update table [ms]':>18}"
+    )
+    for n_changed in N_CHANGED:
+        if n_changed > footprint.npoly:
+            break
+        positions = rng.choice(footprint.npoly, n_changed, replace=False)
+        polyids = footprint.polygons_.ids[positions]
+        values = rng.random(n_changed)
+
+        def full():
+            weights = footprint.weights
+            weights[positions] = values
+            footprint.set_weights(weights)
+            footprint.sampling_table_
+
+        t_full = timeit(full, n_repeats)
+        t_partial = timeit(
+            lambda: footprint.set_weights(values, polyids=polyids), n_repeats
+        )
+        table = footprint.sampling_table_
+        t_rebuild = timeit(
+            lambda: SamplingTable.from_mangle(footprint.mangle_), n_repeats
+        )
+        t_update = timeit(
+            lambda: table.update(positions, table.values[positions]),
+            n_repeats,
+        )
+        print(
+            f"{n_changed:>8} {1e3 * t_full:>10.3f} {1e3 * t_partial:>13.3f}"
+            f" {1e3 * t_rebuild:>19.3f} {1e3 * t_update:>18.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+"""Time of each z_random method as a function of the number of points.
+
+The sample is a weighted set of normal redshifts. The kde method evaluates
+the KDE on a grid as large as the output, so it is skipped above
+KDE_MAX_SIZE. The last rows draw per region, with the labels of 100
+regions.
+
+Usage: python benchmarks/bench_z_random.py [N_GALAXIES]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+import randomsdss
+
+SIZES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+KDE_MAX_SIZE = 100_000
+
+N_REGIONS = 100
+
+
+def timeit(func):
+    """Time of func in seconds."""
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main(n_galaxies="100000"):
+    rng = np.random.default_rng(0)
+    n_galaxies = int(n_galaxies)
+    z = rng.normal(0.5, 0.1, n_galaxies)
+    weights = rng.uniform(0.5, 1.5, n_galaxies)
+    z_region = rng.integers(N_REGIONS, size=n_galaxies)
+
+    print(f"{n_galaxies} galaxies")
+    print(
+        f"{'size':>10} "
+        + " ".join(f"{m + ' [s]':>14}" for m in randomsdss.Z_METHODS)
+    )
+    for size in SIZES:
+        times = []
+        for method in randomsdss.Z_METHODS:
+            if method == "kde" and size > KDE_MAX_SIZE:
+                times.append(np.nan)
+                continue
+            times.append(
+                timeit(
+                    lambda: randomsdss.z_random(
+                        z, size, weights=weights, seed=1, method=method
+                    )
+                )
+            )
+        print(f"{size:>10} " + " ".join(f"{t:>14.3f}" for t in times))
+
+    print(f"per region, {N_REGIONS} regions")
+    for size in SIZES:
+        region = rng.integers(N_REGIONS, size=size)
+        times = [
+            timeit(
+                lambda: randomsdss.z_random(
+                    z,
+                    size,
+                    weights=weights,
+                    seed=1,
+                    method=method,
+                    z_region=z_region,
+                    region=region,
+                )
+            )
+            for method in ("shuffle", "histogram")
+        ]
+        print(f"{size:>10} {'':>14} " + " ".join(f"{t:>14.3f}" for t in times))
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
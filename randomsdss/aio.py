@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Run blocking RandomSDSS work from an asyncio event loop.
+
+The work is sent to a bounded thread pool. pymangle keeps the GIL while
+it runs, so every job is split in chunks (see ``CHUNK_SIZE``) to let the
+event loop and the other jobs run in between, and to stop a cancelled
+job at the next chunk. Jobs of at least ``HEAVY_SIZE`` points also need
+one of ``max_heavy_jobs`` slots, so that a few large requests can't take
+every worker.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import asyncio
+import contextlib
+import os
+import threading
+import weakref
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from functools import partial
+
+import numpy as np
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Jobs with at least this number of points are limited by max_heavy_jobs
+HEAVY_SIZE = 1_000_000
+
+_CONFIG = {
+    "max_workers": min(4, os.cpu_count() or 1) + 1,
+    "max_heavy_jobs": 1,
+}
+
+_EXECUTOR = None
+
+# One semaphore per event loop, as they can't be shared between loops
+_HEAVY_SLOTS = weakref.WeakKeyDictionary()
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# FUNCTIONS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def configure(max_workers=None, max_heavy_jobs=None):
+    """Set the limits of the asynchronous API.
+
+    Changing max_workers replaces the thread pool; jobs already running
+    in the previous pool are not affected.
+
+    Parameters
+    ----------
+    max_workers: int, optional
+        Number of threads running blocking work. It should be larger than
+        max_heavy_jobs so that small jobs always find a free thread.
+    max_heavy_jobs: int, optional
+        Number of jobs of at least ``HEAVY_SIZE`` points running at once.
+    """
+    global _EXECUTOR
+    if max_workers is not None:
+        _CONFIG["max_workers"] = max_workers
+        if _EXECUTOR is not None:
+            _EXECUTOR.shutdown(wait=False)
+            _EXECUTOR = None
+    if max_heavy_jobs is not None:
+        _CONFIG["max_heavy_jobs"] = max_heavy_jobs
+        _HEAVY_SLOTS.clear()
+
+
+def get_executor():
+    """Return the thread pool used by the asynchronous API.
+
+    Return
+    ------
+    executor: concurrent.futures.ThreadPoolExecutor
+        Bounded thread pool, created on first use.
+    """
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = ThreadPoolExecutor(
+            max_workers=_CONFIG["max_workers"],
+            thread_name_prefix="randomsdss",
+        )
+    return _EXECUTOR
+
+
+@contextlib.asynccontextmanager
+async def _heavy_slot(heavy):
+    if not heavy:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    if loop not in _HEAVY_SLOTS:
+        _HEAVY_SLOTS[loop] = asyncio.Semaphore(_CONFIG["max_heavy_jobs"])
+    async with _HEAVY_SLOTS[loop]:
+        yield
+
+
+async def run(func, *args, heavy=False, cancellable=False, **kwargs):
+    """Run a blocking function in the thread pool.
+
+    Parameters
+    ----------
+    func: callable
+        Function to run.
+    *args, **kwargs:
+        Arguments of func.
+    heavy: bool
+        Wait for a heavy job slot before running.
+    cancellable: bool
+        func accepts a ``cancel`` keyword with a threading.Event that is
+        set when the awaiting task is cancelled. The slot and the thread
+        are released once func returns.
+
+    Return
+    ------
+    result:
+        The return value of func.
+    """
+    cancel = threading.Event()
+    if cancellable:
+        kwargs["cancel"] = cancel
+
+    async with _heavy_slot(heavy):
+        future = asyncio.wrap_future(
+            get_executor().submit(partial(func, *args, **kwargs))
+        )
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            cancel.set()
+            # wait for the thread to stop before releasing the slot
+            await asyncio.wait([future])
+            raise
+
+
+def map_chunks(func, *arrays, chunk_size, cancel=None):
+    """Apply a point-wise function to chunks of the input arrays.
+
+    Parameters
+    ----------
+    func: callable
+        Function taking the arrays and returning one array, or a tuple of
+        arrays, of the same length.
+    *arrays: numpy.ndarray
+        Input arrays, all of the same length.
+    chunk_size: int
+        Number of points of each call.
+    cancel: threading.Event, optional
+        If set while running, stop and raise CancelledError.
+
+    Return
+    ------
+    result: numpy.ndarray or tuple of numpy.ndarray
+        Concatenated results.
+    """
+    arrays = [np.atleast_1d(arr) for arr in arrays]
+    results = []
+    for start in range(0, max(len(arrays[0]), 1), chunk_size):
+        if cancel is not None and cancel.is_set():
+            raise CancelledError("The job was cancelled.")
+        chunk = slice(start, start + chunk_size)
+        results.append(func(*(arr[chunk] for arr in arrays)))
+
+    if isinstance(results[0], tuple):
+        return tuple(np.concatenate(cols) for cols in zip(*results))
+    return np.concatenate(results)
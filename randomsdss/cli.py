@@ -0,0 +1,521 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Command line interface of RandomSDSS."""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import argparse
+import hashlib
+import json
+import os
+import pathlib
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from . import __version__, geometry, masking, server, store
+from .randomsdss import DR, Z_METHODS, z_random
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+MANIFEST_NAME = "manifest.json"
+
+SHARD_NAME = "shard-{:05d}.npz"
+
+# Fields of the manifest that define the points of a run. Only these must
+# match to resume it, the rest are kept for reference.
+RUN_PARAMETERS = (
+    "dr",
+    "catalog",
+    "size",
+    "n_shards",
+    "seed",
+    "z_method",
+    "z_sha256",
+    "shards",
+)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# SHARDS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# DR instance and redshift sample of each worker process, set once by
+# _init_worker so the sample is not sent again with every shard
+_WORKER_DR = None
+_WORKER_Z = None
+
+
+def _init_worker(dr, catalog, z=None, z_method="kde"):
+    global _WORKER_DR, _WORKER_Z
+    _WORKER_DR = DR(dr=dr, catalog=catalog)
+    _WORKER_Z = None if z is None else (z, z_method)
+
+
+def _write_shard(path, size, seed):
+    """Generate one shard and write it atomically to path."""
+    sky_seed, z_seed = seed.spawn(2)
+    columns = dict(zip(("ra", "dec"), _WORKER_DR.sky_random(size, sky_seed)))
+    if _WORKER_Z is not None:
+        z, z_method = _WORKER_Z
+        columns["z"] = z_random(z, size=size, seed=z_seed, method=z_method)
+
+    # np.savez appends the extension if missing, so keep it on the tmp file
+    tmp_path = path.with_name(f".{path.stem}.tmp.npz")
+    np.savez(tmp_path, **columns)
+    os.replace(tmp_path, path)
+    return path
+
+
+def shard_sizes(size, n_shards):
+    """Split size in n_shards nearly equal parts.
+
+    Parameters
+    ----------
+    size: int
+        Total number of random points.
+    n_shards: int
+        Number of shards.
+
+    Return
+    ------
+    sizes: list of int
+        Number of points in each shard.
+    """
+    base, extra = divmod(size, n_shards)
+    return [base + (i < extra) for i in range(n_shards)]
+
+
+def z_checksum(z):
+    """Return the SHA-256 of a redshift sample, to identify it in a run.
+
+    Parameters
+    ----------
+    z: numpy.ndarray
+        Redshift sample.
+
+    Return
+    ------
+    checksum: str
+        Hexadecimal digest of the sample as float64 values.
+    """
+    z = np.ascontiguousarray(z, dtype=np.float64)
+    return hashlib.sha256(z.tobytes()).hexdigest()
+
+
+def generate_shards(
+    output,
+    dr,
+    catalog,
+    size,
+    n_shards=1,
+    seed=None,
+    z=None,
+    z_file=None,
+    z_method="kde",
+    n_jobs=1,
+    resume=False,
+):
+    """Generate a random catalog split in shards written to a directory.
+
+    Each shard gets its own seed spawned from ``seed``, so the catalog is
+    reproducible regardless of how many processes are used.  A manifest
+    describing the run is written to the directory; if ``resume`` is True
+    the ``RUN_PARAMETERS`` of the manifest, including the checksum of the
+    redshift sample, are checked against the requested run and shards
+    already present in the directory are not generated again. The
+    package version and the name of the redshift file may differ.
+
+    Parameters
+    ----------
+    output: str or pathlib.Path
+        Output directory.
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+    size: int
+        Total number of random points.
+    n_shards: int
+        Number of shards to split the catalog.
+    seed: int, optional
+        Root seed of the run. A random one is chosen and stored in the
+        manifest if not given.
+    z: numpy.ndarray, optional
+        Redshift sample. If given, a random redshift column is added to
+        each shard using ``z_random``.
+    z_file: str, optional
+        Name of the file the redshifts were read from, stored in the
+        manifest for reference.
+    z_method: str
+        Method of ``z_random`` to draw the redshifts. "shuffle" and
+        "histogram" cost O(size), while "kde" grows with the size of
+        the sample too.
+    n_jobs: int
+        Number of worker processes.
+    resume: bool
+        Continue a previous run in the same directory.
+
+    Return
+    ------
+    manifest: dict
+        Description of the run, as written to the manifest file.
+    """
+    output = pathlib.Path(output)
+    manifest_path = output / MANIFEST_NAME
+    if z_method not in Z_METHODS:
+        raise ValueError(
+            f"Unknown z_method {z_method}. Choose from {Z_METHODS}."
+        )
+
+    manifest = {
+        "version": __version__,
+        "dr": dr,
+        "catalog": catalog,
+        "size": size,
+        "n_shards": n_shards,
+        "seed": np.random.SeedSequence(seed).entropy,
+        "z_file": None if z_file is None else str(z_file),
+        "z_method": None if z is None else z_method,
+        "z_sha256": None if z is None else z_checksum(z),
+        "shards": [
+            {"file": SHARD_NAME.format(i), "size": s}
+            for i, s in enumerate(shard_sizes(size, n_shards))
+        ],
+    }
+
+    if manifest_path.exists():
+        if not resume:
+            raise FileExistsError(
+                f"{output} already contains a run. Use resume to continue it."
+            )
+        with open(manifest_path) as fp:
+            previous = json.load(fp)
+        if seed is None:
+            manifest["seed"] = previous["seed"]
+        changed = [
+            key
+            for key in RUN_PARAMETERS
+            if previous.get(key) != manifest[key]
+        ]
+        if changed:
+            raise ValueError(
+                f"The run in {output} has different {', '.join(changed)}, "
+                "it can't be resumed."
+            )
+    else:
+        output.mkdir(parents=True, exist_ok=True)
+        with open(manifest_path, "w") as fp:
+            json.dump(manifest, fp, indent=2)
+
+    seeds = np.random.SeedSequence(manifest["seed"]).spawn(n_shards)
+    pending = [
+        (output / shard["file"], shard["size"], shard_seed)
+        for shard, shard_seed in zip(manifest["shards"], seeds)
+        if not (output / shard["file"]).exists()
+    ]
+
+    if n_jobs == 1:
+        _init_worker(dr, catalog, z, z_method)
+        for args in pending:
+            _write_shard(*args)
+    elif pending:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(dr, catalog, z, z_method),
+        ) as executor:
+            for _ in executor.map(_write_shard, *zip(*pending)):
+                pass
+
+    return manifest
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# COMMAND LINE
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def _load_z(path, column):
+    """Read a redshift column from a .npy or text file."""
+    if pathlib.Path(path).suffix == ".npy":
+        return np.load(path)
+    return np.loadtxt(path, usecols=column, ndmin=1)
+
+
+def _generate(args):
+    z = None if args.z_file is None else _load_z(args.z_file, args.z_column)
+    generate_shards(
+        args.output,
+        dr=args.dr,
+        catalog=args.catalog,
+        size=args.size,
+        n_shards=args.shards,
+        seed=args.seed,
+        z=z,
+        z_file=args.z_file,
+        z_method=args.z_method,
+        n_jobs=args.jobs,
+        resume=args.resume,
+    )
+
+
+def _footprint(name):
+    dr, sep, catalog = name.partition("/")
+    if not sep:
+        raise argparse.ArgumentTypeError(
+            f"Footprint must be DR/CATALOG, e.g. DR16/SDSS, not {name}."
+        )
+    return dr, catalog
+
+
+def _serve(args):
+    httpd = server.make_server(
+        footprints=args.footprint,
+        host=args.host,
+        port=args.port,
+        unix_socket=args.unix_socket,
+        verbose=args.verbose,
+    )
+    names = ", ".join(f"{dr}/{cat}" for dr, cat in httpd.footprints)
+    print(f"Serving {names} at {httpd.url}", flush=True)
+    with httpd:
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def _simplify(args):
+    polygons = geometry.read_ply(args.input)
+    simplified = geometry.simplify(
+        polygons, drop_zero_weight=args.drop_zero_weight
+    )
+    geometry.write_ply(simplified, args.output)
+    print(f"{args.output}: {polygons.npoly} -> {simplified.npoly} polygons")
+
+
+def _fetch(args):
+    paths = store.prefetch(
+        args.footprint or None,
+        mirror=args.mirror,
+        max_workers=args.workers,
+        verify=False if args.no_verify else None,
+    )
+    for (dr, catalog), path in paths.items():
+        print(f"{dr}/{catalog}: {path}")
+
+
+def _mask(args):
+    report = masking.mask_catalog(
+        args.input,
+        args.output,
+        args.footprint,
+        ra=args.ra,
+        dec=args.dec,
+        columns=args.columns.split(","),
+        chunk_size=args.chunk_size,
+        n_jobs=args.jobs,
+        overwrite=args.overwrite,
+    )
+    print(
+        f"{args.output}: {report['rows']} rows in {report['seconds']:.1f} s"
+        f" ({report['rows_per_second']:.0f} rows/s)"
+    )
+
+
+def create_parser():
+    """Create the argument parser of the ``randomsdss`` command.
+
+    Return
+    ------
+    parser: argparse.ArgumentParser
+        Parser with one subcommand per action.
+    """
+    parser = argparse.ArgumentParser(
+        prog="randomsdss",
+        description="Generate random points within SDSS footprints.",
+    )
+    parser.add_argument(
+        "--version", action="version", version=f"%(prog)s {__version__}"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    gen = subparsers.add_parser(
+        "generate", help="Generate a random catalog in shards."
+    )
+    gen.add_argument("output", help="Output directory.")
+    gen.add_argument("--dr", default="DR16", help="Data Release name.")
+    gen.add_argument("--catalog", default="SDSS", help="Catalog name.")
+    gen.add_argument(
+        "--size", type=int, required=True, help="Total number of points."
+    )
+    gen.add_argument("--shards", type=int, default=1, help="Number of shards.")
+    gen.add_argument(
+        "--jobs", type=int, default=1, help="Number of processes."
+    )
+    gen.add_argument("--seed", type=int, default=None, help="Root seed.")
+    gen.add_argument(
+        "--z-file",
+        default=None,
+        help="Redshift sample (.npy or text) used to add a z column.",
+    )
+    gen.add_argument(
+        "--z-column",
+        type=int,
+        default=0,
+        help="Column of the redshifts in a text z-file.",
+    )
+    gen.add_argument(
+        "--z-method",
+        choices=Z_METHODS,
+        default="kde",
+        help="How to draw the redshifts, see randomsdss.z_random. "
+        "shuffle and histogram are faster than kde for large samples.",
+    )
+    gen.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue a previous run, skipping existing shards.",
+    )
+    gen.set_defaults(func=_generate)
+
+    srv = subparsers.add_parser(
+        "serve", help="Serve random points from pre-loaded footprints."
+    )
+    srv.add_argument(
+        "--footprint",
+        type=_footprint,
+        action="append",
+        default=None,
+        help="Footprint to load as DR/CATALOG. Can be repeated. "
+        "Defaults to every available footprint.",
+    )
+    srv.add_argument("--host", default="127.0.0.1", help="Interface.")
+    srv.add_argument(
+        "--port", type=int, default=server.DEFAULT_PORT, help="TCP port."
+    )
+    srv.add_argument(
+        "--unix-socket",
+        default=None,
+        help="Listen on this Unix socket instead of a TCP port.",
+    )
+    srv.add_argument(
+        "--verbose", action="store_true", help="Log every request."
+    )
+    srv.set_defaults(func=_serve)
+
+    simp = subparsers.add_parser(
+        "simplify", help="Merge the polygons of a .ply file."
+    )
+    simp.add_argument("input", help="Mangle .ply file.")
+    simp.add_argument("output", help="Simplified .ply file.")
+    simp.add_argument(
+        "--drop-zero-weight",
+        action="store_true",
+        help="Also drop the polygons with zero weight.",
+    )
+    simp.set_defaults(func=_simplify)
+
+    mask = subparsers.add_parser(
+        "mask", help="Add footprint columns to a catalog, file to file."
+    )
+    mask.add_argument(
+        "input", help="Catalog (.npy, .parquet, .h5, .hdf5, .fits, .fit)."
+    )
+    mask.add_argument("output", help="Output file, in any of those formats.")
+    mask.add_argument(
+        "--footprint",
+        type=_footprint,
+        action="append",
+        required=True,
+        help="Footprint as DR/CATALOG. Can be repeated.",
+    )
+    mask.add_argument("--ra", default="ra", help="Column of the RA.")
+    mask.add_argument("--dec", default="dec", help="Column of the DEC.")
+    mask.add_argument(
+        "--columns",
+        default=",".join(masking.MASK_COLUMNS),
+        help="Comma separated columns to add for each footprint.",
+    )
+    mask.add_argument(
+        "--chunk-size",
+        type=int,
+        default=masking.CHUNK_ROWS,
+        help="Rows of each chunk.",
+    )
+    mask.add_argument(
+        "--jobs", type=int, default=1, help="Number of processes."
+    )
+    mask.add_argument(
+        "--overwrite", action="store_true", help="Replace the output."
+    )
+    mask.set_defaults(func=_mask)
+
+    fetch = subparsers.add_parser(
+        "fetch", help="Download polygon files into the local store."
+    )
+    fetch.add_argument(
+        "footprint",
+        type=_footprint,
+        nargs="*",
+        help="Footprints as DR/CATALOG. Defaults to every footprint.",
+    )
+    fetch.add_argument(
+        "--mirror",
+        default=None,
+        help="Base URL of a mirror. Defaults to RANDOMSDSS_MIRROR.",
+    )
+    fetch.add_argument(
+        "--workers", type=int, default=4, help="Parallel downloads."
+    )
+    fetch.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="Store files without a checksum in the manifest, with a "
+        "warning, instead of refusing them.",
+    )
+    fetch.set_defaults(func=_fetch)
+
+    return parser
+
+
+def main(argv=None):
+    """Run the ``randomsdss`` command.
+
+    Parameters
+    ----------
+    argv: list of str, optional
+        Command line arguments. Defaults to ``sys.argv[1:]``.
+
+    Return
+    ------
+    status: int
+        Exit status.
+    """
+    parser = create_parser()
+    args = parser.parse_args(argv)
+    try:
+        args.func(args)
+    except (ValueError, FileExistsError, FileNotFoundError) as err:
+        parser.exit(1, f"randomsdss: error: {err}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
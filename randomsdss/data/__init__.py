@@ -26,6 +26,14 @@ import pathlib
 
 DR_PATH = pathlib.Path(os.path.abspath(os.path.dirname(__file__)))
 
+# Store of polygon files and files derived from them, like simplified
+# footprints
+CACHE_PATH = pathlib.Path(
+    os.environ.get(
+        "RANDOMSDSS_CACHE", pathlib.Path.home() / ".cache" / "randomsdss"
+    )
+)
+
 PLY_PATH = {
     "DR8": {"SDSS": DR_PATH / "dr8" / "DR8.SDSS.ply"},
     "DR9": {
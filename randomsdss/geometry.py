@@ -0,0 +1,1590 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Geometry of the mangle polygons defining a footprint.
+
+pymangle does not expose the caps of the polygons, so they are read here
+directly from the .ply file. A cap is stored as ``(x, y, z, cm)``: a point
+``p`` is inside the cap if ``1 - c.p < cm`` for ``cm >= 0`` and if
+``1 - c.p > -cm`` otherwise. A polygon is the intersection of its caps.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import gzip
+import lzma
+import re
+from functools import cached_property
+
+import attr
+
+import numpy as np
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+_HEADER = re.compile(
+    r"polygon\s+(-?\d+)\s*\(\s*(\d+)\s+caps?,\s*(\S+)\s+weight,"
+    r"\s*(-?\d+)\s+pixel,\s*(\S+)\s+str\)"
+)
+
+# A cap every point of the sphere is inside of, used for padding
+_FULL_CAP = (0.0, 0.0, 1.0, 2.0)
+
+# Tolerance to decide if a point on the edge of a cap belongs to it
+_EDGE_TOL = 1e-10
+
+# Margin added to the radius of the bounding caps, in radians
+_RADIUS_MARGIN = 1e-7
+
+# Smallest and largest side of the cells of Polygons.grid, in degrees
+_GRID_CELL = (0.25, 10.0)
+
+# Maximum number of floats in the temporary arrays of vectorized loops
+_BLOCK = 4_000_000
+
+# Bits of the RA and DEC cells of curve_order, about 20 arcsec wide
+_CURVE_BITS = 16
+
+# Pairs of consecutive points checked by is_coherent, the fraction of
+# them that must be in the same DEC ring, and the default resolution of
+# the rings, the usual one of the SDSS masks
+_COHERENT_SAMPLE = 2**12
+_COHERENT_FRACTION = 0.5
+_COHERENT_RESOLUTION = 6
+
+# Gauss-Legendre quadrature used to integrate along the polygon edges
+_GL_NODES, _GL_WEIGHTS = np.polynomial.legendre.leggauss(16)
+
+# Longest piece of an edge integrated with one quadrature, in radians
+_GL_STEP = np.pi / 4
+
+# Candidate directions for the pole of the edge integrals
+_POLES = np.concatenate(
+    [
+        np.eye(3),
+        -np.eye(3),
+        np.array(np.meshgrid([-1, 1], [-1, 1], [-1, 1])).reshape(3, -1).T
+        / np.sqrt(3),
+    ]
+)
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# COORDINATES
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def radec_to_xyz(ra, dec):
+    """Convert RA, DEC in degrees to unit vectors.
+
+    Parameters
+    ----------
+    ra: numpy.ndarray
+        Right Ascension in degrees.
+    dec: numpy.ndarray
+        Declination in degrees.
+
+    Returns
+    -------
+    xyz: numpy.ndarray
+        Array of shape (N, 3) with the unit vectors.
+    """
+    ra = np.deg2rad(ra)
+    dec = np.deg2rad(dec)
+    cos_dec = np.cos(dec)
+    return np.stack(
+        [cos_dec * np.cos(ra), cos_dec * np.sin(ra), np.sin(dec)], axis=-1
+    )
+
+
+def xyz_to_radec(xyz):
+    """Convert unit vectors to RA, DEC in degrees.
+
+    Parameters
+    ----------
+    xyz: numpy.ndarray
+        Array of shape (N, 3) with the unit vectors.
+
+    Returns
+    -------
+    ra: numpy.ndarray
+        Right Ascension in degrees, in the range [0, 360).
+    dec: numpy.ndarray
+        Declination in degrees.
+    """
+    x, y, z = np.moveaxis(xyz, -1, 0)
+    ra = np.rad2deg(np.arctan2(y, x)) % 360.0
+    dec = np.rad2deg(np.arcsin(np.clip(z, -1.0, 1.0)))
+    return ra, dec
+
+
+def _in_caps(xyz, caps, tol=0.0):
+    """Check points against caps, broadcasting over leading dimensions."""
+    d = 1.0 - np.einsum("...i,...i->...", xyz, caps[..., :3])
+    cm = caps[..., 3]
+    return np.where(cm < 0, d > -cm - tol, d < cm + tol)
+
+
+def _orthonormal(center):
+    """Two unit vectors perpendicular to each center and to each other."""
+    axis = np.zeros_like(center)
+    axis[:, 2] = 1.0
+    polar = np.abs(center[:, 2]) > 0.9
+    axis[polar] = (1.0, 0.0, 0.0)
+    e1 = np.cross(center, axis)
+    e1 /= np.linalg.norm(e1, axis=1, keepdims=True)
+    e2 = np.cross(center, e1)
+    return e1, e2
+
+
+def sample_caps(center, radius, rng):
+    """Draw one uniform random point inside each cap.
+
+    Parameters
+    ----------
+    center: numpy.ndarray
+        Array of shape (N, 3) with the unit vectors of the cap centers.
+    radius: numpy.ndarray
+        Opening angle of each cap in radians.
+    rng: numpy.random.Generator
+        Random number generator.
+
+    Returns
+    -------
+    xyz: numpy.ndarray
+        Array of shape (N, 3) with the random unit vectors.
+    """
+    size = len(center)
+    cos_theta = 1.0 - rng.random(size) * (1.0 - np.cos(radius))
+    sin_theta = np.sqrt(np.clip(1.0 - cos_theta**2, 0.0, None))
+    phi = rng.uniform(0.0, 2 * np.pi, size)
+    e1, e2 = _orthonormal(center)
+    return (
+        cos_theta[:, None] * center
+        + (sin_theta * np.cos(phi))[:, None] * e1
+        + (sin_theta * np.sin(phi))[:, None] * e2
+    )
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# POLYGONS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+@attr.s(frozen=True, eq=False)
+class Polygons:
+    """Caps and properties of the polygons of a mangle mask.
+
+    Parameters
+    ----------
+    caps: numpy.ndarray
+        Array of shape (ncaps, 4) with the caps of all the polygons.
+    offsets: numpy.ndarray
+        The caps of polygon ``i`` are ``caps[offsets[i]:offsets[i + 1]]``.
+    ids: numpy.ndarray
+        Polygon ids.
+    weights: numpy.ndarray
+        Polygons weights.
+    pixels: numpy.ndarray
+        Pixel number of each polygon.
+    areas: numpy.ndarray
+        Polygons areas in steradians.
+    header: list of str
+        Lines preceding the first polygon in the .ply file.
+    """
+
+    caps = attr.ib()
+    offsets = attr.ib()
+    ids = attr.ib()
+    weights = attr.ib()
+    pixels = attr.ib()
+    areas = attr.ib()
+    header = attr.ib(factory=list)
+
+    @property
+    def npoly(self):
+        """Get the number of polygons."""
+        return len(self.ids)
+
+    @property
+    def ncaps(self):
+        """Number of caps of each polygon."""
+        return np.diff(self.offsets)
+
+    @cached_property
+    def padded_caps(self):
+        """Caps as an array of shape (npoly, max(ncaps), 4).
+
+        Polygons with fewer caps are padded with caps containing the whole
+        sphere, so that every polygon can be tested at once.
+        """
+        ncaps = self.ncaps
+        padded = np.empty((self.npoly, ncaps.max(initial=1), 4))
+        padded[:] = _FULL_CAP
+        rows = np.repeat(np.arange(self.npoly), ncaps)
+        cols = np.arange(len(self.caps)) - np.repeat(self.offsets[:-1], ncaps)
+        padded[rows, cols] = self.caps
+        return padded
+
+    def contains_in(self, xyz, index):
+        """Check if each point is inside the polygon given by index.
+
+        Parameters
+        ----------
+        xyz: numpy.ndarray
+            Array of shape (N, 3) with unit vectors.
+        index: numpy.ndarray
+            Position of the polygon to check each point against.
+
+        Returns
+        -------
+        inside: numpy.ndarray
+            True where the point is inside its polygon.
+        """
+        padded = self.padded_caps
+        step = max(_BLOCK // (padded.shape[1] * 4), 1)
+        inside = np.empty(len(xyz), dtype=bool)
+        for start in range(0, len(xyz), step):
+            chunk = slice(start, start + step)
+            caps = padded[index[chunk]]
+            inside[chunk] = _in_caps(xyz[chunk, None], caps).all(axis=1)
+        return inside
+
+    @cached_property
+    def bounding_caps(self):
+        """Smallest caps centered on each polygon that contain it.
+
+        Returns
+        -------
+        center: numpy.ndarray
+            Array of shape (npoly, 3) with the unit vectors of the centers.
+        radius: numpy.ndarray
+            Opening angle of each cap in radians.
+        """
+        center = np.zeros((self.npoly, 3))
+        radius = np.zeros(self.npoly)
+        ncaps = self.ncaps
+        for k in np.unique(ncaps):
+            index = np.flatnonzero(ncaps == k)
+            if k == 0:
+                center[index], radius[index] = (0.0, 0.0, 1.0), np.pi
+                continue
+            step = max(_BLOCK // (3 * k**3), 1)
+            for start in range(0, len(index), step):
+                chunk = index[start:start + step]
+                caps = self.padded_caps[chunk, :k]
+                center[chunk], radius[chunk] = _bounding_caps(caps)
+        return center, radius
+
+    @cached_property
+    def radec_ranges(self):
+        """RA and DEC ranges containing each polygon.
+
+        The ranges bound the bounding caps, so they may be a little larger
+        than the polygons. Polygons around a pole span every RA.
+
+        Returns
+        -------
+        ra_min: numpy.ndarray
+            Lower RA bound in degrees, in [0, 360).
+        ra_width: numpy.ndarray
+            Width of the RA range in degrees, up to 360. The range may
+            wrap through RA 0.
+        dec_min: numpy.ndarray
+            Lower DEC bound in degrees.
+        dec_max: numpy.ndarray
+            Upper DEC bound in degrees.
+        """
+        center, radius = self.bounding_caps
+        ra, dec = xyz_to_radec(center)
+        radius = np.rad2deg(radius)
+        dec_min, dec_max = dec - radius, dec + radius
+        polar = (dec_min <= -90.0) | (dec_max >= 90.0)
+        with np.errstate(invalid="ignore"):
+            half = np.rad2deg(
+                np.arcsin(np.sin(np.deg2rad(radius)) / np.cos(np.deg2rad(dec)))
+            )
+        ra_min = np.where(polar, 0.0, (ra - half) % 360.0)
+        ra_width = np.where(polar, 360.0, 2 * half)
+        return (
+            ra_min,
+            ra_width,
+            np.clip(dec_min, -90.0, 90.0),
+            np.clip(dec_max, -90.0, 90.0),
+        )
+
+    def in_box(self, ra_min, ra_max, dec_min, dec_max):
+        """Find the polygons that may overlap a box, using radec_ranges.
+
+        Parameters
+        ----------
+        ra_min, ra_max, dec_min, dec_max: float
+            Box limits in degrees, see ``box_caps``.
+
+        Returns
+        -------
+        overlap: numpy.ndarray
+            Boolean mask of the polygons whose ranges overlap the box.
+        inside: numpy.ndarray
+            Boolean mask of the polygons whose ranges are inside the box,
+            a subset of overlap.
+        """
+        start, width = ra_span(ra_min, ra_max, dec_min, dec_max)
+        lo, span, bottom, top = self.radec_ranges
+        after = (lo - start) % 360.0
+        overlap = (after <= width) | ((start - lo) % 360.0 <= span)
+        overlap &= (bottom <= dec_max) & (top >= dec_min)
+        inside = overlap & (bottom >= dec_min) & (top <= dec_max)
+        inside &= (width >= 360.0) | (after + span <= width)
+        return overlap, inside
+
+    def area_in_box(self, index, ra_min, ra_max, dec_min, dec_max):
+        """Area of some polygons inside a box.
+
+        Parameters
+        ----------
+        index: numpy.ndarray
+            Indices of the polygons.
+        ra_min, ra_max, dec_min, dec_max: float
+            Box limits in degrees, see ``box_caps``.
+
+        Returns
+        -------
+        area: numpy.ndarray
+            Area of each polygon inside the box in steradians.
+        """
+        pieces = box_caps(ra_min, ra_max, dec_min, dec_max)
+        caps = self.padded_caps[index]
+        area = np.zeros(len(caps))
+        for piece in pieces:
+            box = np.broadcast_to(piece, (len(caps),) + piece.shape)
+            area += caps_area(np.concatenate([caps, box], axis=1))
+        return area
+
+    @cached_property
+    def grid(self):
+        """Grid of RA, DEC cells listing the polygons that may touch them.
+
+        Built from radec_ranges. The cells are squares in RA, DEC of a
+        fraction of the typical polygon size.
+
+        Returns
+        -------
+        cell: float
+            Side of the cells in degrees.
+        members: numpy.ndarray
+            Polygon positions of every cell, in increasing order.
+        offsets: numpy.ndarray
+            The polygons of cell ``i`` are ``members[offsets[i]:offsets[i
+            + 1]]``, with ``i = row * ncols + col``.
+        """
+        ra_min, ra_width, dec_min, dec_max = self.radec_ranges
+        cell = float(np.clip(np.median(dec_max - dec_min) / 4, *_GRID_CELL))
+        nrows, ncols = int(np.ceil(180.0 / cell)), int(np.ceil(360.0 / cell))
+
+        first_row = _grid_index(dec_min + 90.0, cell, nrows)
+        nrow = _grid_index(dec_max + 90.0, cell, nrows) - first_row + 1
+        first_col = _grid_index(ra_min, cell, ncols)
+        last_col = np.floor((ra_min + ra_width) / cell).astype(np.intp)
+        ncol = np.minimum(last_col - first_col + 1, ncols)
+
+        count = nrow * ncol
+        members = np.repeat(np.arange(self.npoly), count)
+        rank = np.arange(len(members)) - np.repeat(
+            np.cumsum(count) - count, count
+        )
+        row = first_row[members] + rank // ncol[members]
+        col = (first_col[members] + rank % ncol[members]) % ncols
+        cells = row * ncols + col
+
+        order = np.argsort(cells, kind="stable")
+        sizes = np.bincount(cells, minlength=nrows * ncols)
+        offsets = np.concatenate([[0], np.cumsum(sizes)])
+        return cell, members[order], offsets
+
+    def locate(self, ra, dec, xyz=None):
+        """Find the first polygon containing each point.
+
+        The candidates of each point are taken from grid, so it gives the
+        same result as pymangle ``polyid`` (by position, not id) without
+        looking at every polygon. Weights are ignored.
+
+        Parameters
+        ----------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        xyz: numpy.ndarray, optional
+            Unit vectors of the points, if already computed.
+
+        Returns
+        -------
+        index: numpy.ndarray
+            Position of the polygon of each point, -1 if outside.
+        """
+        ra = np.asarray(ra, dtype=float)
+        dec = np.asarray(dec, dtype=float)
+        if xyz is None:
+            xyz = radec_to_xyz(ra, dec)
+        cell, members, offsets = self.grid
+        nrows, ncols = int(np.ceil(180.0 / cell)), int(np.ceil(360.0 / cell))
+        row = _grid_index(dec + 90.0, cell, nrows)
+        col = _grid_index(ra % 360.0, cell, ncols)
+        start = offsets[row * ncols + col]
+        count = offsets[row * ncols + col + 1] - start
+
+        # every (point, candidate) pair, the candidates in increasing order
+        point = np.repeat(np.arange(len(ra)), count)
+        shift = np.repeat(start - np.cumsum(count) + count, count)
+        poly = members[np.arange(len(point)) + shift]
+        x, y, z = (xyz[:, i][point] for i in range(3))
+
+        center, radius = self.bounding_caps
+        near = x * center[poly, 0] + y * center[poly, 1]
+        near += z * center[poly, 2]
+        near = near >= np.cos(radius[poly])
+        point, poly = point[near], poly[near]
+        x, y, z = x[near], y[near], z[near]
+
+        # test the caps one at a time, dropping the pairs already outside
+        first_cap, ncaps = self.offsets[poly], self.ncaps[poly]
+        inside = np.ones(len(point), dtype=bool)
+        todo = np.arange(len(point))
+        for k in range(int(ncaps.max(initial=0))):
+            todo = todo[ncaps[todo] > k]
+            cap = self.caps[first_cap[todo] + k]
+            d = 1.0 - (x[todo] * cap[:, 0] + y[todo] * cap[:, 1])
+            d -= z[todo] * cap[:, 2]
+            cm = cap[:, 3]
+            ok = np.where(cm < 0, d > -cm, d < cm)
+            inside[todo[~ok]] = False
+            todo = todo[ok]
+        point, poly = point[inside], poly[inside]
+
+        index = np.full(len(ra), -1)
+        first = np.ones(len(point), dtype=bool)
+        first[1:] = point[1:] != point[:-1]
+        index[point[first]] = poly[first]
+        return index
+
+    def sample(self, index, rng):
+        """Draw one uniform random point inside each requested polygon.
+
+        Parameters
+        ----------
+        index: numpy.ndarray
+            Position of the polygon of each point.
+        rng: numpy.random.Generator
+            Random number generator.
+
+        Returns
+        -------
+        xyz: numpy.ndarray
+            Array of shape (N, 3) with the random unit vectors.
+        """
+        center, radius = self.bounding_caps
+        xyz = np.empty((len(index), 3))
+        todo = np.arange(len(index))
+        while len(todo):
+            pid = index[todo]
+            candidates = sample_caps(center[pid], radius[pid], rng)
+            inside = self.contains_in(candidates, pid)
+            xyz[todo[inside]] = candidates[inside]
+            todo = todo[~inside]
+        return xyz
+
+
+def _grid_index(value, cell, size):
+    """Cell of each value along one axis of Polygons.grid."""
+    return np.clip(np.floor(value / cell), 0, size - 1).astype(np.intp)
+
+
+def _interleave(value):
+    """Spread the bits of 32 bit integers to the even bits of 64."""
+    value = np.asarray(value).astype(np.uint64)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555),
+    ):
+        value = (value | (value << np.uint64(shift))) & np.uint64(mask)
+    return value
+
+
+def curve_order(ra, dec):
+    """Order of the points along a Z-order curve of the sky.
+
+    The sky is split in 2**16 by 2**16 cells of RA, DEC and the cells are
+    sorted by interleaving the bits of their row and column, so points
+    close in the order are close on the sky.
+
+    Parameters
+    ----------
+    ra: numpy.ndarray
+        Right Ascension in degrees.
+    dec: numpy.ndarray
+        Declination in degrees.
+
+    Returns
+    -------
+    order: numpy.ndarray
+        Indices that sort the points along the curve.
+    """
+    size = 2**_CURVE_BITS
+    row = _grid_index(np.asarray(dec, dtype=float) + 90.0, 180.0 / size, size)
+    col = _grid_index(np.asarray(ra, dtype=float) % 360.0, 360.0 / size, size)
+    key = _interleave(row) | (_interleave(col) << np.uint64(1))
+    return np.argsort(key, kind="stable")
+
+
+def is_coherent(dec, resolution=None):
+    """Check if consecutive points mostly fall in the same DEC ring.
+
+    In the simple pixelization of mangle, the sky is split in
+    ``2**resolution`` rings of equal area, and pymangle finds the
+    polygons of points of the same ring in the same memory. Points sorted
+    by DEC, or along ``curve_order``, mostly follow each other in the same
+    ring, so sorting them again gains nothing. Only _COHERENT_SAMPLE
+    random pairs of consecutive points are checked, always the same ones
+    for the same number of points.
+
+    Parameters
+    ----------
+    dec: numpy.ndarray
+        Declination in degrees.
+    resolution: int, optional
+        Resolution of the simple pixelization of the mask. Defaults to
+        _COHERENT_RESOLUTION.
+
+    Returns
+    -------
+    coherent: bool
+        True if at least _COHERENT_FRACTION of the pairs are in the same
+        ring.
+    """
+    if resolution is None or resolution < 0:
+        resolution = _COHERENT_RESOLUTION
+    size = len(dec)
+    if size < 2:
+        return True
+    first = np.random.default_rng(size).integers(
+        0, size - 1, min(size - 1, _COHERENT_SAMPLE)
+    )
+    pairs = np.asarray(dec)[np.stack([first, first + 1])].astype(float)
+    ring = np.floor((1.0 - np.sin(np.deg2rad(pairs))) / 2.0 * 2**resolution)
+    return np.mean(ring[0] == ring[1]) >= _COHERENT_FRACTION
+
+
+def _circle_intersections(caps):
+    """Intersections of the cap circles of every pair of caps.
+
+    Parameters
+    ----------
+    caps: numpy.ndarray
+        Array of shape (N, k, 4).
+
+    Returns
+    -------
+    points: numpy.ndarray
+        Array of shape (N, 2 * npairs, 3). Pairs of circles that do not
+        intersect give NaN.
+    """
+    i, j = np.triu_indices(caps.shape[1], 1)
+    n1, n2 = caps[:, i, :3], caps[:, j, :3]
+    d1, d2 = 1.0 - np.abs(caps[:, i, 3]), 1.0 - np.abs(caps[:, j, 3])
+
+    g = np.einsum("...i,...i->...", n1, n2)
+    cross = np.cross(n1, n2)
+    norm2 = np.einsum("...i,...i->...", cross, cross)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        a = (d1 - d2 * g) / norm2
+        b = (d2 - d1 * g) / norm2
+        base = a[..., None] * n1 + b[..., None] * n2
+        t = np.sqrt((1.0 - np.einsum("...i,...i->...", base, base)) / norm2)
+    t[norm2 < 1e-24] = np.nan
+    points = np.stack(
+        [base + t[..., None] * cross, base - t[..., None] * cross], axis=2
+    )
+
+    # nearly parallel circles lose precision, so the points are moved back
+    # to both circles along the sphere with two Newton steps
+    valid = np.isfinite(points).all(axis=-1)
+    index = np.nonzero(valid)[:2]
+    normals = np.stack([n1[index], n2[index]], axis=1)
+    target = np.stack([d1[index], d2[index]], axis=1)
+    for _ in range(2):
+        vertex = points[valid]
+        residual = target - np.einsum("pkx,px->pk", normals, vertex)
+        residual = np.concatenate([residual, np.zeros((len(vertex), 1))], 1)
+        matrix = np.concatenate([normals, vertex[:, None]], axis=1)
+        step = np.linalg.solve(matrix, residual[..., None])[..., 0]
+        points[valid] = vertex + step
+    points /= np.linalg.norm(points, axis=-1, keepdims=True)
+    return points.reshape(len(caps), -1, 3)
+
+
+def _angle(u, v):
+    """Angle between unit vectors, broadcasting over leading dimensions."""
+    cross = np.linalg.norm(np.cross(u, v), axis=-1)
+    return np.arctan2(cross, np.einsum("...i,...i->...", u, v))
+
+
+def _bounding_caps(caps):
+    """Bounding caps of polygons with the same number of caps.
+
+    The center is the mean of the vertices, or the center of the smallest
+    cap if the polygon has no vertices. The farthest point of a polygon
+    from the center lies on its edge, and along a circle the distance to
+    the center has a single maximum. So it is either a vertex or the
+    farthest point of one of the cap circles, if that point is on the edge.
+    """
+    npoly, k = caps.shape[:2]
+
+    if k > 1:
+        vertices = _circle_intersections(caps)
+    else:
+        vertices = np.empty((npoly, 0, 3))
+    valid = _in_caps(vertices[:, :, None], caps[:, None], _EDGE_TOL).all(-1)
+    valid &= ~np.isnan(vertices).any(-1)
+    vertices = np.where(valid[..., None], vertices, 0.0)
+
+    center = vertices.sum(axis=1)
+    norm = np.linalg.norm(center, axis=1)
+    no_vertex = norm < 1e-12
+    cm = np.where(caps[..., 3] > 0, caps[..., 3], np.inf)
+    smallest = caps[np.arange(npoly), cm.argmin(axis=1), :3]
+    center[no_vertex] = smallest[no_vertex]
+    center /= np.linalg.norm(center, axis=1, keepdims=True)
+
+    dist = np.where(valid, _angle(center[:, None], vertices), 0.0)
+    radius = dist.max(axis=1, initial=0.0)
+
+    # farthest point from the center of each cap circle
+    normal = caps[..., :3]
+    r = np.arccos(1.0 - np.abs(caps[..., 3].clip(-2, 2)))
+    cos_cn = np.einsum("...i,...i->...", center[:, None], normal)
+    perp = center[:, None] - cos_cn[..., None] * normal
+    perp_norm = np.linalg.norm(perp, axis=-1, keepdims=True)
+    # if the center is a cap pole every point of the circle is the farthest
+    any_perp = _orthonormal(normal.reshape(-1, 3))[0].reshape(perp.shape)
+    perp = np.where(
+        perp_norm > 1e-12, perp / np.maximum(perp_norm, 1e-300), any_perp
+    )
+    far = np.cos(r)[..., None] * normal - np.sin(r)[..., None] * perp
+    on_edge = _in_caps(far[:, :, None], caps[:, None], _EDGE_TOL).all(-1)
+    on_edge &= np.abs(caps[..., 3]) < 2
+    dist = np.where(on_edge, _angle(center[:, None], far), 0.0)
+    radius = np.maximum(radius, dist.max(axis=1, initial=0.0))
+
+    # polygons containing the antipode of their center
+    antipode = _in_caps(-center[:, None], caps).all(-1)
+    radius[antipode] = np.pi
+    return center, np.minimum(radius + _RADIUS_MARGIN, np.pi)
+
+
+def read_ply(path):
+    """Read the polygons of a mangle .ply file.
+
+    Parameters
+    ----------
+    path: str or pathlib.Path
+        Path to the .ply file. Files ending in .gz or .xz are
+        decompressed.
+
+    Returns
+    -------
+    polygons: randomsdss.geometry.Polygons
+        Caps and properties of the polygons.
+    """
+    opener = {".gz": gzip.open, ".xz": lzma.open}.get(
+        str(path)[-3:], open
+    )
+    with opener(path, "rt") as fp:
+        lines = fp.read().splitlines()
+
+    header, ids, ncaps, weights, pixels, areas = [], [], [], [], [], []
+    cap_lines = []
+    for line in lines:
+        if line.startswith("polygon"):
+            match = _HEADER.match(line)
+            if match is None:
+                raise ValueError(f"Invalid polygon header in {path}: {line}")
+            pid, nc, weight, pixel, area = match.groups()
+            ids.append(int(pid))
+            ncaps.append(int(nc))
+            weights.append(float(weight))
+            pixels.append(int(pixel))
+            areas.append(float(area))
+        elif ids:
+            if line.strip():
+                cap_lines.append(line)
+        elif line.strip():
+            header.append(line)
+
+    caps = np.array(" ".join(cap_lines).split(), dtype=float).reshape(-1, 4)
+    offsets = np.concatenate([[0], np.cumsum(ncaps)])
+    if offsets[-1] != len(caps):
+        raise ValueError(f"Wrong number of caps in {path}.")
+
+    return Polygons(
+        caps=caps,
+        offsets=offsets,
+        ids=np.array(ids),
+        weights=np.array(weights),
+        pixels=np.array(pixels),
+        areas=np.array(areas),
+        header=header,
+    )
+
+
+def write_ply(polygons, path):
+    """Write polygons to a mangle .ply file.
+
+    Numbers are written with the shortest representation that reads back
+    to the same value, which for masks read with ``read_ply`` is the text
+    of the original file.
+
+    Parameters
+    ----------
+    polygons: randomsdss.geometry.Polygons
+        Polygons to write.
+    path: str or pathlib.Path
+        Path of the .ply file.
+    """
+    header = list(polygons.header)
+    if header and header[0].endswith("polygons"):
+        header[0] = f"{polygons.npoly} polygons"
+    else:
+        header.insert(0, f"{polygons.npoly} polygons")
+
+    lines = header
+    for i in range(polygons.npoly):
+        start, stop = polygons.offsets[i], polygons.offsets[i + 1]
+        lines.append(
+            f"polygon {polygons.ids[i]:10d} ( {stop - start} caps, "
+            f"{float(polygons.weights[i])!r} weight, "
+            f"{polygons.pixels[i]} pixel, {float(polygons.areas[i])!r} str):"
+        )
+        lines.extend(
+            " " + " ".join(repr(v) for v in cap.tolist())
+            for cap in polygons.caps[start:stop]
+        )
+    with open(path, "w") as fp:
+        fp.write("\n".join(lines) + "\n")
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# SIMPLIFICATION
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def _from_list(caps, ids, weights, pixels, areas, header):
+    """Build Polygons from a list with the caps array of each polygon."""
+    ncaps = [len(c) for c in caps]
+    return Polygons(
+        caps=np.concatenate(caps) if caps else np.empty((0, 4)),
+        offsets=np.concatenate([[0], np.cumsum(ncaps, dtype=int)]),
+        ids=np.asarray(ids),
+        weights=np.asarray(weights),
+        pixels=np.asarray(pixels),
+        areas=np.asarray(areas),
+        header=header,
+    )
+
+
+def _outside_caps(center, radius, caps):
+    """Check if the cap of center and radius is outside any of the caps."""
+    cap_radius = np.arccos(np.clip(1.0 - np.abs(caps[:, 3]), -1.0, 1.0))
+    dist = _angle(center, caps[:, :3])
+    return np.any(
+        np.where(
+            caps[:, 3] >= 0,
+            dist - radius >= cap_radius,
+            dist + radius <= cap_radius,
+        )
+    )
+
+
+def _disjoint(polygons, keys, a, b):
+    """Check that polygons a and b can't overlap.
+
+    The test is conservative: it is True only if the polygons share an
+    edge with opposite sides, or if the bounding cap of one of them is
+    outside a cap of the other.
+    """
+    if any((x, y, z, -cm) in keys[b] for x, y, z, cm in keys[a]):
+        return True
+    center, radius = polygons.bounding_caps
+    caps_a = polygons.caps[polygons.offsets[a]:polygons.offsets[a + 1]]
+    caps_b = polygons.caps[polygons.offsets[b]:polygons.offsets[b + 1]]
+    return _outside_caps(center[b], radius[b], caps_a) or _outside_caps(
+        center[a], radius[a], caps_b
+    )
+
+
+def _merge_pass(polygons, pixelized):
+    """Merge pairs of polygons that differ only in the side of one cap.
+
+    Two polygons with the same weight and pixel, one with cap ``c`` and
+    the other with its complement, are replaced by their union: the
+    polygon made of the other caps. It takes the place of the first one,
+    which moves the area of the second polygon ahead of the polygons in
+    between; mangle assigns a point to the first polygon containing it,
+    so the merge is skipped unless those polygons can't overlap it.
+    """
+    caps = [
+        polygons.caps[polygons.offsets[i]:polygons.offsets[i + 1]]
+        for i in range(polygons.npoly)
+    ]
+    keys = [set(map(tuple, c.tolist())) for c in caps]
+
+    # polygons that would be the union if the cap were dropped
+    groups = {}
+    for i, poly_caps in enumerate(caps):
+        tuples = list(map(tuple, poly_caps.tolist()))
+        for j, (x, y, z, cm) in enumerate(tuples):
+            others = frozenset(tuples[:j] + tuples[j + 1:])
+            key = (
+                polygons.pixels[i],
+                polygons.weights[i],
+                others,
+                (x, y, z, abs(cm)),
+            )
+            groups.setdefault(key, []).append((i, j, cm))
+
+    by_pixel = _by_pixel(polygons, pixelized)
+
+    areas = polygons.areas.copy()
+    alive = np.ones(polygons.npoly, dtype=bool)
+    touched = np.zeros(polygons.npoly, dtype=bool)
+    for members in groups.values():
+        if len(members) != 2 or members[0][2] != -members[1][2]:
+            continue
+        (i, cap, _), (j, _, _) = sorted(members)
+        if touched[i] or touched[j]:
+            continue
+        pixel = polygons.pixels[i] if pixelized else None
+        between = [k for k in by_pixel[pixel] if i < k < j]
+        if any(
+            touched[k] or not _disjoint(polygons, keys, j, k) for k in between
+        ):
+            continue
+        caps[i] = np.delete(caps[i], cap, axis=0)
+        areas[i] += areas[j]
+        alive[j] = False
+        touched[i] = touched[j] = True
+
+    if alive.all():
+        return polygons
+    return _subset(polygons, np.flatnonzero(alive), caps, areas)
+
+
+def _by_pixel(polygons, pixelized):
+    """Positions of the polygons mangle tests for each pixel, in order."""
+    if not pixelized:
+        return {None: list(range(polygons.npoly))}
+    by_pixel = {}
+    for i, pixel in enumerate(polygons.pixels):
+        by_pixel.setdefault(pixel, []).append(i)
+    return by_pixel
+
+
+def _subset(polygons, keep, caps=None, areas=None):
+    """Polygons at the positions keep, optionally with new caps or areas."""
+    if caps is None:
+        caps = [
+            polygons.caps[polygons.offsets[i]:polygons.offsets[i + 1]]
+            for i in range(polygons.npoly)
+        ]
+    if areas is None:
+        areas = polygons.areas
+    return _from_list(
+        [caps[i] for i in keep],
+        polygons.ids[keep],
+        polygons.weights[keep],
+        polygons.pixels[keep],
+        areas[keep],
+        polygons.header,
+    )
+
+
+def simplify(polygons, drop_zero_weight=False):
+    """Reduce the number of polygons of a mask keeping its geometry.
+
+    Polygons with zero area are dropped, and neighbours with the same
+    weight split along a cap (as left by pixelization and balkanization)
+    are merged back, repeating until no pair can be merged. The merged
+    polygon keeps the id of the first of the pair. ``contains`` and
+    ``weight`` give the same results for the simplified mask.
+
+    Parameters
+    ----------
+    polygons: randomsdss.geometry.Polygons
+        Polygons of the mask.
+    drop_zero_weight: bool
+        Also drop the polygons with zero weight, unless they hide part of
+        a later polygon. ``weight`` is unchanged, but points inside the
+        dropped polygons are outside the mask for ``contains``.
+
+    Returns
+    -------
+    simplified: randomsdss.geometry.Polygons
+        Polygons of the simplified mask.
+    """
+    pixelized = any(
+        line.startswith("pixelization") for line in polygons.header
+    )
+    polygons = _subset(polygons, np.flatnonzero(polygons.areas > 0))
+
+    if drop_zero_weight:
+        keys = [
+            set(map(tuple, polygons.caps[start:stop].tolist()))
+            for start, stop in zip(polygons.offsets[:-1], polygons.offsets[1:])
+        ]
+        alive = np.ones(polygons.npoly, dtype=bool)
+        for members in _by_pixel(polygons, pixelized).values():
+            for n, i in enumerate(members):
+                if polygons.weights[i] == 0:
+                    # keep it if it could hide a later polygon
+                    alive[i] = any(
+                        polygons.weights[k] != 0
+                        and not _disjoint(polygons, keys, i, k)
+                        for k in members[n + 1:]
+                    )
+        polygons = _subset(polygons, np.flatnonzero(alive))
+
+    while True:
+        merged = _merge_pass(polygons, pixelized)
+        if merged is polygons:
+            return polygons
+        polygons = merged
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# AREAS AND BOXES
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def _on_circle(s, n, e1, e2, phi):
+    """Point and derivative at angle phi along the circle n.p = s."""
+    rho = np.sqrt(np.clip(1.0 - s**2, 0.0, None))
+    cos, sin = np.cos(phi)[..., None], np.sin(phi)[..., None]
+    point = s[..., None] * n + rho[..., None] * (cos * e1 + sin * e2)
+    tangent = rho[..., None] * (cos * e2 - sin * e1)
+    return point, tangent
+
+
+def _edge_arcs(caps):
+    """Find the arcs of the cap circles forming the edges of polygons.
+
+    Every cap is written as the region n.p > s of the sphere. The angles
+    of the arcs along each circle go from e1 towards e2.
+
+    Parameters
+    ----------
+    caps: numpy.ndarray
+        Array of shape (npoly, k, 4) of padded polygons.
+
+    Returns
+    -------
+    n, s, e1, e2: numpy.ndarray
+        Pole, offset and axes of each cap, of shape (npoly, k, ...).
+    circle: numpy.ndarray
+        True for the caps whose circle may be part of an edge.
+    empty: numpy.ndarray
+        True for the polygons with no area.
+    pid, cid, start, stop: numpy.ndarray
+        Polygon, cap and start and stop angles of each arc.
+    """
+    npoly, k = caps.shape[:2]
+    # every cap as the region n.p > s
+    cm = caps[..., 3]
+    n = caps[..., :3] * np.where(cm >= 0, 1.0, -1.0)[..., None]
+    s = np.where(cm >= 0, 1.0 - cm, -1.0 - cm)
+    empty = np.any(s >= 1.0, axis=1)
+    circle = s > -1.0
+
+    # repeated caps add nothing and a cap with its complement leaves nothing
+    nn = np.einsum("pix,pjx->pij", n, n)
+    both = circle[:, :, None] & circle[:, None, :]
+    same = (nn > 1.0 - 1e-15) & (np.abs(s[:, :, None] - s[:, None, :]) < 1e-15)
+    circle &= ~np.any(same & both & np.tri(k, k, -1, dtype=bool), axis=2)
+    opposite = nn < -1.0 + 1e-15
+    opposite &= np.abs(s[:, :, None] + s[:, None, :]) < 1e-15
+    empty |= np.any(opposite & both, axis=(1, 2))
+    both = circle[:, :, None] & circle[:, None, :] & ~np.eye(k, dtype=bool)
+
+    # intersections of each circle with the others, as angles along it
+    e1, e2 = (e.reshape(n.shape) for e in _orthonormal(n.reshape(-1, 3)))
+    rho = np.sqrt(np.clip(1.0 - s**2, 0.0, None))
+    a = rho[:, :, None] * np.einsum("pjx,pix->pij", n, e1)
+    b = rho[:, :, None] * np.einsum("pjx,pix->pij", n, e2)
+    c = s[:, None, :] - s[:, :, None] * nn
+    norm = np.hypot(a, b)
+    cross = both & (norm > 1e-15) & (np.abs(c) < norm)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base = np.arctan2(b, a)
+        delta = np.arccos(c / norm)
+    phi = np.where(
+        np.concatenate([cross, cross], axis=2),
+        np.concatenate([base - delta, base + delta], axis=2) % (2 * np.pi),
+        np.inf,
+    )
+    phi.sort(axis=2)
+    count = np.count_nonzero(cross, axis=2) * 2
+    # a circle crossing no other is a single edge starting anywhere
+    lonely = circle & (count == 0)
+    phi[lonely, 0] = 0.0
+    count[lonely] = 1
+
+    # the edges are the arcs between intersections inside every other cap
+    slot = np.arange(2 * k)
+    arc = slot < count[..., None]
+    start = np.where(arc, phi, 0.0)
+    stop = np.where(
+        slot == count[..., None] - 1,
+        phi[..., :1] + 2 * np.pi,
+        np.roll(start, -1, axis=2),
+    )
+    middle, _ = _on_circle(
+        s[..., None],
+        n[:, :, None],
+        e1[:, :, None],
+        e2[:, :, None],
+        0.5 * (start + stop),
+    )
+    inside = np.einsum("pitx,pjx->pitj", middle, n) > s[:, None, None]
+    inside |= ~both[:, :, None]
+    edge = arc & inside.all(axis=3) & circle[..., None] & ~empty[:, None, None]
+
+    pid, cid, _ = np.nonzero(edge)
+    return n, s, e1, e2, circle, empty, pid, cid, start[edge], stop[edge]
+
+
+def _caps_area(caps):
+    """Area of padded polygons, see caps_area."""
+    npoly = len(caps)
+    n, s, e1, e2, circle, empty, pid, cid, start, stop = _edge_arcs(caps)
+
+    # The area is the integral of (1 - z) dlon along the edges, with the
+    # longitude around a pole whose antipode is far from every edge.
+    center = np.where(circle[..., None], n, 0.0).sum(axis=1)
+    norm = np.linalg.norm(center, axis=1, keepdims=True)
+    center = np.where(
+        norm > 0, center / np.where(norm > 0, norm, 1), _POLES[2]
+    )
+    antipode = np.concatenate(
+        [-center[:, None], np.broadcast_to(_POLES, (npoly,) + _POLES.shape)],
+        axis=1,
+    )
+    radius = np.arccos(np.clip(s, -1.0, 1.0))
+    angle = np.arccos(np.clip(np.einsum("pcx,pkx->pck", antipode, n), -1, 1))
+    dist = np.where(circle[:, None], np.abs(angle - radius[:, None]), np.inf)
+    best = dist.min(axis=2).argmax(axis=1)
+    south = antipode[np.arange(npoly), best]
+    ex, ey = _orthonormal(-south)
+
+    pieces = np.ceil((stop - start) / _GL_STEP).astype(int)
+    edge_id = np.repeat(np.arange(len(start)), pieces)
+    piece = np.arange(len(edge_id)) - np.repeat(
+        np.cumsum(pieces) - pieces, pieces
+    )
+    half = 0.5 * (stop - start)[edge_id] / pieces[edge_id]
+    phi = (start[edge_id] + 2 * half * piece)[:, None] + half[:, None] * (
+        _GL_NODES + 1.0
+    )
+    pid, cid = pid[edge_id], cid[edge_id]
+    point, tangent = _on_circle(
+        s[pid, cid][:, None],
+        n[pid, cid][:, None],
+        e1[pid, cid][:, None],
+        e2[pid, cid][:, None],
+        phi,
+    )
+    x = np.einsum("nqx,nx->nq", point, ex[pid])
+    y = np.einsum("nqx,nx->nq", point, ey[pid])
+    z = -np.einsum("nqx,nx->nq", point, south[pid])
+    dx = np.einsum("nqx,nx->nq", tangent, ex[pid])
+    dy = np.einsum("nqx,nx->nq", tangent, ey[pid])
+    integral = ((x * dy - y * dx) / (1.0 + z)) @ _GL_WEIGHTS * half
+
+    area = np.bincount(pid, weights=integral, minlength=npoly).astype(float)
+    # the integral misses a whole sphere if the antipode is inside
+    contains_south = np.all(
+        (np.einsum("px,pkx->pk", south, n) > s) | ~circle, axis=1
+    )
+    area[contains_south] += 4 * np.pi
+    area[empty] = 0.0
+    return area
+
+
+def caps_area(caps):
+    """Area of polygons given by their caps.
+
+    The area is integrated along the edges of each polygon, so it is
+    exact up to floating point errors for any shape.
+
+    Parameters
+    ----------
+    caps: numpy.ndarray
+        Array of shape (npoly, ncaps, 4) with the caps of each polygon,
+        padded with caps containing the whole sphere.
+
+    Returns
+    -------
+    area: numpy.ndarray
+        Area of each polygon in steradians.
+    """
+    caps = np.asarray(caps, dtype=float)
+    npoly, k = caps.shape[:2]
+    area = np.empty(npoly)
+    step = max(_BLOCK // (6 * k**3), 1)
+    for start in range(0, npoly, step):
+        chunk = slice(start, start + step)
+        area[chunk] = _caps_area(caps[chunk])
+    return area
+
+
+def ra_span(ra_min, ra_max, dec_min, dec_max):
+    """Check the limits of a box and return its RA start and width.
+
+    Parameters
+    ----------
+    ra_min, ra_max, dec_min, dec_max: float
+        Box limits in degrees, see ``box_caps``.
+
+    Returns
+    -------
+    start: float
+        Lower RA bound in degrees, in [0, 360).
+    width: float
+        Width of the RA range in degrees, up to 360.
+    """
+    if not (0.0 <= ra_min <= 360.0 and 0.0 <= ra_max <= 360.0):
+        raise ValueError("RA limits of the box must be within [0, 360].")
+    if not -90.0 <= dec_min < dec_max <= 90.0:
+        raise ValueError(
+            "DEC limits of the box must be within [-90, 90] and "
+            "dec_min < dec_max."
+        )
+    if ra_max - ra_min == 360.0:
+        return 0.0, 360.0
+    width = (ra_max - ra_min) % 360.0
+    if width == 0.0:
+        raise ValueError("The RA range of the box is empty.")
+    return ra_min % 360.0, width
+
+
+def box_caps(ra_min, ra_max, dec_min, dec_max):
+    """Caps of a RA, DEC box.
+
+    Parameters
+    ----------
+    ra_min, ra_max: float
+        RA limits in degrees, within [0, 360]. If ra_min > ra_max the box
+        wraps through RA 0; 0 and 360 give every RA.
+    dec_min, dec_max: float
+        DEC limits in degrees, with dec_min < dec_max.
+
+    Returns
+    -------
+    caps: numpy.ndarray
+        Array of shape (npieces, 4, 4) with the caps of one or two
+        polygons that make up the box, as boxes wider than 180 degrees in
+        RA are not convex.
+    """
+    start, width = ra_span(ra_min, ra_max, dec_min, dec_max)
+    sin_min, sin_max = np.sin(np.deg2rad([dec_min, dec_max]))
+    dec_caps = [
+        (0.0, 0.0, 1.0, 1.0 - sin_min),
+        (0.0, 0.0, -1.0, 1.0 + sin_max),
+    ]
+    if width >= 360.0:
+        return np.array([dec_caps + [_FULL_CAP, _FULL_CAP]])
+
+    npieces = 1 if width <= 180.0 else 2
+    pieces = []
+    for i in range(npieces):
+        west = np.deg2rad(start + i * width / npieces)
+        east = np.deg2rad(start + (i + 1) * width / npieces)
+        ra_caps = [
+            (-np.sin(west), np.cos(west), 0.0, 1.0),
+            (np.sin(east), -np.cos(east), 0.0, 1.0),
+        ]
+        pieces.append(dec_caps + ra_caps)
+    return np.array(pieces)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# EDGES
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+@attr.s(frozen=True)
+class Arcs:
+    """Arcs of circles on the sphere, as the edges of polygons.
+
+    Parameters
+    ----------
+    polygon: numpy.ndarray
+        Position of the polygon of each arc.
+    pole: numpy.ndarray
+        Array of shape (N, 3) with the pole of the circle of each arc.
+        The polygon is on the side of the pole.
+    radius: numpy.ndarray
+        Angle from the pole to the circle in radians.
+    e1, e2: numpy.ndarray
+        Arrays of shape (N, 3) with the axes of the plane of the circle.
+    start, stop: numpy.ndarray
+        Angles of the ends of each arc along its circle in radians, from
+        e1 towards e2, with ``start <= stop <= start + 2 * pi``.
+    """
+
+    polygon = attr.ib()
+    pole = attr.ib()
+    radius = attr.ib()
+    e1 = attr.ib()
+    e2 = attr.ib()
+    start = attr.ib()
+    stop = attr.ib()
+
+    def __len__(self):
+        """Get the number of arcs."""
+        return len(self.polygon)
+
+    def point(self, index, phi):
+        """Return the points at angles phi along the arcs given by index."""
+        r = self.radius[index][:, None]
+        phi = np.asarray(phi)[:, None]
+        return np.cos(r) * self.pole[index] + np.sin(r) * (
+            np.cos(phi) * self.e1[index] + np.sin(phi) * self.e2[index]
+        )
+
+    def split(self, step):
+        """Split the arcs in pieces no longer than step radians.
+
+        Every point of an arc is within step / 2 of the middle of a piece.
+
+        Returns
+        -------
+        pieces: Arcs
+            The pieces, in the order of the arcs.
+        """
+        length = np.sin(self.radius) * (self.stop - self.start)
+        npieces = np.maximum(np.ceil(length / step), 1).astype(np.intp)
+        index = np.repeat(np.arange(len(self)), npieces)
+        piece = np.arange(len(index)) - np.repeat(
+            np.cumsum(npieces) - npieces, npieces
+        )
+        width = (self.stop - self.start)[index] / npieces[index]
+        start = self.start[index] + piece * width
+        return Arcs(
+            self.polygon[index],
+            self.pole[index],
+            self.radius[index],
+            self.e1[index],
+            self.e2[index],
+            start,
+            start + width,
+        )
+
+    def middle(self):
+        """Return the middle point of each arc."""
+        return self.point(np.arange(len(self)), 0.5 * (self.start + self.stop))
+
+    def distance(self, xyz, index):
+        """Return the angle from each point to the arc given by index.
+
+        Along a circle the distance to a point grows with the difference
+        of their angles around the pole, so the closest point of the arc
+        is the one at the angle of the point, if the arc reaches it, or
+        else one of its ends.
+
+        Parameters
+        ----------
+        xyz: numpy.ndarray
+            Array of shape (N, 3) with unit vectors.
+        index: numpy.ndarray
+            Arc of each point.
+
+        Returns
+        -------
+        angle: numpy.ndarray
+            Angular distance in radians.
+        """
+        pole = self.pole[index]
+        phi = np.arctan2(
+            np.einsum("ij,ij->i", xyz, self.e2[index]),
+            np.einsum("ij,ij->i", xyz, self.e1[index]),
+        )
+        start, stop = self.start[index], self.stop[index]
+        angle = np.abs(_angle(xyz, pole) - self.radius[index])
+        out = (phi - start) % (2 * np.pi) > stop - start
+        xyz, index = xyz[out], index[out]
+        angle[out] = np.minimum(
+            _angle(xyz, self.point(index, start[out])),
+            _angle(xyz, self.point(index, stop[out])),
+        )
+        return angle
+
+
+def polygon_edges(polygons, index=None):
+    """Return the edges of polygons as arcs of their cap circles.
+
+    Parameters
+    ----------
+    polygons: Polygons
+        Polygons of a mask.
+    index: numpy.ndarray, optional
+        Positions of the polygons. Defaults to all of them.
+
+    Returns
+    -------
+    arcs: Arcs
+        Edges of the polygons.
+    """
+    if index is None:
+        index = np.arange(polygons.npoly)
+    index = np.asarray(index, dtype=np.intp)
+    ncaps = polygons.ncaps[index]
+    parts = []
+    for k in np.unique(ncaps):
+        chosen = index[ncaps == k]
+        step = max(_BLOCK // (6 * max(k, 1) ** 3), 1)
+        for begin in range(0, len(chosen), step):
+            chunk = chosen[begin:begin + step]
+            caps = polygons.padded_caps[chunk, : max(k, 1)]
+            n, _, e1, e2, _, _, pid, cid, start, stop = _edge_arcs(caps)
+            cm = caps[pid, cid, 3].clip(-2.0, 2.0)
+            # from cm, as the arccos of n.p is inaccurate for small caps
+            half = np.arcsin(np.sqrt(np.abs(cm) / 2))
+            radius = np.where(cm >= 0, 2 * half, np.pi - 2 * half)
+            parts.append(
+                (
+                    chunk[pid],
+                    n[pid, cid],
+                    radius,
+                    e1[pid, cid],
+                    e2[pid, cid],
+                    start,
+                    stop,
+                )
+            )
+    empty = (
+        np.zeros(0, np.intp),
+        np.zeros((0, 3)),
+        np.zeros(0),
+        np.zeros((0, 3)),
+        np.zeros((0, 3)),
+        np.zeros(0),
+        np.zeros(0),
+    )
+    return Arcs(*(np.concatenate(col) for col in zip(empty, *parts)))
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# REGIONS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def equal_area_regions(xyz, areas, n):
+    """Split polygons in n contiguous regions of about equal area.
+
+    The polygons are cut recursively in two by a plane perpendicular to
+    the direction of largest spread of their centers, at the position
+    leaving on each side an area proportional to its number of regions.
+    Each region differs from the mean area by at most about the area of
+    its largest polygon.
+
+    Parameters
+    ----------
+    xyz: numpy.ndarray
+        Unit vectors of the centers of the polygons, shape (N, 3).
+    areas: numpy.ndarray
+        Area of each polygon. Polygons with area 0 are left out.
+    n: int
+        Number of regions.
+
+    Returns
+    -------
+    labels: numpy.ndarray
+        Region of each polygon, from 0 to n - 1, or -1 if left out.
+    """
+    areas = np.asarray(areas, dtype=float)
+    labels = np.full(len(areas), -1, dtype=np.intp)
+    index = np.flatnonzero(areas > 0)
+    if not 1 <= n <= len(index):
+        raise ValueError(
+            f"n must be between 1 and the number of polygons with area, "
+            f"{len(index)}."
+        )
+
+    pending = [(index, 0, n)]
+    while pending:
+        index, first, count = pending.pop()
+        if count == 1:
+            labels[index] = first
+            continue
+        weights, points = areas[index], xyz[index]
+        points = points - np.average(points, axis=0, weights=weights)
+        spread = (points.T * weights) @ points
+        axis = np.linalg.eigh(spread)[1][:, -1]
+        order = np.argsort(points @ axis, kind="stable")
+
+        left = count // 2
+        cumsum = np.cumsum(weights[order])
+        target = cumsum[-1] * left / count
+        cut = np.searchsorted(cumsum, target)
+        # take the polygon crossing the target if it brings the area closer
+        below = cumsum[cut - 1] if cut else 0.0
+        cut += cumsum[cut] - target < target - below
+        cut = np.clip(cut, left, len(index) - (count - left))
+        pending.append((index[order[:cut]], first, left))
+        pending.append((index[order[cut:]], first + left, count - left))
+    return labels
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# HEALPIX
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Row of the southernmost corner and longitude of each base pixel
+_FACE_ROW = np.array([2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4])
+_FACE_LON = np.array([1, 3, 5, 7, 0, 2, 4, 6, 1, 3, 5, 7])
+
+
+def _deinterleave(value):
+    """Gather the even bits of 64 bit integers, undoing _interleave."""
+    value = np.asarray(value).astype(np.uint64) & np.uint64(
+        0x5555555555555555
+    )
+    for shift, mask in (
+        (1, 0x3333333333333333),
+        (2, 0x0F0F0F0F0F0F0F0F),
+        (4, 0x00FF00FF00FF00FF),
+        (8, 0x0000FFFF0000FFFF),
+        (16, 0x00000000FFFFFFFF),
+    ):
+        value = (value | (value >> np.uint64(shift))) & np.uint64(mask)
+    return value.astype(np.int64)
+
+
+def _check_nside(nside):
+    """Raise ValueError unless nside is a power of 2 up to 2**29."""
+    if not (isinstance(nside, (int, np.integer)) and 0 < nside <= 2**29):
+        raise ValueError("nside must be a power of 2 up to 2**29.")
+    if nside & (nside - 1):
+        raise ValueError("nside must be a power of 2 up to 2**29.")
+
+
+def healpix_to_radec(nside, pixels):
+    """Return the centers of HEALPix pixels in the nested scheme.
+
+    Parameters
+    ----------
+    nside: int
+        Resolution of the map, a power of 2. It has ``12 * nside**2``
+        pixels.
+    pixels: numpy.ndarray
+        Nested pixel numbers.
+
+    Returns
+    -------
+    ra: numpy.ndarray
+        Right Ascension of the centers in degrees.
+    dec: numpy.ndarray
+        Declination of the centers in degrees.
+    """
+    _check_nside(nside)
+    pixels = np.asarray(pixels, dtype=np.int64)
+    face, inner = np.divmod(pixels, nside * nside)
+    x, y = _deinterleave(inner), _deinterleave(inner >> 1)
+    ring = _FACE_ROW[face] * nside - (x + y) - 1
+
+    north, south = ring < nside, ring > 3 * nside
+    width = np.where(north, ring, np.where(south, 4 * nside - ring, nside))
+    z = np.where(
+        north,
+        1.0 - width**2 / (3.0 * nside**2),
+        np.where(
+            south,
+            width**2 / (3.0 * nside**2) - 1.0,
+            (2 * nside - ring) * 2.0 / (3.0 * nside),
+        ),
+    )
+    shift = np.where(north | south, 0, (ring - nside) & 1)
+    lon = (_FACE_LON[face] * width + (x - y) + 1 + shift) // 2
+    lon = np.where(lon > 4 * nside, lon - 4 * nside, lon)
+    lon = np.where(lon < 1, lon + 4 * nside, lon)
+    ra = (lon - (shift + 1) * 0.5) * (90.0 / width)
+    return ra % 360.0, np.rad2deg(np.arcsin(np.clip(z, -1.0, 1.0)))
+
+
+def radec_to_healpix(nside, ra, dec):
+    """Return the nested HEALPix pixel of each point.
+
+    Parameters
+    ----------
+    nside: int
+        Resolution of the map, a power of 2.
+    ra: numpy.ndarray
+        Right Ascension in degrees.
+    dec: numpy.ndarray
+        Declination in degrees.
+
+    Returns
+    -------
+    pixels: numpy.ndarray
+        Nested pixel numbers.
+    """
+    _check_nside(nside)
+    z = np.sin(np.deg2rad(np.asarray(dec, dtype=float)))
+    tt = (np.asarray(ra, dtype=float) % 360.0) / 90.0
+    tt = np.where(tt >= 4.0, 0.0, tt)
+    equator = np.abs(z) <= 2.0 / 3.0
+
+    # equatorial region
+    up = nside * (0.5 + tt)
+    down = nside * z * 0.75
+    jp = (up - down).astype(np.int64)
+    jm = (up + down).astype(np.int64)
+    face_p, face_m = jp // nside, jm // nside
+    eq_face = np.where(
+        face_p == face_m,
+        face_p | 4,
+        np.where(face_p < face_m, face_p, face_m + 8),
+    )
+    eq_x = jm & (nside - 1)
+    eq_y = nside - (jp & (nside - 1)) - 1
+
+    # polar caps
+    column = np.minimum(tt.astype(np.int64), 3)
+    tp = tt - column
+    side = nside * np.sqrt(3.0 * (1.0 - np.abs(z)))
+    jp = np.minimum((tp * side).astype(np.int64), nside - 1)
+    jm = np.minimum(((1.0 - tp) * side).astype(np.int64), nside - 1)
+    pole_face = np.where(z >= 0, column, column + 8)
+    pole_x = np.where(z >= 0, nside - jm - 1, jp)
+    pole_y = np.where(z >= 0, nside - jp - 1, jm)
+
+    face = np.where(equator, eq_face, pole_face)
+    x = np.where(equator, eq_x, pole_x)
+    y = np.where(equator, eq_y, pole_y)
+    inner = _interleave(x) | (_interleave(y) << np.uint64(1))
+    return face * nside * nside + inner.astype(np.int64)
@@ -0,0 +1,411 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Mask catalogs file to file, without loading them in memory.
+
+The input catalog is read in chunks of rows, the footprint columns of each
+chunk are computed in worker processes, which load the footprints once,
+and the chunks are written to the output file with the input columns and
+the new ones, in the input order. A few chunks are kept in flight, so the
+memory is bounded by the chunk size and reading and writing overlap with
+the work of the processes.
+
+The format of each file is given by its extension. ``.npy`` files hold a
+structured array and are read memory-mapped with numpy alone. Parquet
+(``.parquet``, with pyarrow), HDF5 (``.h5``/``.hdf5``, one 1-d dataset
+per column in the root group, with h5py) and FITS (``.fits``/``.fit``,
+the first table extension, with fitsio) are read and written in chunks
+too if those packages are installed.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import collections
+import itertools
+import os
+import pathlib
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from .randomsdss import DR
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Rows read, masked and written at once
+CHUNK_ROWS = 2**20
+
+# Columns that can be added for each footprint
+MASK_COLUMNS = ("contains", "polyid", "weight")
+
+# Chunks in flight per worker process, so that one is always waiting
+IN_FLIGHT = 2
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# READERS AND WRITERS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Every reader returns the number of rows and an iterator over chunks of
+# at most chunk_size rows, as dicts of column name to array. Every writer
+# consumes such an iterator and writes nrows rows to a path.
+
+
+def _read_npy(path, chunk_size):
+    """Read a structured .npy file memory-mapped."""
+    table = np.load(path, mmap_mode="r")
+    if table.dtype.names is None or table.ndim != 1:
+        raise ValueError(f"{path} must hold a 1-d structured array.")
+
+    def chunks():
+        for start in range(0, len(table), chunk_size):
+            rows = np.array(table[start:start + chunk_size])
+            yield {name: rows[name] for name in rows.dtype.names}
+
+    return len(table), chunks()
+
+
+def _write_npy(path, nrows, chunks):
+    """Write the chunks to a structured .npy file memory-mapped."""
+    chunks = iter(chunks)
+    first = next(chunks)
+    dtype = [(name, col.dtype) for name, col in first.items()]
+    table = np.lib.format.open_memmap(path, "w+", dtype, (nrows,))
+    start = 0
+    for chunk in itertools.chain([first], chunks):
+        stop = start + len(next(iter(chunk.values())))
+        for name, col in chunk.items():
+            table[name][start:stop] = col
+        start = stop
+    table.flush()
+
+
+def _read_parquet(path, chunk_size):
+    """Read a Parquet file by batches of rows."""
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+
+    def chunks():
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            yield {
+                name: col.to_numpy(zero_copy_only=False)
+                for name, col in zip(batch.schema.names, batch.columns)
+            }
+
+    return parquet.metadata.num_rows, chunks()
+
+
+def _write_parquet(path, nrows, chunks):
+    """Write each chunk to a Parquet file as a row group."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.table(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _read_hdf5(path, chunk_size):
+    """Read the 1-d datasets of the root group of an HDF5 file."""
+    import h5py
+
+    with h5py.File(path, "r") as hdf:
+        names = [
+            name
+            for name, item in hdf.items()
+            if isinstance(item, h5py.Dataset) and item.ndim == 1
+        ]
+        sizes = {len(hdf[name]) for name in names}
+    if len(sizes) != 1:
+        raise ValueError(f"{path} must hold 1-d datasets of equal length.")
+    nrows = sizes.pop()
+
+    def chunks():
+        with h5py.File(path, "r") as hdf:
+            for start in range(0, nrows, chunk_size):
+                chunk = slice(start, start + chunk_size)
+                yield {name: hdf[name][chunk] for name in names}
+
+    return nrows, chunks()
+
+
+def _write_hdf5(path, nrows, chunks):
+    """Write the chunks to one 1-d dataset per column of an HDF5 file."""
+    import h5py
+
+    with h5py.File(path, "w") as hdf:
+        start = 0
+        for chunk in chunks:
+            stop = start + len(next(iter(chunk.values())))
+            for name, col in chunk.items():
+                if name not in hdf:
+                    hdf.create_dataset(name, (nrows,), dtype=col.dtype)
+                hdf[name][start:stop] = col
+            start = stop
+
+
+def _read_fits(path, chunk_size):
+    """Read the first table extension of a FITS file by rows."""
+    import fitsio
+
+    with fitsio.FITS(path) as fits:
+        ext = next(
+            i for i, hdu in enumerate(fits) if hdu.get_exttype() != "IMAGE_HDU"
+        )
+        nrows = fits[ext].get_nrows()
+
+    def chunks():
+        with fitsio.FITS(path) as fits:
+            for start in range(0, nrows, chunk_size):
+                rows = fits[ext][start:start + chunk_size]
+                yield {name: rows[name] for name in rows.dtype.names}
+
+    return nrows, chunks()
+
+
+def _write_fits(path, nrows, chunks):
+    """Append the chunks to a table extension of a FITS file."""
+    import fitsio
+
+    with fitsio.FITS(path, "rw", clobber=True) as fits:
+        for chunk in chunks:
+            rows = np.rec.fromarrays(list(chunk.values()), names=list(chunk))
+            if len(fits) < 2:
+                fits.write(rows)
+            else:
+                fits[-1].append(rows)
+
+
+FORMATS = {
+    ".npy": (_read_npy, _write_npy),
+    ".parquet": (_read_parquet, _write_parquet),
+    ".h5": (_read_hdf5, _write_hdf5),
+    ".hdf5": (_read_hdf5, _write_hdf5),
+    ".fits": (_read_fits, _write_fits),
+    ".fit": (_read_fits, _write_fits),
+}
+
+
+def _format(path):
+    """Return the reader and writer of a file, by its extension."""
+    suffix = pathlib.Path(path).suffix.lower()
+    if suffix not in FORMATS:
+        raise ValueError(
+            f"Unknown format of {path}. Choose from {tuple(FORMATS)}."
+        )
+    return FORMATS[suffix]
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# WORKERS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# DR instances of each worker process, loaded once by _init_worker
+_WORKER_FOOTPRINTS = None
+
+
+def _load_footprint(dr, catalog, simplified, filename, weights):
+    """Load a footprint from the caller's polygon file and weights."""
+    footprint = DR(
+        dr=dr, catalog=catalog, simplified=simplified, ply_path=filename
+    )
+    if weights is not None and not np.array_equal(
+        footprint.weights, weights
+    ):
+        footprint.set_weights(weights)
+    return footprint
+
+
+def _init_worker(footprints):
+    global _WORKER_FOOTPRINTS
+    _WORKER_FOOTPRINTS = [_load_footprint(*spec) for spec in footprints]
+
+
+def _mask_chunk(ra, dec, columns):
+    """Compute the footprint columns of a chunk, one pymangle call each."""
+    masked = {}
+    for footprint in _WORKER_FOOTPRINTS:
+        pid, weight = footprint.polyid_and_weight(ra, dec)
+        values = {
+            "contains": pid >= 0,
+            "polyid": np.asarray(pid, dtype=np.int64),
+            "weight": np.asarray(weight, dtype=np.float64),
+        }
+        prefix = f"{footprint.dr}_{footprint.catalog}_"
+        masked.update({prefix + name: values[name] for name in columns})
+    return masked
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# PIPELINE
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def _spec(footprint):
+    """Return what a worker needs to load a footprint as the caller has it.
+
+    That is (dr, catalog, simplified, filename, weights). The polygon file
+    and the current weights of a DR are passed, so the workers see the
+    changes of ``set_weights`` or ``set_completeness``. A (dr, catalog)
+    pair is loaded as it is found, with the weights of its file.
+    """
+    if isinstance(footprint, DR):
+        return (
+            footprint.dr,
+            footprint.catalog,
+            footprint.simplified,
+            footprint.mangle_.filename,
+            np.array(footprint.weights),
+        )
+    dr, catalog = footprint
+    return dr, catalog, False, None, None
+
+
+def _masked_chunks(chunks, ra, dec, columns, executor, in_flight):
+    """Yield the chunks with their footprint columns, in order."""
+    pending = collections.deque()
+    chunks = iter(chunks)
+    exhausted = False
+    while pending or not exhausted:
+        while not exhausted and len(pending) < in_flight:
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+                break
+            for name in (ra, dec):
+                if name not in chunk:
+                    raise ValueError(f"The catalog has no column {name}.")
+            pending.append(
+                (
+                    chunk,
+                    executor.submit(
+                        _mask_chunk,
+                        np.asarray(chunk[ra], dtype=float),
+                        np.asarray(chunk[dec], dtype=float),
+                        columns,
+                    ),
+                )
+            )
+        if pending:
+            chunk, future = pending.popleft()
+            masked = future.result()
+            repeated = set(chunk) & set(masked)
+            if repeated:
+                raise ValueError(f"The catalog already has {repeated}.")
+            yield {**chunk, **masked}
+
+
+def mask_catalog(
+    input,
+    output,
+    footprints,
+    ra="ra",
+    dec="dec",
+    columns=MASK_COLUMNS,
+    chunk_size=CHUNK_ROWS,
+    n_jobs=1,
+    overwrite=False,
+):
+    """Add footprint columns to a catalog, file to file.
+
+    For each footprint and each of columns, a column named
+    ``{dr}_{catalog}_{column}`` is added: ``contains`` (bool), ``polyid``
+    (int64, -1 outside) and ``weight`` (float64, 0 outside), as returned
+    by ``DR.polyid_and_weight``. The output is written to a temporary
+    file in the same directory and moved to output when complete.
+
+    Parameters
+    ----------
+    input: str or pathlib.Path
+        Catalog to mask, in any of the formats of ``FORMATS``.
+    output: str or pathlib.Path
+        File to write, in any of the formats of ``FORMATS``.
+    footprints: sequence
+        Footprints as ``randomsdss.DR`` objects or (dr, catalog) pairs.
+        DR objects are masked with their current weights, e.g. after
+        ``DR.set_weights`` or ``DR.set_completeness``.
+    ra, dec: str
+        Names of the columns with the coordinates in degrees.
+    columns: sequence of str
+        Columns to add for each footprint, from ``MASK_COLUMNS``.
+    chunk_size: int
+        Rows of each chunk. The memory used grows with it, the number of
+        processes and the number of columns.
+    n_jobs: int
+        Number of worker processes. With 1 the chunks are masked in a
+        thread of this process.
+    overwrite: bool
+        Replace output if it exists.
+
+    Return
+    ------
+    report: dict
+        Number of ``rows``, ``seconds`` taken and ``rows_per_second``.
+    """
+    start = time.perf_counter()
+    output = pathlib.Path(output)
+    unknown = set(columns) - set(MASK_COLUMNS)
+    if unknown or not columns:
+        raise ValueError(f"Unknown columns {unknown}. Choose {MASK_COLUMNS}.")
+    if not footprints:
+        raise ValueError("Give at least one footprint.")
+    if chunk_size < 1 or n_jobs < 1:
+        raise ValueError("chunk_size and n_jobs must be positive.")
+    if output.exists() and not overwrite:
+        raise FileExistsError(f"{output} already exists.")
+    read, _ = _format(input)
+    _, write = _format(output)
+
+    specs = [_spec(footprint) for footprint in footprints]
+    nrows, chunks = read(input, chunk_size)
+    if nrows == 0:
+        raise ValueError(f"{input} has no rows.")
+    if n_jobs == 1:
+        _init_worker(specs)
+        executor = ThreadPoolExecutor(1)
+    else:
+        executor = ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker, initargs=(specs,)
+        )
+
+    tmp_path = output.with_name(f".{output.stem}.{os.getpid()}.tmp")
+    tmp_path = tmp_path.with_suffix(output.suffix)
+    try:
+        with executor:
+            masked = _masked_chunks(
+                chunks, ra, dec, tuple(columns), executor, IN_FLIGHT * n_jobs
+            )
+            write(tmp_path, nrows, masked)
+        os.replace(tmp_path, output)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+    seconds = time.perf_counter() - start
+    return {
+        "rows": nrows,
+        "seconds": seconds,
+        "rows_per_second": nrows / seconds if seconds > 0 else float("inf"),
+    }
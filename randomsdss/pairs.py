@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Angular pair counts of random and galaxy catalogs.
+
+The points are unit vectors, like the ones returned by
+``DR.sky_random(output="xyz")``, and the pairs are counted with k-d trees
+in bins of chord distance, ``2 sin(theta / 2)``. The catalogs are split
+in blocks of at most ``BLOCK_SIZE`` points and each pair of blocks is
+counted in a thread (scipy releases the GIL while counting). Only the two
+blocks of a pair are in memory at once, so the catalogs can be
+memory-mapped arrays larger than the memory, e.g. filled by
+``DR.sky_random(out=...)``.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import itertools
+import os
+
+import numpy as np
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Largest number of points of a block, whose tree is built in memory
+BLOCK_SIZE = 2**22
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# FUNCTIONS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def chord(theta):
+    """Convert angular separations to chord distances of unit vectors.
+
+    Parameters
+    ----------
+    theta: float or numpy.ndarray
+        Angles in degrees.
+
+    Return
+    ------
+    chord: float or numpy.ndarray
+        Distance between two unit vectors separated by theta.
+    """
+    return 2.0 * np.sin(np.deg2rad(np.asarray(theta, dtype=float)) / 2.0)
+
+
+def _length(points):
+    """Return the number of points of an (N, 3) array or of 3 columns."""
+    if isinstance(points, np.ndarray) and points.ndim == 2:
+        if points.shape[1] != 3:
+            raise ValueError("points must have shape (N, 3).")
+        return len(points)
+    if len(points) != 3 or len({len(col) for col in points}) != 1:
+        raise ValueError("points must be (N, 3) or 3 columns of length N.")
+    return len(points[0])
+
+
+def _block(points, start, stop):
+    """Points of a block as a float64 (n, 3) array."""
+    if isinstance(points, np.ndarray) and points.ndim == 2:
+        return np.asarray(points[start:stop], dtype=float)
+    return np.column_stack([col[start:stop] for col in points]).astype(float)
+
+
+def _blocks(size, block_size):
+    """Limits of the blocks of a catalog."""
+    return [
+        (start, min(start + block_size, size))
+        for start in range(0, size, block_size)
+    ]
+
+
+def count_pairs(
+    points,
+    bins,
+    others=None,
+    weights=None,
+    other_weights=None,
+    block_size=None,
+    max_workers=None,
+):
+    """Count the pairs of points in bins of angular separation.
+
+    Without others, the pairs of the catalog with itself are counted once
+    (RR or DD). With others, every pair of a point and an other is
+    counted (DR). A pair at separation theta is in bin i if
+    ``bins[i] < theta <= bins[i + 1]``.
+
+    Parameters
+    ----------
+    points: numpy.ndarray or sequence of numpy.ndarray
+        Unit vectors, as an (N, 3) array or as the 3 columns returned by
+        ``DR.sky_random(output="xyz")``. They can be memory-mapped.
+    bins: numpy.ndarray
+        Edges of the bins in degrees, increasing.
+    others: numpy.ndarray or sequence of numpy.ndarray, optional
+        Unit vectors of the second catalog.
+    weights: numpy.ndarray, optional
+        Weight of each point, e.g. ``DR.weight(ra, dec)``. Pairs are then
+        counted with the product of their weights.
+    other_weights: numpy.ndarray, optional
+        Weight of each other point.
+    block_size: int, optional
+        Number of points of each block. Defaults to ``BLOCK_SIZE``, or
+        less to give each thread at least one pair of blocks.
+    max_workers: int, optional
+        Number of threads counting pairs of blocks at once. Defaults to
+        the number of CPUs.
+
+    Returns
+    -------
+    counts: numpy.ndarray
+        Number of pairs (int) or sum of their weights (float) in each bin.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from scipy.spatial import cKDTree
+
+    bins = np.asarray(bins, dtype=float)
+    if bins.ndim != 1 or len(bins) < 2 or np.any(np.diff(bins) <= 0):
+        raise ValueError("bins must be at least two increasing edges.")
+    if bins[0] < 0 or bins[-1] > 180:
+        raise ValueError("bins must be between 0 and 180 degrees.")
+    if others is not None and (weights is None) != (other_weights is None):
+        raise ValueError("Give weights of both catalogs or of none.")
+    radii = chord(bins)
+
+    auto = others is None
+    others = points if auto else others
+    other_weights = weights if auto else other_weights
+    size, other_size = _length(points), _length(others)
+    max_workers = max_workers or os.cpu_count() or 1
+    if block_size is None:
+        largest = max(size, other_size)
+        block_size = min(BLOCK_SIZE, -(-largest // max_workers))
+    block_size = max(int(block_size), 1)
+
+    blocks = _blocks(size, block_size)
+    other_blocks = _blocks(other_size, block_size)
+    if auto:
+        tasks = itertools.combinations_with_replacement(range(len(blocks)), 2)
+    else:
+        tasks = itertools.product(range(len(blocks)), range(len(other_blocks)))
+
+    def tree(catalog, block_weights, limits):
+        start, stop = limits
+        block = cKDTree(_block(catalog, start, stop))
+        if block_weights is None:
+            return block, None
+        return block, np.asarray(block_weights[start:stop], dtype=float)
+
+    def count(task):
+        i, j = task
+        first, first_weights = tree(points, weights, blocks[i])
+        if auto and i == j:
+            second, second_weights = first, first_weights
+        else:
+            second, second_weights = tree(
+                others, other_weights, other_blocks[j]
+            )
+        pair_weights = None
+        if first_weights is not None:
+            pair_weights = (first_weights, second_weights)
+        counts = first.count_neighbors(
+            second, radii, weights=pair_weights, cumulative=False
+        )[1:]
+        # each pair within a block is found twice
+        return counts / 2 if auto and i == j else counts
+
+    total = np.zeros(len(bins) - 1, dtype=float)
+    with ThreadPoolExecutor(max_workers) as executor:
+        for counts in executor.map(count, tasks):
+            total += counts
+    return np.rint(total).astype(np.int64) if weights is None else total
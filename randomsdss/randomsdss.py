@@ -13,22 +13,70 @@
 
 """Generate random points within SDSS DR8 to DR16 footprint."""
 
-
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # IMPORTS
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
-from functools import wraps
+import hashlib
+import os
+from functools import cached_property, wraps
 
 import attr
 
 import numpy as np
 
-from pymangle import Mangle
+from . import cosmology, data, geometry, store
+from .data import PLY_PATH
 
-from scipy.stats import gaussian_kde
+# pymangle, scipy and the asyncio machinery are imported on first use,
+# as they take most of the import time and many scripts don't need them.
 
-from .data import PLY_PATH
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Number of candidate points tested against the mask at once. The
+# samplers always draw candidates in batches of this size, so that seeded
+# results don't depend on the number of points requested.
+CHUNK_SIZE = 2**16
+
+# Area of the whole sky in square degrees
+SKY_AREA = 4 * np.pi * np.rad2deg(1.0) ** 2
+
+# Methods available to fill the footprint with random points
+SKY_METHODS = ("uniform", "sobol", "stratified")
+
+# Coordinates in which random points can be returned
+OUTPUTS = ("radec", "xyz")
+
+# Methods available to draw random redshifts from a sample
+Z_METHODS = ("kde", "shuffle", "histogram")
+
+# Points sorted together along the curve by the coherent lookups
+COHERENT_BLOCK = 2**22
+
+# Points of each independently seeded block of a RandomStream
+STREAM_BLOCK = 2**18
+
+# Points stored by default in a RandomBank
+BANK_SIZE = 10**7
+
+# Record of each point of a RandomBank: its RA, DEC and polygon position
+BANK_DTYPE = np.dtype([("ra", "f8"), ("dec", "f8"), ("position", "i4")])
+
+# Longest piece of the footprint edges sampled by edge_distance, in degrees
+EDGE_STEP = 0.01
+
+# Step across an edge to find the weights on each side, in radians
+EDGE_OFFSET = 1e-8
+
+# Candidates drawn in an aperture of aperture_random without accepting
+# any, after which it is taken to have no weighted area
+APERTURE_TRIALS = 2**16
+
+# Distance from a HEALPix pixel center to its farthest point, in pixel
+# sides (the square root of its area), with a margin. It is at most 1.03.
+PIXEL_RADIUS = 1.5
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # EXCEPTIONS
@@ -84,6 +132,16 @@ def polygon_path(dr, catalog):
     return path
 
 
+async def aget_polygon(dr, catalog):
+    """Asynchronous version of ``get_polygon``.
+
+    The file is read in the thread pool of ``randomsdss.aio``.
+    """
+    from . import aio
+
+    return await aio.run(get_polygon, dr, catalog)
+
+
 def get_polygon(dr, catalog):
     """Return pymangle polygon object.
 
@@ -99,18 +157,296 @@ def get_polygon(dr, catalog):
     mangle: pymangle.Mangle
         Mangle instance with the polygon information.
     """
+    from pymangle import Mangle
+
+    return Mangle(str(_ply_file(dr, catalog)))
+
+
+def _ply_file(dr, catalog):
+    """Plain .ply file of a footprint, looked up in the store if needed."""
     path = polygon_path(dr, catalog)
     if not path.exists():
-        raise PolygonNotFoundError(
-            f"Polygon file not found. Should be at {path}."
-        )
-    return Mangle(str(path))
+        try:
+            path = store.ply_file(dr, catalog)
+        except FileNotFoundError as err:
+            raise PolygonNotFoundError(
+                f"Polygon file not found. Should be at {path}. {err}"
+            ) from err
+    return path
+
+
+def simplified_path(dr, catalog):
+    """Return the path of the simplified polygon file in the cache.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+
+    Return
+    ------
+    path: pathlib.Path
+        Object representig the path.
+    """
+    return data.CACHE_PATH / "simplified" / f"{dr}.{catalog}.ply"
+
+
+def get_simplified_polygon(dr, catalog):
+    """Return pymangle polygon object of the simplified footprint.
+
+    The footprint is simplified with ``geometry.simplify`` the first time
+    and written to the cache, and again if the original file changes.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+
+    Return
+    ------
+    mangle: pymangle.Mangle
+        Mangle instance with the simplified polygons.
+    """
+    from pymangle import Mangle
+
+    path = _ply_file(dr, catalog)
+    cached = simplified_path(dr, catalog)
+    if not cached.exists() or cached.stat().st_mtime < path.stat().st_mtime:
+        polygons = geometry.simplify(geometry.read_ply(path))
+        cached.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached.with_name(f".{cached.name}.{os.getpid()}.tmp")
+        geometry.write_ply(polygons, tmp_path)
+        os.replace(tmp_path, cached)
+    return Mangle(str(cached))
+
+
+def pixel_map_path(dr, catalog, nside, level, simplified=False):
+    """Return the path of the cached pixel coverage of a footprint.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+    nside: int
+        HEALPix resolution of the map.
+    level: int
+        Each pixel is sampled with ``4**level`` sub-pixels.
+    simplified: bool
+        Whether the map is of the simplified footprint.
+
+    Return
+    ------
+    path: pathlib.Path
+        Object representig the path.
+    """
+    name = f"{dr}.{catalog}{'.simplified' if simplified else ''}"
+    return data.CACHE_PATH / "pixel_maps" / f"{name}.{nside}.{level}.npz"
+
+
+def bank_path(dr, catalog, size, seed, weights, simplified=False):
+    """Return the path of a bank of random points in the cache.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+    size: int
+        Number of points of the bank.
+    seed: int
+        Seed the points were drawn with.
+    weights: numpy.ndarray
+        Weights of the polygons the points were drawn with. The name has
+        a digest of them, so banks of different weights don't collide.
+    simplified: bool
+        Whether the bank is of the simplified footprint.
+
+    Return
+    ------
+    path: pathlib.Path
+        Object representig the path.
+    """
+    digest = hashlib.sha256(np.asarray(weights, dtype=float).tobytes())
+    name = f"{dr}.{catalog}{'.simplified' if simplified else ''}"
+    return (
+        data.CACHE_PATH
+        / "banks"
+        / f"{name}.{size}.{seed}.{digest.hexdigest()[:16]}.npy"
+    )
+
+
+def keep_probability(weights):
+    """Return the probability to keep a random point in each polygon.
+
+    Every random generator draws points whose density in each polygon is
+    proportional to this probability, the polygon weight clipped to
+    [0, 1]: points are kept with it, or polygons are chosen by their area
+    times it. Polygons of weight 0 get no points.
+
+    Parameters
+    ----------
+    weights: numpy.ndarray or pymangle.Mangle
+        Polygon weights, or a mask whose weights are used.
+
+    Return
+    ------
+    probability: numpy.ndarray
+        Probability of each polygon, as float.
+    """
+    weights = getattr(weights, "weights", weights)
+    return np.clip(np.asarray(weights, dtype=float), 0.0, 1.0)
+
+
+def _seed_sequence(seed):
+    """Return seed as a numpy.random.SeedSequence."""
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    return np.random.SeedSequence(seed)
 
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # CLASSES
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+
+@attr.s(eq=False)
+class SamplingTable:
+    """Weighted areas of the polygons in a Fenwick (binary indexed) tree.
+
+    Each polygon is chosen with probability proportional to its area
+    times its weight. Changing k values costs O(k log npoly) instead of
+    recomputing the cumulative sum, and so does drawing k polygons when
+    k is smaller than npoly.
+
+    Parameters
+    ----------
+    values: numpy.ndarray
+        Area times weight of each polygon, in square degrees, with the
+        weights clipped to [0, 1] (see ``keep_probability``).
+    """
+
+    values = attr.ib(converter=lambda v: np.array(v, dtype=float))
+    tree_ = attr.ib(init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        """Build the tree from the cumulative sum in O(npoly)."""
+        index = np.arange(1, len(self.values) + 1)
+        cumsum = np.concatenate([[0.0], np.cumsum(self.values)])
+        self.tree_ = cumsum.copy()
+        self.tree_[1:] -= cumsum[index - (index & -index)]
+
+    @classmethod
+    def from_mangle(cls, mangle):
+        """Create the table of a pymangle mask from its areas and weights.
+
+        Parameters
+        ----------
+        mangle: pymangle.Mangle
+            Mask with the polygons.
+
+        Return
+        ------
+        table: randomsdss.randomsdss.SamplingTable
+            Table of the polygons of the mask.
+        """
+        return cls(np.asarray(mangle.areas, float) * keep_probability(mangle))
+
+    @property
+    def total(self):
+        """Sum of the values, in O(log npoly)."""
+        return float(self.prefix(len(self.values)))
+
+    def prefix(self, count):
+        """Sum of the first count values.
+
+        Parameters
+        ----------
+        count: int or numpy.ndarray
+            Number of values summed.
+
+        Return
+        ------
+        prefix: float or numpy.ndarray
+            The sums.
+        """
+        index = np.array(count, dtype=np.intp)
+        result = np.zeros(index.shape)
+        while np.any(index > 0):
+            result += self.tree_[index]
+            index -= index & -index
+        return result
+
+    def update(self, positions, values):
+        """Set the values of some polygons.
+
+        Parameters
+        ----------
+        positions: numpy.ndarray
+            Positions of the polygons in the mask, without repetitions.
+        values: numpy.ndarray
+            New area times weight of those polygons.
+        """
+        positions = np.asarray(positions, dtype=np.intp)
+        values = np.broadcast_to(np.asarray(values, float), positions.shape)
+        delta = values - self.values[positions]
+        self.values[positions] = values
+
+        index, size = positions + 1, len(self.values)
+        while index.size:
+            np.add.at(self.tree_, index, delta)
+            index = index + (index & -index)
+            keep = index <= size
+            index, delta = index[keep], delta[keep]
+
+    def search(self, targets):
+        """Find the polygons at some points of the cumulative sum.
+
+        Parameters
+        ----------
+        targets: numpy.ndarray
+            Points in [0, total).
+
+        Return
+        ------
+        positions: numpy.ndarray
+            Position of the polygon whose interval of the cumulative sum
+            holds each target. Polygons with value 0 are never returned.
+        """
+        remain = np.array(targets, dtype=float)
+        size = len(self.values)
+        if remain.size > size:
+            # many draws: a cumulative sum in O(npoly) is cheaper
+            positions = np.searchsorted(
+                np.cumsum(self.values), remain, side="right"
+            )
+            return self._clip(positions)
+
+        positions = np.zeros(remain.shape, dtype=np.intp)
+        step = 1 << size.bit_length()
+        while step:
+            candidate = positions + step
+            value = self.tree_[np.minimum(candidate, size)]
+            fits = (candidate <= size) & (value <= remain)
+            positions = np.where(fits, candidate, positions)
+            remain = np.where(fits, remain - value, remain)
+            step >>= 1
+        return self._clip(positions)
+
+    def _clip(self, positions):
+        """Move positions past the end, from rounding, to the last polygon."""
+        outside = positions >= len(self.values)
+        if np.any(outside):
+            positions[outside] = np.flatnonzero(self.values)[-1]
+        return positions
+
+
 # Base class for all Data Releases
 @attr.s
 class DR:
@@ -122,14 +458,40 @@ class DR:
         Data Release name: e.g DR16.
     catalog: str
         Catalog name within the specified data release: e.g. BOSS.
+    simplified: bool
+        Load the footprint simplified with ``geometry.simplify``, which
+        has fewer polygons and gives the same ``contains`` and ``weight``
+        results. Points of merged polygons get the id of the first one.
+    ply_path: str or pathlib.Path, optional
+        Polygon file to load instead of the one found for dr and catalog,
+        e.g. the file of another DR instance (``DR.mangle_.filename``).
+        The cached pixel maps and banks are still named by dr, catalog
+        and simplified.
     """
 
     dr = attr.ib()
     catalog = attr.ib()
+    simplified = attr.ib(default=False, kw_only=True)
+    ply_path = attr.ib(default=None, kw_only=True, repr=False)
+    _regions = attr.ib(factory=dict, init=False, repr=False, eq=False)
+    _near = attr.ib(factory=dict, init=False, repr=False, eq=False)
+    _edges = attr.ib(factory=dict, init=False, repr=False, eq=False)
 
     def __attrs_post_init__(self):
         """Call get_polygon here to ensure self is instantiated."""
-        self.mangle_ = get_polygon(self.dr, self.catalog)
+        if self.ply_path is not None:
+            from pymangle import Mangle
+
+            self.mangle_ = Mangle(str(self.ply_path))
+        elif self.simplified:
+            self.mangle_ = get_simplified_polygon(self.dr, self.catalog)
+        else:
+            self.mangle_ = get_polygon(self.dr, self.catalog)
+
+    @cached_property
+    def polygons_(self):
+        """Caps of the polygons, read from the .ply file on first use."""
+        return geometry.read_ply(self.mangle_.filename)
 
     @property
     def area(self):
@@ -146,25 +508,167 @@ class DR:
         """Array of polygons weights."""
         return self.mangle_.weights
 
-    def set_weights(self, weights):
-        """Set new weights for polygons.
+    @cached_property
+    def sampling_table_(self):
+        """Weighted areas of the polygons, kept up to date by set_weights."""
+        return SamplingTable.from_mangle(self.mangle_)
+
+    @cached_property
+    def _id_order(self):
+        """Order of the polygon ids, None if each id is its position."""
+        ids = self.polygons_.ids
+        if np.array_equal(ids, np.arange(len(ids))):
+            return None
+        return np.argsort(ids, kind="stable")
+
+    def polygon_properties(self, polyids=None):
+        """Return the properties of the polygons as a record array.
 
         Parameters
         ----------
-        weight: float or numpy.ndarray
-            Poligons weights.
+        polyids: numpy.ndarray, optional
+            Ids of the polygons, as returned by ``polyid``. Defaults to
+            all of them.
+
+        Return
+        ------
+        properties: numpy.recarray
+            Fields ``id``, ``area`` (square degrees), ``weight`` and ``pixel``
+            of each polygon.
         """
-        if np.size(weights) == 1:
-            weights = np.full(self.npoly, weights)
-        self.mangle_.weights = weights
+        positions = self._positions(polyids)
+        every = slice(None) if positions is None else positions
+        return np.rec.fromarrays(
+            [
+                self.polygons_.ids[every],
+                np.asarray(self.mangle_.areas[every], dtype=float),
+                np.asarray(self.weights[every], dtype=float),
+                self.polygons_.pixels[every],
+            ],
+            names=["id", "area", "weight", "pixel"],
+        )
+
+    def _positions(self, polyids):
+        """Positions in the mask of some polygon ids, None for all."""
+        if polyids is None:
+            return None
+        polyids = np.atleast_1d(polyids)
+        ids, order = self.polygons_.ids, self._id_order
+        if order is None:
+            found = np.clip(polyids, 0, len(ids) - 1).astype(np.intp)
+        else:
+            found = np.searchsorted(ids, polyids, sorter=order)
+            found = order[np.minimum(found, len(ids) - 1)]
+        if not np.array_equal(ids[found], polyids):
+            missing = polyids[ids[found] != polyids]
+            raise ValueError(f"Unknown polygon ids: {missing[:10]}.")
+        return found
+
+    def set_weights(self, weights, polyids=None):
+        """Set new weights for polygons.
+
+        Only the entries of the sampling table of the changed polygons are
+        updated, so the cost of the update grows with the number of
+        polygons changed. pymangle itself only takes a full array of
+        weights, copied in O(npoly).
 
-    def sky_random(self, size):
+        Parameters
+        ----------
+        weights: float, numpy.ndarray or callable
+            Polygons weights. A callable receives the
+            ``polygon_properties`` of the polygons changed and returns
+            their weights, e.g. ``lambda p: np.where(p.area < 1e-7, 0,
+            p.weight)``.
+        polyids: numpy.ndarray, optional
+            Ids of the polygons changed, as returned by ``polyid``.
+            Defaults to all of them. If an id is repeated, its last
+            weight is kept.
+        """
+        positions = self._positions(polyids)
+        if callable(weights):
+            weights = weights(self.polygon_properties(polyids))
+        self._regions.clear()
+        self._edges.clear()
+
+        if positions is None:
+            if np.size(weights) == 1:
+                weights = np.full(self.npoly, weights)
+            self.mangle_.weights = weights
+            self.__dict__.pop("sampling_table_", None)
+            return
+
+        new = self.mangle_.weights
+        new[positions] = weights
+        self.mangle_.weights = new
+        if len(positions) > self.npoly // 16:
+            # rebuilding is cheaper than many updates of the tree
+            self.__dict__.pop("sampling_table_", None)
+        elif "sampling_table_" in self.__dict__:
+            changed = np.unique(positions)
+            values = np.asarray(self.mangle_.areas[changed], float)
+            values *= keep_probability(new[changed])
+            self.sampling_table_.update(changed, values)
+
+    def sky_random(
+        self,
+        size,
+        seed=None,
+        method="uniform",
+        out=None,
+        dtype=None,
+        output="radec",
+        jackknife=None,
+        density=None,
+        weighted=False,
+    ):
         """Generate random RA, DEC points.
 
         Parameters
         ----------
         size: int
             Number of random points to generate.
+        seed: int or numpy.random.SeedSequence, optional
+            Set random seed. If given, the points are drawn with a numpy
+            generator instead of pymangle, so the result is reproducible,
+            and each point is kept with a probability given by the weight
+            of its polygon (see ``keep_probability``).
+        method: str
+            How to fill the footprint. "uniform" draws independent points.
+            "sobol" uses a scrambled Sobol sequence and "stratified" fixes
+            the number of points in each polygon proportional to its area
+            times its weight. Both reduce the shot noise of the catalog,
+            so fewer points are needed to reach the same precision.
+        out: sequence of numpy.ndarray, optional
+            Arrays of length size to fill with the points, one for each
+            output column. They can be memory-mapped; the points are
+            generated in chunks and written directly into them.
+        dtype: numpy.dtype, optional
+            Data type of the returned arrays when out is not given. By
+            default float64, except for the "uniform" points without seed,
+            returned as pymangle's ``genrand`` gives them (long double).
+        output: str
+            "radec" returns RA, DEC in degrees and "xyz" returns the
+            Cartesian components of the unit vectors.
+        jackknife: int, optional
+            Number of jackknife regions. If given, the region of each
+            point (see ``DR.jackknife_region``) is added as a last column,
+            found chunk by chunk while the points are generated.
+        density: numpy.ndarray, optional
+            Relative density of the points as a HEALPix map in the nested
+            scheme (``12 * nside**2`` values, as from ``DR.to_pixel_map``),
+            e.g. the expected target density given the imaging depth. The
+            points follow the weights of the polygons times the map. They
+            are drawn inside polygons chosen by their weighted area times
+            the largest value of the map over them, so only the variation
+            of the map within each polygon is rejected and the cost
+            doesn't grow with its contrast. Only with the "uniform"
+            method.
+        weighted: bool
+            Keep the points by the weight of their polygon also without
+            seed, drawing them as with a seed. By default "uniform" points
+            without seed come from pymangle's ``genrand``, which ignores
+            the weights. Every other method, or a seed, always keeps the
+            points by weight.
 
         Returns
         -------
@@ -172,24 +676,243 @@ class DR:
             Right Ascension in degrees.
         dec: numpy.ndarray
             Declination in degrees.
+        region: numpy.ndarray
+            Jackknife region, only if jackknife is given.
+        """
+        pymangle = seed is None and not weighted and density is None
+        default_output = out is None and output == "radec"
+        default_output &= dtype is None
+        if pymangle and method == "uniform" and default_output:
+            if jackknife is None:
+                return self.mangle_.genrand(size)
+        chunks = self._sky_chunks(size, seed, method, density, weighted)
+        return _collect(
+            chunks,
+            size,
+            out=out,
+            dtype=np.float64 if dtype is None else dtype,
+            output=output,
+            labels=self._labeler(jackknife),
+        )
+
+    def _sky_chunks(self, size, seed, method, density=None, weighted=False):
+        """Return an iterator over the chunks of points of sky_random."""
+        if method not in SKY_METHODS:
+            raise ValueError(
+                f"Unknown method {method}. Choose from {SKY_METHODS}."
+            )
+        if method == "uniform" and seed is None and density is None:
+            if not weighted:
+                return _pymangle_chunks(
+                    self.mangle_.genrand, size, float(self.area) / SKY_AREA
+                )
+        if not self.sampling_table_.total > 0:
+            raise ValueError("The mask has no area with non zero weight.")
+        if density is not None:
+            if method != "uniform":
+                raise ValueError("density only works with method 'uniform'.")
+            density, bound = self._density_table(density)
+            return _density_chunks(
+                self.mangle_,
+                self.polygons_,
+                density,
+                bound,
+                size,
+                np.random.default_rng(seed),
+            )
+
+        rng = np.random.default_rng(seed)
+        if method == "sobol":
+            return _sobol_chunks(self.mangle_, size, rng)
+        elif method == "stratified":
+            return _stratified_chunks(
+                self.mangle_, self.polygons_, self.sampling_table_, size, rng
+            )
+        return _uniform_chunks(self.mangle_, size, rng)
+
+    def _density_table(self, density):
+        """Return the density map and its bound in each polygon.
+
+        The bound is the maximum of the map over the pixels whose center
+        is close enough to the bounding cap of the polygon to overlap it.
         """
-        return self.mangle_.genrand(size)
+        from scipy.spatial import cKDTree
+
+        density = np.asarray(density, dtype=float)
+        nside = int(np.sqrt(density.size / 12))
+        if density.ndim != 1 or density.size != 12 * nside**2:
+            raise ValueError("density must be a map of 12 * nside**2 pixels.")
+        geometry._check_nside(nside)
+        if not np.all(np.isfinite(density) & (density >= 0)):
+            raise ValueError("density must be finite and non negative.")
+
+        pixels = self._pixels_near(nside)
+        tree = cKDTree(
+            geometry.radec_to_xyz(*geometry.healpix_to_radec(nside, pixels))
+        )
+        center, radius = self.polygons_.bounding_caps
+        active = np.flatnonzero(np.asarray(self.weights, dtype=float) > 0)
+        side = np.sqrt(np.pi / 3) / nside
+        angle = np.minimum(radius[active] + PIXEL_RADIUS * side, np.pi)
+        near = tree.query_ball_point(
+            center[active], 2 * np.sin(angle / 2), return_sorted=False
+        )
+        bound = np.zeros(self.npoly)
+        for position, index in zip(active, near):
+            bound[position] = density[pixels[index]].max(initial=0.0)
+        if not np.any(bound > 0):
+            raise ValueError("density is 0 over the whole footprint.")
+        return density, bound
+
+    def _pixels_near(self, nside):
+        """Return the pixels near the polygons, computed once per nside."""
+        if nside not in self._near:
+            self._near[nside] = _pixels_near(self.polygons_, nside)
+        return self._near[nside]
+
+    def cartesian_random(
+        self,
+        size,
+        z,
+        weights=None,
+        seed=None,
+        method="uniform",
+        z_method="histogram",
+        bins="auto",
+        H0=70.0,
+        Om0=0.3,
+        out=None,
+        dtype=np.float64,
+        weighted=False,
+    ):
+        """Generate random points in comoving Cartesian coordinates.
+
+        The directions are drawn as in ``DR.sky_random`` and the redshifts
+        as in ``z_random``, chunk by chunk, and each redshift is converted
+        to a comoving distance with the cached table of the cosmology
+        (see ``randomsdss.cosmology``), so no array of the full size is
+        allocated besides the output.
+
+        Parameters
+        ----------
+        size: int
+            Number of random points to generate.
+        z: numpy.ndarray
+            Redshift sample whose distribution the randoms follow.
+        weights: numpy.ndarray, optional
+            Weight of each redshift of the sample.
+        seed: int or numpy.random.SeedSequence, optional
+            Set random seed. The directions and the redshifts use
+            independent streams spawned from it.
+        method: str
+            How to fill the footprint. See ``DR.sky_random``.
+        z_method: str
+            "shuffle" or "histogram". See ``z_random``.
+        bins: int, sequence or str
+            Bins of the "histogram" method, as in ``numpy.histogram``.
+        H0: float
+            Hubble constant in km/s/Mpc. Use 100 for distances in Mpc/h.
+        Om0: float
+            Matter density today, in a flat universe.
+        out: sequence of numpy.ndarray, optional
+            Four arrays of length size to fill with x, y, z and the
+            redshift. They can be memory-mapped.
+        dtype: numpy.dtype
+            Data type of the returned arrays when out is not given, e.g.
+            numpy.float32 to halve the memory.
+        weighted: bool
+            Keep the points by weight also without seed. See
+            ``DR.sky_random``.
 
-    def box_random(self, ra_min, ra_max, dec_min, dec_max, size):
+        Returns
+        -------
+        x, y, z: numpy.ndarray
+            Comoving Cartesian coordinates in Mpc.
+        redshift: numpy.ndarray
+            Redshift of each point.
+        """
+        if z_method not in ("shuffle", "histogram"):
+            raise ValueError(
+                f"Unknown z_method {z_method}. Choose shuffle or histogram."
+            )
+        if out is None:
+            out = tuple(np.empty(size, dtype=dtype) for _ in range(4))
+        elif len(out) != 4 or any(np.shape(col) != (size,) for col in out):
+            raise ValueError(f"out must be 4 arrays of shape ({size},).")
+        table = cosmology.distance_table(H0, Om0)
+
+        if seed is None:
+            sky_seed, z_seed = None, None
+        else:
+            sky_seed, z_seed = _seed_sequence(seed).spawn(2)
+        chunks = self._sky_chunks(size, sky_seed, method, weighted=weighted)
+        _collect(chunks, size, out=out[:3], output="xyz")
+
+        z_chunks = _sample_chunks(
+            z,
+            size,
+            weights,
+            np.random.default_rng(z_seed),
+            bins=bins if z_method == "histogram" else None,
+        )
+        for start, redshift in z_chunks:
+            stop = start + len(redshift)
+            distance = table(redshift)
+            for col in out[:3]:
+                col[start:stop] *= distance
+            out[3][start:stop] = redshift
+        return tuple(out)
+
+    def box_random(
+        self,
+        ra_min,
+        ra_max,
+        dec_min,
+        dec_max,
+        size,
+        seed=None,
+        out=None,
+        dtype=None,
+        output="radec",
+        jackknife=None,
+        weighted=False,
+    ):
         """Generate random RA, DEC points within a box.
 
+        Points kept by weight are only drawn in the part of the box around
+        the polygons with weight that overlap it, see
+        ``DR.polygons_in_box``.
+
         Parameters
         ----------
         ra_min: float
             Right Ascension lower bound in degrees.
         ra_max: float
-            Right Ascension upper bound in degrees.
+            Right Ascension upper bound in degrees. If lower than ra_min
+            the box wraps through RA 0.
         dec_min: float
             Declination lower bound in degrees.
         dec_max: float
             Declination upper bound in degrees.
         size: int
             Number of random points to generate.
+        seed: int or numpy.random.SeedSequence, optional
+            Set random seed. See ``DR.sky_random``.
+        out: sequence of numpy.ndarray, optional
+            Arrays to fill with the points. See ``DR.sky_random``.
+        dtype: numpy.dtype, optional
+            Data type of the returned arrays when out is not given. See
+            ``DR.sky_random``; the points without seed are returned as
+            pymangle's ``genrand_range`` gives them.
+        output: str
+            "radec" or "xyz". See ``DR.sky_random``.
+        jackknife: int, optional
+            Number of jackknife regions. See ``DR.sky_random``.
+        weighted: bool
+            Keep the points by weight also without seed. By default the
+            points without seed come from pymangle's ``genrand_range``,
+            which ignores the weights, unless the box wraps through RA 0.
+            See ``DR.sky_random``.
 
         Returns
         -------
@@ -197,12 +920,393 @@ class DR:
             Right Ascension in degrees.
         dec: numpy.ndarray
             Declination in degrees.
+        region: numpy.ndarray
+            Jackknife region, only if jackknife is given.
+        """
+        box = (ra_min, ra_max, dec_min, dec_max)
+        default_output = out is None and output == "radec"
+        default_output &= dtype is None
+        pymangle = seed is None and not weighted and ra_min <= ra_max
+        if pymangle and default_output and jackknife is None:
+            self._sampling_box(box, weighted=False)  # check it overlaps
+            return self.mangle_.genrand_range(size, *box)
+        chunks = self._box_chunks(size, seed, box, weighted)
+        return _collect(
+            chunks,
+            size,
+            out=out,
+            dtype=np.float64 if dtype is None else dtype,
+            output=output,
+            labels=self._labeler(jackknife),
+        )
+
+    def _box_chunks(self, size, seed, box, weighted=False):
+        """Return an iterator over the chunks of points of box_random."""
+        if seed is None and not weighted and box[0] <= box[1]:
+            _, accept = self._sampling_box(box, weighted=False)
+            return _pymangle_chunks(
+                self.mangle_.genrand_range, size, accept, *box
+            )
+
+        # pymangle can't draw in a box wrapping through RA 0
+        (ra_min, ra_max, dec_min, dec_max), _ = self._sampling_box(box)
+        if ra_min > ra_max:
+            ra_max += 360.0
+        rng = np.random.default_rng(seed)
+        return _uniform_chunks(
+            self.mangle_, size, rng, (ra_min, ra_max), (dec_min, dec_max)
+        )
+
+    def _sampling_box(self, box, weighted=True):
+        """Smallest box around the polygons overlapping a box.
+
+        If weighted, the points are kept by weight (see
+        ``keep_probability``), so the polygons of weight 0 can't have
+        points and are left out. Returns the new box, with the limits not
+        moved unchanged, and the expected fraction of the points of the
+        given box inside the polygons.
+        """
+        overlap, inside = self.polygons_.in_box(*box)
+        if weighted:
+            overlap &= self.sampling_table_.values > 0
+        empty = not np.any(inside & overlap)
+        if empty:
+            # the ranges are larger than the polygons, check the area
+            partial = np.flatnonzero(overlap)
+            empty = not np.any(self.polygons_.area_in_box(partial, *box))
+        if empty:
+            raise ValueError("The box does not overlap the footprint.")
+
+        ra_min, ra_max, dec_min, dec_max = box
+        start, width = geometry.ra_span(*box)
+        lo, span, bottom, top = (
+            r[overlap] for r in self.polygons_.radec_ranges
+        )
+
+        # RA range of each polygon inside the box, from the box start
+        back = (start - lo) % 360.0
+        first = np.where(back <= span, 0.0, (lo - start) % 360.0)
+        last = np.where(back <= span, span - back, first + span)
+        last = np.where((back <= span) & (360.0 - back < width), width, last)
+        first, last = first.min(), min(last.max(), width)
+
+        if first > 0.0:
+            ra_min = start + first
+            ra_min = ra_min - 360.0 if ra_min >= 360.0 else ra_min
+        if last < width:
+            ra_max = start + last
+            ra_max = ra_max - 360.0 if ra_max > 360.0 else ra_max
+        dec_min = max(dec_min, bottom.min())
+        dec_max = min(dec_max, top.max())
+
+        sin_min, sin_max = np.sin(np.deg2rad(box[2:]))
+        sampled = width * np.rad2deg(sin_max - sin_min)
+        area = np.sum(self.polygons_.areas[overlap]) * np.rad2deg(1.0) ** 2
+        return (ra_min, ra_max, dec_min, dec_max), area / sampled
+
+    def polygons_in_box(self, ra_min, ra_max, dec_min, dec_max):
+        """Find the polygons that may overlap a RA, DEC box.
+
+        The query uses the RA and DEC ranges of the polygons, computed
+        once, so it may return a few polygons close to the box that don't
+        overlap it.
+
+        Parameters
+        ----------
+        ra_min: float
+            Right Ascension lower bound in degrees.
+        ra_max: float
+            Right Ascension upper bound in degrees. If lower than ra_min
+            the box wraps through RA 0.
+        dec_min: float
+            Declination lower bound in degrees.
+        dec_max: float
+            Declination upper bound in degrees.
+
+        Returns
+        -------
+        polyid: numpy.ndarray
+            Ids of the polygons, as returned by ``DR.polyid``.
+        """
+        overlap, _ = self.polygons_.in_box(ra_min, ra_max, dec_min, dec_max)
+        return self.polygons_.ids[overlap]
+
+    def box_area(self, ra_min, ra_max, dec_min, dec_max):
+        """Area of the footprint within a RA, DEC box.
+
+        Polygons inside the box add their area and the area of those on
+        the edges of the box is integrated exactly. The ranges of the
+        polygons are indexed once, but each polygon cut by the edges costs
+        about a millisecond and nothing is cached, so a 20 by 60 degree
+        box of DR14 LRG_S, cutting about 130 polygons, takes about 0.1 s.
+        Keep the result instead of calling it again for the same box. As
+        ``DR.area`` it doesn't use the weights.
+
+        Parameters
+        ----------
+        ra_min: float
+            Right Ascension lower bound in degrees.
+        ra_max: float
+            Right Ascension upper bound in degrees. If lower than ra_min
+            the box wraps through RA 0.
+        dec_min: float
+            Declination lower bound in degrees.
+        dec_max: float
+            Declination upper bound in degrees.
+
+        Returns
+        -------
+        area: float
+            Area in square degrees.
+        """
+        box = (ra_min, ra_max, dec_min, dec_max)
+        overlap, inside = self.polygons_.in_box(*box)
+        partial = np.flatnonzero(overlap & ~inside)
+        area = np.sum(self.polygons_.areas[inside])
+        area += np.sum(self.polygons_.area_in_box(partial, *box))
+        return float(area) * np.rad2deg(1.0) ** 2
+
+    def aperture_random(
+        self,
+        ra_c,
+        dec_c,
+        radius,
+        size_per_center,
+        seed=None,
+        dtype=np.float64,
+        output="radec",
+        max_workers=None,
+    ):
+        """Generate random points in circular apertures around many centers.
+
+        Candidates are drawn uniformly on the spherical cap of each
+        center, found in the polygons with the grid of polygons (see
+        ``geometry.Polygons.locate``), and kept with the weight of their
+        polygon, all centers at once. Each aperture draws as many
+        candidates as points it misses over the fraction accepted so far,
+        until it is full. The centers are split in blocks of about
+        CHUNK_SIZE points, each drawn in a thread from its own generator
+        spawned from seed, so the result doesn't depend on max_workers.
+
+        Apertures without weighted area get no points: they are given up
+        after APERTURE_TRIALS candidates without any accepted.
+
+        Parameters
+        ----------
+        ra_c: numpy.ndarray
+            Right Ascension of the centers in degrees.
+        dec_c: numpy.ndarray
+            Declination of the centers in degrees.
+        radius: float or numpy.ndarray
+            Angular radius of the apertures in degrees, in (0, 180].
+        size_per_center: int or numpy.ndarray
+            Number of random points in each aperture.
+        seed: int or numpy.random.SeedSequence, optional
+            Set random seed.
+        dtype: numpy.dtype
+            Data type of the coordinates.
+        output: str
+            "radec" or "xyz". See ``DR.sky_random``.
+        max_workers: int, optional
+            Number of threads drawing blocks at once. Defaults to the
+            number of CPUs.
+
+        Returns
+        -------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        center: numpy.ndarray
+            Index of the center of each point. The points are grouped by
+            center, in the order of the centers.
+        """
+        ra_c = np.atleast_1d(np.asarray(ra_c, dtype=float))
+        dec_c = np.atleast_1d(np.asarray(dec_c, dtype=float))
+        if ra_c.shape != dec_c.shape or ra_c.ndim != 1:
+            raise ValueError(
+                "ra_c and dec_c must be 1-d arrays of equal length."
+            )
+        radius = np.broadcast_to(np.asarray(radius, dtype=float), ra_c.shape)
+        if not np.all((radius > 0) & (radius <= 180)):
+            raise ValueError("radius must be in (0, 180] degrees.")
+        size = np.broadcast_to(np.asarray(size_per_center), ra_c.shape)
+        if not np.issubdtype(size.dtype, np.integer) or np.any(size < 0):
+            raise ValueError("size_per_center must be non negative integers.")
+        if output not in OUTPUTS:
+            raise ValueError(
+                f"Unknown output {output}. Choose from {OUTPUTS}."
+            )
+        if not self.sampling_table_.total > 0:
+            raise ValueError("The mask has no area with non zero weight.")
+
+        polygons = self.polygons_
+        polygons.grid  # build the index before sharing it with threads
+        weights = keep_probability(self.weights)
+        center = geometry.radec_to_xyz(ra_c, dec_c)
+        radius = np.deg2rad(radius)
+        seed = _seed_sequence(seed)
+        # block of the first point of each center
+        block = (np.cumsum(size) - size) // CHUNK_SIZE
+        starts = np.flatnonzero(np.diff(block, prepend=-1))
+        bounds = np.append(starts, len(ra_c))
+
+        def draw(number):
+            lo, hi = bounds[number], bounds[number + 1]
+            rng = np.random.default_rng(
+                np.random.SeedSequence(
+                    seed.entropy, spawn_key=seed.spawn_key + (int(block[lo]),)
+                )
+            )
+            return _aperture_points(
+                polygons,
+                weights,
+                center[lo:hi],
+                radius[lo:hi],
+                size[lo:hi],
+                rng,
+            )
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+            parts = list(executor.map(draw, range(len(starts))))
+        xyz = np.concatenate([np.zeros((0, 3))] + [p for p, _ in parts])
+        count = np.concatenate([np.zeros(0, np.int64)] + [c for _, c in parts])
+        columns = geometry.xyz_to_radec(xyz) if output == "radec" else xyz.T
+        return (
+            *(np.ascontiguousarray(col, dtype=dtype) for col in columns),
+            np.repeat(np.arange(len(ra_c)), count),
+        )
+
+    @classmethod
+    async def acreate(cls, *args, **kwargs):
+        """Create an instance loading the footprint in the thread pool.
+
+        Asynchronous alternative to calling the class, which blocks while
+        the .ply file is read.
+
+        Parameters
+        ----------
+        *args, **kwargs:
+            Arguments of the class.
+
+        Returns
+        -------
+        dr: randomsdss.DR
+            New instance.
+        """
+        from . import aio
+
+        return await aio.run(cls, *args, **kwargs)
+
+    async def asky_random(
+        self,
+        size,
+        seed=None,
+        method="uniform",
+        out=None,
+        dtype=np.float64,
+        output="radec",
+        jackknife=None,
+        density=None,
+        weighted=False,
+    ):
+        """Asynchronous version of ``DR.sky_random``.
+
+        The points are generated in the thread pool of ``randomsdss.aio``
+        and the generation stops at the next chunk if the task is
+        cancelled.
+        """
+        from . import aio
+
+        def job(cancel):
+            chunks = self._sky_chunks(size, seed, method, density, weighted)
+            return _collect(
+                chunks,
+                size,
+                out,
+                dtype=dtype,
+                output=output,
+                labels=self._labeler(jackknife),
+                cancel=cancel,
+            )
+
+        heavy = size >= aio.HEAVY_SIZE
+        return await aio.run(job, heavy=heavy, cancellable=True)
+
+    async def abox_random(
+        self,
+        ra_min,
+        ra_max,
+        dec_min,
+        dec_max,
+        size,
+        seed=None,
+        out=None,
+        dtype=np.float64,
+        output="radec",
+        jackknife=None,
+        weighted=False,
+    ):
+        """Asynchronous version of ``DR.box_random``.
+
+        See ``DR.asky_random``.
+        """
+        from . import aio
+
+        def job(cancel):
+            box = (ra_min, ra_max, dec_min, dec_max)
+            chunks = self._box_chunks(size, seed, box, weighted)
+            return _collect(
+                chunks,
+                size,
+                out,
+                dtype=dtype,
+                output=output,
+                labels=self._labeler(jackknife),
+                cancel=cancel,
+            )
+
+        heavy = size >= aio.HEAVY_SIZE
+        return await aio.run(job, heavy=heavy, cancellable=True)
+
+    async def acontains(self, ra, dec):
+        """Asynchronous version of ``DR.contains``.
+
+        The points are checked in chunks in the thread pool of
+        ``randomsdss.aio``.
         """
-        return self.mangle_.genrand_range(
-            size, ra_min, ra_max, dec_min, dec_max
+        from . import aio
+
+        return await aio.run(
+            aio.map_chunks,
+            self.contains,
+            ra,
+            dec,
+            chunk_size=CHUNK_SIZE,
+            heavy=np.size(ra) >= aio.HEAVY_SIZE,
+            cancellable=True,
         )
 
-    def contains(self, ra, dec):
+    async def apolyid_and_weight(self, ra, dec):
+        """Asynchronous version of ``DR.polyid_and_weight``.
+
+        See ``DR.acontains``.
+        """
+        from . import aio
+
+        return await aio.run(
+            aio.map_chunks,
+            self.polyid_and_weight,
+            ra,
+            dec,
+            chunk_size=CHUNK_SIZE,
+            heavy=np.size(ra) >= aio.HEAVY_SIZE,
+            cancellable=True,
+        )
+
+    def contains(self, ra, dec, coherent=False):
         """Check if point is inside the catalog area.
 
         Parameters
@@ -211,15 +1315,23 @@ class DR:
             Right Ascension in degrees.
         dec: numpy.ndarray
             Declination in degrees.
+        coherent: bool
+            Evaluate the points sorted along a space-filling curve (see
+            ``geometry.curve_order``), in blocks of COHERENT_BLOCK, and
+            return the results in the input order. pymangle then finds
+            the pixels and polygons of consecutive points in memory it
+            just read, which is faster for catalogs in arbitrary order.
 
         Returns
         -------
         bool:
             True if inside, False otherwise.
         """
+        if coherent:
+            return self._in_curve_order(self.mangle_.contains, ra, dec)
         return self.mangle_.contains(ra, dec)
 
-    def polyid_and_weight(self, ra, dec):
+    def polyid_and_weight(self, ra, dec, coherent=False):
         """Get polygon id and weight of input point.
 
         Parameters
@@ -228,6 +1340,9 @@ class DR:
             Right Ascension in degrees.
         dec: numpy.ndarray
             Declination in degrees.
+        coherent: bool
+            Find the polygons along a space-filling curve. See
+            ``DR.contains``.
 
         Returns
         -------
@@ -236,9 +1351,13 @@ class DR:
         weight: numpy.ndarray
             Poligon weight. 0 if outside of catalog area.
         """
+        if coherent:
+            return self._in_curve_order(
+                self.mangle_.polyid_and_weight, ra, dec
+            )
         return self.mangle_.polyid_and_weight(ra, dec)
 
-    def polyid(self, ra, dec):
+    def polyid(self, ra, dec, coherent=False):
         """Get polygon id of input point.
 
         Parameters
@@ -247,15 +1366,20 @@ class DR:
             Right Ascension in degrees.
         dec: numpy.ndarray
             Declination in degrees.
+        coherent: bool
+            Find the polygons along a space-filling curve. See
+            ``DR.contains``.
 
         Returns
         -------
         pid: numpy.ndarray
             Polygon id. -1 if outside of catalog area.
         """
+        if coherent:
+            return self._in_curve_order(self.mangle_.polyid, ra, dec)
         return self.mangle_.polyid(ra, dec)
 
-    def weight(self, ra, dec):
+    def weight(self, ra, dec, coherent=False):
         """Get polygon weight of input point.
 
         Parameters
@@ -264,14 +1388,403 @@ class DR:
             Right Ascension in degrees.
         dec: numpy.ndarray
             Declination in degrees.
+        coherent: bool
+            Find the polygons along a space-filling curve. See
+            ``DR.contains``.
 
         Returns
         -------
         weight: numpy.ndarray
             Poligon weight. 0 if outside of catalog area.
         """
+        if coherent:
+            return self._in_curve_order(self.mangle_.weight, ra, dec)
         return self.mangle_.weight(ra, dec)
 
+    def _in_curve_order(self, method, ra, dec):
+        """Call a pymangle method on blocks of points sorted by the curve.
+
+        Blocks already coherent (see ``geometry.is_coherent``) are passed
+        as given, so sorted catalogs don't pay for the sort.
+        """
+        ra, dec = np.asarray(ra), np.asarray(dec)
+        simple = self.mangle_.pixeltype == "s"
+        resolution = self.mangle_.pixelres if simple else None
+        if len(ra) <= COHERENT_BLOCK and geometry.is_coherent(dec, resolution):
+            return method(ra, dec)
+        results = None
+        for start in range(0, len(ra), COHERENT_BLOCK):
+            block = slice(start, start + COHERENT_BLOCK)
+            if geometry.is_coherent(dec[block], resolution):
+                order = block
+                values = method(ra[block], dec[block])
+            else:
+                order = start + geometry.curve_order(ra[block], dec[block])
+                values = method(ra[order], dec[order])
+            values = values if isinstance(values, tuple) else (values,)
+            if results is None:
+                results = tuple(np.empty(len(ra), v.dtype) for v in values)
+            for result, value in zip(results, values):
+                result[order] = value
+        return results if len(results) > 1 else results[0]
+
+    def edge_distance(
+        self, ra, dec, max_distance=1.0, step=EDGE_STEP, max_workers=None
+    ):
+        """Return the angular distance from each point to the footprint edge.
+
+        The edge separates the area of the polygons with weight > 0 from
+        the rest of the sky, so it includes the holes of zero weight
+        polygons but not the boundaries between two weighted polygons.
+        The edges of the polygons are split in pieces of at most step,
+        and the pieces on the edge of the footprint are kept in a KD-tree
+        of their middle points, built once per step and weights. The
+        nearest piece of each point is found in the tree, in chunks of
+        CHUNK_SIZE points checked in threads, and its exact distance is
+        returned. It is larger than the true distance by at most step / 2,
+        and only near the corners of the footprint.
+
+        Parameters
+        ----------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        max_distance: float
+            Largest distance searched, in degrees. Farther points get
+            max_distance, so the cost doesn't grow with it.
+        step: float
+            Longest piece of the edges in degrees.
+        max_workers: int, optional
+            Number of threads checking chunks at once. Defaults to the
+            number of CPUs.
+
+        Returns
+        -------
+        distance: numpy.ndarray
+            Distance to the edge in degrees, at most max_distance. It is
+            the same inside and outside the footprint, see ``weight``.
+        """
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if ra.shape != dec.shape or ra.ndim != 1:
+            raise ValueError("ra and dec must be 1-d arrays of equal length.")
+        if not (max_distance > 0 and step > 0):
+            raise ValueError("max_distance and step must be positive.")
+
+        tree, pieces = self._edge_tree(step)
+        distance = np.full(len(ra), float(max_distance))
+        if tree is None:
+            return distance
+        angle = min(np.deg2rad(max_distance + step / 2), np.pi)
+        upper = 2 * np.sin(angle / 2)
+
+        def measure(start):
+            chunk = slice(start, start + CHUNK_SIZE)
+            xyz = geometry.radec_to_xyz(ra[chunk], dec[chunk])
+            chord, nearest = tree.query(xyz, distance_upper_bound=upper)
+            found = np.isfinite(chord)
+            angle = pieces.distance(xyz[found], nearest[found])
+            distance[chunk][found] = np.minimum(
+                np.rad2deg(angle), max_distance
+            )
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+            list(executor.map(measure, range(0, len(ra), CHUNK_SIZE)))
+        return distance
+
+    def _edge_tree(self, step):
+        """Return the pieces of the footprint edge and a tree of them."""
+        if step in self._edges:
+            return self._edges[step]
+        from scipy.spatial import cKDTree
+
+        weighted = np.flatnonzero(np.asarray(self.weights, dtype=float) > 0)
+        arcs = geometry.polygon_edges(self.polygons_, weighted)
+        pieces = arcs.split(np.deg2rad(step))
+        middle = pieces.middle()
+
+        # the piece is on the footprint edge if only one side is weighted
+        normal = pieces.pole - middle * np.einsum(
+            "ij,ij->i", middle, pieces.pole
+        )[:, None]
+        normal /= np.linalg.norm(normal, axis=1, keepdims=True)
+        sides = []
+        for sign in (1.0, -1.0):
+            xyz = middle + sign * EDGE_OFFSET * normal
+            pid, weight = self.mangle_.polyid_and_weight(
+                *geometry.xyz_to_radec(xyz)
+            )
+            sides.append((pid >= 0) & (weight > 0))
+        edge = np.flatnonzero(sides[0] != sides[1])
+
+        columns = attr.astuple(pieces, recurse=False)
+        pieces = geometry.Arcs(*(np.asarray(col)[edge] for col in columns))
+        tree = cKDTree(middle[edge]) if len(edge) else None
+        self._edges[step] = tree, pieces
+        return tree, pieces
+
+    def count_per_polygon(self, ra, dec, weights=None, max_workers=None):
+        """Count the points in each polygon.
+
+        The polygon of each point is found with the grid of polygons
+        instead of pymangle, over chunks of CHUNK_SIZE points checked in
+        threads, and counted with ``np.bincount``.
+
+        Parameters
+        ----------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        weights: numpy.ndarray, optional
+            Weight of each point, summed instead of counting the points.
+        max_workers: int, optional
+            Number of threads counting chunks at once. Defaults to the
+            number of CPUs.
+
+        Returns
+        -------
+        counts: numpy.ndarray
+            Number of points (int) or sum of their weights (float) in each
+            polygon, in the order of ``weights``. Points outside the
+            footprint are not counted.
+        """
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if ra.shape != dec.shape or ra.ndim != 1:
+            raise ValueError("ra and dec must be 1-d arrays of equal length.")
+        if weights is not None:
+            weights = np.broadcast_to(np.asarray(weights, float), ra.shape)
+
+        polygons = self.polygons_
+        polygons.grid  # build the index before sharing it with threads
+
+        def count(start):
+            chunk = slice(start, start + CHUNK_SIZE)
+            index = polygons.locate(ra[chunk], dec[chunk]) + 1
+            chunk_weights = None if weights is None else weights[chunk]
+            return np.bincount(
+                index, weights=chunk_weights, minlength=self.npoly + 1
+            )
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        dtype = np.int64 if weights is None else float
+        counts = np.zeros(self.npoly + 1, dtype=dtype)
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+            for partial in executor.map(count, range(0, len(ra), CHUNK_SIZE)):
+                counts += partial
+        return counts[1:]
+
+    def to_pixel_map(self, nside, level=3, max_workers=None, cache=True):
+        """Return the footprint as a HEALPix map in the nested scheme.
+
+        Each pixel is split in its ``4**level`` nested sub-pixels, which
+        have equal areas, and the polygon of each sub-pixel center is
+        found with the grid of polygons, in threads. Only the pixels near
+        the bounding caps of the polygons are sampled, found refining the
+        map from nside 1. The sub-pixels of each pixel and polygon are
+        counted, which doesn't depend on the weights, and written to the
+        cache (see ``pixel_map_path``), so the map of the same footprint
+        and resolution is only sampled again if its polygon file changes.
+
+        Parameters
+        ----------
+        nside: int
+            Resolution of the map, a power of 2. The map has
+            ``12 * nside**2`` pixels.
+        level: int
+            Sub-pixel level. The fraction has a resolution of
+            ``4**-level`` and the cost grows as ``4**level``.
+        max_workers: int, optional
+            Number of threads sampling chunks at once. Defaults to the
+            number of CPUs.
+        cache: bool
+            Read and write the counts from the cache.
+
+        Returns
+        -------
+        fraction: numpy.ndarray
+            Fraction of the area of each pixel inside the polygons.
+        weight: numpy.ndarray
+            Mean weight of the polygons over the area of each pixel inside
+            them, 0 where the fraction is 0.
+        """
+        pixel, position, count = self._pixel_counts(
+            nside, level, max_workers, cache
+        )
+        npix = 12 * nside**2
+        covered = np.bincount(pixel, weights=count, minlength=npix)
+        weights = np.asarray(self.weights, dtype=float)[position]
+        weighted = np.bincount(pixel, weights=count * weights, minlength=npix)
+        weight = np.divide(
+            weighted, covered, out=np.zeros(npix), where=covered > 0
+        )
+        return covered / 4**level, weight
+
+    def _pixel_counts(self, nside, level, max_workers, cache):
+        """Sub-pixels of each pixel in each polygon, from the cache."""
+        geometry._check_nside(nside)
+        if level < 0 or nside * 2**level > 2**29:
+            raise ValueError(
+                "level must be >= 0 and nside * 2**level <= 2**29."
+            )
+        path = pixel_map_path(
+            self.dr, self.catalog, nside, level, self.simplified
+        )
+        source = (
+            simplified_path(self.dr, self.catalog)
+            if self.simplified
+            else _ply_file(self.dr, self.catalog)
+        )
+        fresh = (
+            path.exists() and path.stat().st_mtime >= source.stat().st_mtime
+        )
+        if cache and fresh:
+            with np.load(path) as counts:
+                return counts["pixel"], counts["position"], counts["count"]
+
+        counts = self._sample_pixels(nside, level, max_workers)
+        if cache:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as tmp:
+                np.savez(
+                    tmp, pixel=counts[0], position=counts[1], count=counts[2]
+                )
+            os.replace(tmp_path, path)
+        return counts
+
+    def _sample_pixels(self, nside, level, max_workers):
+        """Count the sub-pixels of each pixel in each polygon."""
+        polygons = self.polygons_
+        polygons.grid  # build the index before sharing it with threads
+        candidates = self._pixels_near(nside)
+        nsub = 4**level
+        step = max(CHUNK_SIZE // nsub, 1)
+        # The centers lie on the RA and DEC lines of the pixelization of
+        # mangle, where rounding decides the polygon. A millionth of a
+        # sub-pixel moves them off the lines, inside their sub-pixel.
+        nudge = 1e-6 * np.rad2deg(np.sqrt(np.pi / 3) / (nside * 2**level))
+
+        def count(start):
+            pixel = candidates[start:start + step]
+            sub = (pixel[:, None] * nsub + np.arange(nsub)).ravel()
+            ra, dec = geometry.healpix_to_radec(nside * 2**level, sub)
+            position = polygons.locate(ra + nudge, dec + nudge)
+            inside = position >= 0
+            keys = (sub[inside] // nsub) * self.npoly + position[inside]
+            return np.unique(keys, return_counts=True)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+            parts = list(executor.map(count, range(0, len(candidates), step)))
+        keys = np.concatenate([np.zeros(0, np.int64)] + [k for k, _ in parts])
+        count = np.concatenate([np.zeros(0, np.int64)] + [c for _, c in parts])
+        pixel, position = np.divmod(keys, self.npoly)
+        return pixel, position, count
+
+    def set_completeness(
+        self, targets, observed, target_weights=None, observed_weights=None
+    ):
+        """Set the weights to the fraction of targets observed.
+
+        The weight of each polygon is the number of observed objects over
+        the number of targets in it, as counted by ``count_per_polygon``.
+        Polygons without targets get weight 0.
+
+        Parameters
+        ----------
+        targets: tuple of numpy.ndarray
+            RA, DEC in degrees of the targets.
+        observed: tuple of numpy.ndarray
+            RA, DEC in degrees of the observed objects.
+        target_weights: numpy.ndarray, optional
+            Weight of each target.
+        observed_weights: numpy.ndarray, optional
+            Weight of each observed object.
+
+        Returns
+        -------
+        completeness: numpy.ndarray
+            The new weights.
+        """
+        n_targets = self.count_per_polygon(*targets, weights=target_weights)
+        n_observed = self.count_per_polygon(
+            *observed, weights=observed_weights
+        )
+        completeness = np.divide(
+            n_observed,
+            n_targets,
+            out=np.zeros(self.npoly),
+            where=n_targets > 0,
+        )
+        self.set_weights(completeness)
+        return completeness
+
+    def jackknife_regions(self, n):
+        """Split the footprint in n regions of about equal area.
+
+        The polygons with weight are grouped in contiguous regions with
+        ``geometry.equal_area_regions``, using the centers of their
+        bounding caps. The partition is cached for each n until the
+        weights change.
+
+        Parameters
+        ----------
+        n: int
+            Number of regions.
+
+        Returns
+        -------
+        regions: numpy.ndarray
+            Region of each polygon, in the order of ``weights``, from 0
+            to n - 1. Polygons with weight 0 get -1.
+        """
+        if n not in self._regions:
+            center, _ = self.polygons_.bounding_caps
+            areas = np.where(
+                self.sampling_table_.values > 0, self.polygons_.areas, 0.0
+            )
+            self._regions[n] = geometry.equal_area_regions(center, areas, n)
+        return self._regions[n]
+
+    def jackknife_region(self, ra, dec, n):
+        """Get the jackknife region of input points.
+
+        Parameters
+        ----------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        n: int
+            Number of regions. See ``DR.jackknife_regions``.
+
+        Returns
+        -------
+        region: numpy.ndarray
+            Region of each point, -1 if outside of the footprint or in a
+            polygon with weight 0.
+        """
+        regions = self.jackknife_regions(n)
+        pid = np.atleast_1d(self.mangle_.polyid(ra, dec))
+        region = np.full(pid.shape, -1, dtype=np.int32)
+        inside = pid >= 0
+        region[inside] = regions[self._positions(pid[inside])]
+        return region
+
+    def _labeler(self, jackknife):
+        """Labels of the random points for _collect, None if not asked."""
+        if jackknife is None:
+            return None
+        self.jackknife_regions(jackknife)  # fail before generating
+        return lambda ra, dec: self.jackknife_region(ra, dec, jackknife)
+
 
 # One class for each Data Relese
 def subclass_as(name):
@@ -305,27 +1818,909 @@ DR15 = subclass_as("DR15")
 DR16 = subclass_as("DR16")
 
 
+@attr.s(frozen=True)
+class FootprintSet:
+    """Collection of footprints to test points against all at once.
+
+    Parameters
+    ----------
+    footprints: sequence of randomsdss.DR
+        Footprints of the set. Column ``i`` of ``membership`` refers to
+        ``footprints[i]``.
+    """
+
+    footprints = attr.ib(converter=tuple)
+
+    def __len__(self):
+        """Return the number of footprints."""
+        return len(self.footprints)
+
+    @property
+    def names(self):
+        """Names of the footprints as "DR/catalog"."""
+        return [f"{fp.dr}/{fp.catalog}" for fp in self.footprints]
+
+    def membership(
+        self, ra, dec, bitmask=False, polyid=False, max_workers=None
+    ):
+        """Check which footprints contain each point.
+
+        The points are converted to unit vectors once and checked against
+        every footprint in a single pass over chunks of CHUNK_SIZE points,
+        using the grid of polygons of each footprint instead of pymangle.
+        The result is that of ``DR.contains`` and ``DR.polyid``.
+
+        Parameters
+        ----------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        bitmask: bool
+            Return an unsigned integer per point with bit ``i`` set if
+            footprint ``i`` contains it, instead of a boolean matrix.
+        polyid: bool
+            Also return the polygon id of each point in each footprint.
+        max_workers: int, optional
+            Number of threads checking chunks at once. Defaults to the
+            number of CPUs.
+
+        Returns
+        -------
+        member: numpy.ndarray
+            Boolean array of shape (N, len(self)), or the bitmask.
+        polyid: numpy.ndarray
+            Array of shape (N, len(self)) with the polygon ids, -1 if
+            outside. Only if polyid is True.
+        """
+        if bitmask and len(self) > 64:
+            raise ValueError("A bitmask holds at most 64 footprints.")
+        ra = np.atleast_1d(np.asarray(ra, dtype=float))
+        dec = np.atleast_1d(np.asarray(dec, dtype=float))
+        if ra.shape != dec.shape or ra.ndim != 1:
+            raise ValueError("ra and dec must be 1-d arrays of equal length.")
+
+        polygons = [fp.polygons_ for fp in self.footprints]
+        for poly in polygons:
+            poly.grid  # build the indices before sharing them with threads
+        index = np.empty((len(ra), len(self)), dtype=np.intp)
+
+        def check(start):
+            chunk = slice(start, start + CHUNK_SIZE)
+            xyz = geometry.radec_to_xyz(ra[chunk], dec[chunk])
+            for i, poly in enumerate(polygons):
+                index[chunk, i] = poly.locate(ra[chunk], dec[chunk], xyz)
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+            list(executor.map(check, range(0, len(ra), CHUNK_SIZE)))
+
+        member = index >= 0
+        if bitmask:
+            dtype = next(
+                dtype
+                for dtype in (np.uint8, np.uint16, np.uint32, np.uint64)
+                if np.iinfo(dtype).bits >= len(self)
+            )
+            bits = np.left_shift(1, np.arange(len(self), dtype=np.uint64))
+            member = (member * bits).sum(axis=1, dtype=np.uint64)
+            member = member.astype(dtype)
+        if not polyid:
+            return member
+        ids = np.full(index.shape, -1, dtype=np.int64)
+        for i, poly in enumerate(polygons):
+            inside = index[:, i] >= 0
+            ids[inside, i] = poly.ids[index[inside, i]]
+        return member, ids
+
+
+@attr.s(frozen=True, eq=False)
+class RandomStream:
+    """Random catalog of a footprint defined point by point.
+
+    The catalog is an endless sequence of points split in blocks of
+    block_size points. Block ``b`` is drawn as ``DR.sky_random`` with a
+    seed, from its own generator spawned from seed with key ``b``, so any
+    range of points only costs the blocks that overlap it. A catalog of
+    any size is the first points of the stream, and growing it only draws
+    the new points.
+
+    Parameters
+    ----------
+    footprint: randomsdss.DR
+        Footprint the points are drawn in.
+    seed: int or numpy.random.SeedSequence, optional
+        Seed of the stream. If not given, fresh entropy is drawn and kept
+        in ``seed`` so the stream can be recreated.
+    block_size: int
+        Points of each block. Streams with different block sizes are
+        different catalogs. Smaller blocks make a catalog ending mid block
+        cheaper to extend, larger ones waste fewer candidates at the end
+        of each block.
+
+    Attributes
+    ----------
+    weights: numpy.ndarray
+        Weights of the footprint when the stream was created. Drawing
+        points after they change raises ValueError, as the stream would
+        no longer be the same catalog.
+    """
+
+    footprint = attr.ib()
+    seed = attr.ib(default=None, converter=_seed_sequence)
+    block_size = attr.ib(default=STREAM_BLOCK, converter=int)
+    weights = attr.ib(init=False, repr=False)
+
+    @weights.default
+    def _weights_default(self):
+        return self.footprint.weights
+
+    @block_size.validator
+    def _check_block_size(self, attribute, value):
+        if value < 1:
+            raise ValueError("block_size must be positive.")
+
+    def __getitem__(self, index):
+        """Return the points of a slice of the stream, as points does."""
+        if not isinstance(index, slice) or index.step not in (None, 1):
+            raise TypeError("A stream can only be indexed by a plain slice.")
+        if index.stop is None:
+            raise ValueError("The stream is endless, give the slice a stop.")
+        start = 0 if index.start is None else index.start
+        if start < 0 or index.stop < 0:
+            raise ValueError("The stream has no negative positions.")
+        return self.points(start, max(start, index.stop))
+
+    def _block(self, number):
+        """Return the random generator of a block of points."""
+        seed = np.random.SeedSequence(
+            self.seed.entropy, spawn_key=self.seed.spawn_key + (number,)
+        )
+        return np.random.default_rng(seed)
+
+    def _chunks(self, start, stop):
+        """Yield chunks of the points from start to stop."""
+        if not np.array_equal(self.footprint.weights, self.weights):
+            raise ValueError(
+                "The weights of the footprint changed after the stream "
+                "was created."
+            )
+        if not self.footprint.sampling_table_.total > 0:
+            raise ValueError("The mask has no area with non zero weight.")
+        first, last = start // self.block_size, -(-stop // self.block_size)
+        for number in range(first, last):
+            offset = number * self.block_size
+            skip = max(start - offset, 0)
+            keep = min(stop - offset, self.block_size)
+            position = 0
+            for ra, dec in _uniform_chunks(
+                self.footprint.mangle_, keep, self._block(number)
+            ):
+                lo, hi = max(skip - position, 0), len(ra)
+                position += len(ra)
+                if lo < hi:
+                    yield ra[lo:hi], dec[lo:hi]
+
+    def points(self, start, stop, out=None, dtype=np.float64, output="radec"):
+        """Return the points of the stream from start to stop.
+
+        Parameters
+        ----------
+        start: int
+            Position of the first point.
+        stop: int
+            Position after the last point.
+        out: sequence of numpy.ndarray, optional
+            Arrays of length ``stop - start`` to fill with the points, one
+            for each output column. See ``DR.sky_random``.
+        dtype: numpy.dtype
+            Data type of the returned arrays when out is not given.
+        output: str
+            "radec" or "xyz". See ``DR.sky_random``.
+
+        Returns
+        -------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        """
+        start, stop = int(start), int(stop)
+        if not 0 <= start <= stop:
+            raise ValueError("Positions must satisfy 0 <= start <= stop.")
+        return _collect(
+            self._chunks(start, stop),
+            stop - start,
+            out=out,
+            dtype=dtype,
+            output=output,
+        )
+
+    def extend(self, existing, extra_size, **kwargs):
+        """Return the points that follow a catalog of the stream.
+
+        Parameters
+        ----------
+        existing: sequence of numpy.ndarray or int
+            The first points of the stream, as columns like the ones
+            returned by points, or their number.
+        extra_size: int
+            Number of new points.
+        **kwargs:
+            out, dtype and output, passed to points.
+
+        Returns
+        -------
+        ra: numpy.ndarray
+            Right Ascension of the new points in degrees.
+        dec: numpy.ndarray
+            Declination of the new points in degrees.
+        """
+        size = existing if np.ndim(existing) == 0 else len(existing[0])
+        return self.points(size, int(size) + int(extra_size), **kwargs)
+
+
+@attr.s(eq=False)
+class RandomBank:
+    """Random points of a footprint drawn once and stored on disk.
+
+    The bank holds size independent points of the weighted footprint and
+    the position of their polygons, in a memory-mapped .npy file of the
+    cache (see ``bank_path``). The points are drawn the first time and
+    read again while the polygon file doesn't change. As they are
+    independent, any range of the bank is a uniform random catalog, so
+    sky_random only copies a slice of it. Requests longer than what is
+    left of the bank are completed with new points, drawn as
+    ``DR.sky_random`` does with a seed.
+
+    If the weights of the footprint change (``DR.set_weights``), the
+    points of each polygon are kept with the ratio of its new weight to
+    its weight in the bank, over the largest ratio, so the bank still
+    follows the weights with fewer points. Polygons of weight 0 in the
+    bank have no points, so if one of them gets a positive weight the
+    bank is not used and every point is drawn again, until a bank is
+    created for the new weights.
+
+    Parameters
+    ----------
+    footprint: randomsdss.DR
+        Footprint of the points.
+    size: int
+        Number of points stored, 20 bytes each.
+    seed: int
+        Seed of the points of the bank.
+
+    Attributes
+    ----------
+    cursor: int
+        Position in the bank of the first point not yet returned by the
+        unseeded calls to sky_random. Set it to 0 to return them again.
+    weights: numpy.ndarray
+        Weights of the footprint the bank was drawn with.
+    """
+
+    footprint = attr.ib()
+    size = attr.ib(default=BANK_SIZE, converter=int)
+    seed = attr.ib(default=0, converter=int)
+    cursor = attr.ib(default=0, init=False)
+    weights = attr.ib(init=False, repr=False)
+    points_ = attr.ib(default=None, init=False, repr=False)
+    _thinning = attr.ib(default=None, init=False, repr=False)
+
+    @weights.default
+    def _weights_default(self):
+        return keep_probability(self.footprint.weights)
+
+    @size.validator
+    def _check_size(self, attribute, value):
+        if value < 1:
+            raise ValueError("size must be positive.")
+
+    def __attrs_post_init__(self):
+        """Read the points from the cache, drawing them the first time."""
+        footprint = self.footprint
+        if not footprint.sampling_table_.total > 0:
+            raise ValueError("The mask has no area with non zero weight.")
+        path = bank_path(
+            footprint.dr,
+            footprint.catalog,
+            self.size,
+            self.seed,
+            self.weights,
+            footprint.simplified,
+        )
+        source = (
+            simplified_path(footprint.dr, footprint.catalog)
+            if footprint.simplified
+            else _ply_file(footprint.dr, footprint.catalog)
+        )
+        fresh = (
+            path.exists() and path.stat().st_mtime >= source.stat().st_mtime
+        )
+        if not fresh:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            try:
+                self._draw(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        self.points_ = np.load(path, mmap_mode="r")
+
+    def _draw(self, path):
+        """Draw the points of the bank into a new .npy file."""
+        footprint = self.footprint
+        points = np.lib.format.open_memmap(
+            path, "w+", BANK_DTYPE, (self.size,)
+        )
+        chunks = _polygon_chunks(
+            footprint.mangle_,
+            footprint.polygons_,
+            footprint.sampling_table_,
+            self.size,
+            np.random.default_rng(self.seed),
+        )
+        start = 0
+        for ra, dec, position in chunks:
+            chunk = points[start:start + len(ra)]
+            chunk["ra"], chunk["dec"], chunk["position"] = ra, dec, position
+            start += len(ra)
+        points.flush()
+
+    @property
+    def usable(self):
+        """Whether the bank can follow the current weights of the footprint."""
+        accept = self._acceptance()
+        return accept is None or accept.size > 0
+
+    def _acceptance(self):
+        """Return the fraction of the points of each polygon kept.
+
+        None if the weights are those of the bank, so every point is
+        kept, and an empty array if the bank can't follow them. It is
+        only computed again when the weights change.
+        """
+        weights = keep_probability(self.footprint.weights)
+        if self._thinning is None or not np.array_equal(
+            self._thinning[0], weights
+        ):
+            if np.array_equal(weights, self.weights):
+                accept = None
+            elif np.any((weights > 0) & (self.weights == 0)):
+                accept = np.zeros(0)
+            else:
+                ratio = np.divide(
+                    weights,
+                    self.weights,
+                    out=np.zeros(len(weights)),
+                    where=self.weights > 0,
+                )
+                accept = ratio / ratio.max()
+            self._thinning = (weights, accept)
+        return self._thinning[1]
+
+    def sky_random(
+        self,
+        size,
+        seed=None,
+        out=None,
+        dtype=np.float64,
+        output="radec",
+        jackknife=None,
+    ):
+        """Return random RA, DEC points from the bank.
+
+        Without seed, the points are the next ones of the bank after
+        cursor, so each call returns new points, and cursor moves past
+        them. With a seed, they start at a position chosen by the seed
+        and wrap around the end of the bank, so the same seed returns
+        the same points. Catalogs of different seeds share about size /
+        bank size of their points, so the bank should be much larger
+        than the catalogs. The points beyond the end of the bank, or
+        after a whole turn with a seed, are drawn again.
+
+        Parameters
+        ----------
+        size: int
+            Number of random points.
+        seed: int or numpy.random.SeedSequence, optional
+            Seed choosing the points, see above.
+        out: sequence of numpy.ndarray, optional
+            Arrays of length size to fill with the points, one for each
+            output column. See ``DR.sky_random``.
+        dtype: numpy.dtype
+            Data type of the returned arrays when out is not given.
+        output: str
+            "radec" or "xyz". See ``DR.sky_random``.
+        jackknife: int, optional
+            Number of jackknife regions, whose labels are added as a last
+            column. See ``DR.sky_random``.
+
+        Returns
+        -------
+        ra: numpy.ndarray
+            Right Ascension in degrees.
+        dec: numpy.ndarray
+            Declination in degrees.
+        region: numpy.ndarray
+            Jackknife region, only if jackknife is given.
+        """
+        size = int(size)
+        if size < 0:
+            raise ValueError("size must be non negative.")
+        if not self.footprint.sampling_table_.total > 0:
+            raise ValueError("The mask has no area with non zero weight.")
+        labels = self.footprint._labeler(jackknife)
+        if seed is None:
+            rng = np.random.default_rng()
+            chunks = self._chunks(
+                size, self.cursor, self.size - self.cursor, rng, True
+            )
+        else:
+            rng = np.random.default_rng(seed)
+            start = int(rng.integers(self.size))
+            chunks = self._chunks(size, start, self.size, rng, False)
+        return _collect(
+            chunks, size, out=out, dtype=dtype, output=output, labels=labels
+        )
+
+    def _chunks(self, size, start, length, rng, advance):
+        """Yield chunks of points from the bank, then new ones.
+
+        The points are taken from length points of the bank after start,
+        wrapping around its end, and are kept with the acceptance of
+        their polygon. If advance, cursor is moved past the last one.
+        """
+        accept = self._acceptance()
+        if accept is not None and accept.size == 0:
+            length = 0
+        ngood = used = 0
+        while ngood < size and used < length:
+            first = (start + used) % self.size
+            chunk = self.points_[
+                first:min(first + CHUNK_SIZE, self.size, first + length - used)
+            ]
+            if accept is None:
+                index = np.arange(len(chunk))
+            else:
+                keep = rng.random(len(chunk)) < accept[chunk["position"]]
+                index = np.flatnonzero(keep)
+            index = index[: size - ngood]
+            done = len(index) == size - ngood
+            used += index[-1] + 1 if done else len(chunk)
+            ngood += len(index)
+            yield chunk["ra"][index], chunk["dec"][index]
+        if advance:
+            self.cursor = start + used
+        if ngood < size:
+            yield from self.footprint._sky_chunks(size - ngood, rng, "uniform")
+
+
+def _pixels_near(polygons, nside):
+    """Nested pixels that may overlap the bounding cap of a polygon.
+
+    The candidates are refined from nside 1, keeping the children whose
+    center is closer to a cap than the cap radius plus PIXEL_RADIUS pixel
+    sides.
+    """
+    from scipy.spatial import cKDTree
+
+    center, radius = polygons.bounding_caps
+    pixels = np.arange(12)
+    current = 1
+    while True:
+        side = np.sqrt(4 * np.pi / (12 * current**2))
+        ra, dec = geometry.healpix_to_radec(current, pixels)
+        tree = cKDTree(geometry.radec_to_xyz(ra, dec))
+        angle = np.minimum(radius + PIXEL_RADIUS * side, np.pi)
+        near = tree.query_ball_point(
+            center, 2 * np.sin(angle / 2), return_sorted=False
+        )
+        keep = np.unique(np.concatenate([np.zeros(0, np.intp), *near]))
+        pixels = pixels[keep]
+        if current == nside:
+            return pixels
+        pixels = (pixels[:, None] * 4 + np.arange(4)).ravel()
+        current *= 2
+
+
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 # RANDOMS
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
 
-def _random_from_pdf(pdf, x_grid, size, seed=None):
-    """Generate random numbers from a Probability Distribution Function."""
-    cdf = np.cumsum(pdf)
+def _uniform_chunks(
+    mangle, size, rng, ra_range=(0.0, 360.0), dec_range=(-90.0, 90.0)
+):
+    """Yield chunks of random points inside the mask drawn with rng.
+
+    Candidates are drawn uniformly on the sphere within the given range
+    and accepted with a probability equal to the weight of the polygon
+    that contains them.
+    """
+    ra_min, ra_max = ra_range
+    sin_min, sin_max = np.sin(np.deg2rad(dec_range))
+
+    ngood = 0
+    while ngood < size:
+        ra = rng.uniform(ra_min, ra_max, CHUNK_SIZE) % 360.0
+        dec = np.rad2deg(np.arcsin(rng.uniform(sin_min, sin_max, CHUNK_SIZE)))
+        pid, weight = mangle.polyid_and_weight(ra, dec)
+        keep = (pid >= 0) & (rng.random(CHUNK_SIZE) < weight)
+
+        ra, dec = ra[keep][: size - ngood], dec[keep][: size - ngood]
+        ngood += len(ra)
+        yield ra, dec
+
+
+def _sobol_chunks(mangle, size, rng):
+    """Yield chunks of random points inside the mask from a Sobol sequence.
+
+    The first two dimensions of the sequence are mapped to RA and sin(DEC)
+    and the third one is used to accept the points by weight, so that the
+    accepted points keep the low discrepancy of the sequence.
+    """
+    from scipy.stats import qmc
+
+    sampler = qmc.Sobol(d=3, scramble=True, seed=rng)
+
+    ngood = 0
+    while ngood < size:
+        # CHUNK_SIZE is a power of two to keep the balance of the sequence
+        u = sampler.random(CHUNK_SIZE)
+        ra = 360.0 * u[:, 0]
+        dec = np.rad2deg(np.arcsin(2.0 * u[:, 1] - 1.0))
+        pid, weight = mangle.polyid_and_weight(ra, dec)
+        keep = (pid >= 0) & (u[:, 2] < weight)
+
+        ra, dec = ra[keep][: size - ngood], dec[keep][: size - ngood]
+        ngood += len(ra)
+        yield ra, dec
+
+
+def _stratified_chunks(mangle, polygons, table, size, rng):
+    """Yield chunks of random points with a fixed number per polygon.
+
+    The polygons are laid on a line with lengths proportional to their
+    area times weight, as in the sampling table, and the line is cut in
+    size equal strata with a single random offset (systematic sampling).
+    Each polygon gets as many points as strata starting inside it, which
+    differs from the expected value by less than one point.
+
+    Only CHUNK_SIZE strata are held at once: chunk k takes every
+    nchunks-th stratum from k, so each chunk spans the whole footprint,
+    and the chunks are drawn in random order and shuffled.
+
+    A few polygons of some masks overlap and mangle assigns the shared
+    area to the first of them. Points falling in the area of a polygon
+    not assigned to it are replaced by uniform points of the whole mask.
+    """
+    nchunks = -(-size // CHUNK_SIZE)
+    offset, step = rng.random(), table.total / max(size, 1)
+
+    for number in rng.permutation(nchunks):
+        strata = np.arange(number, size, nchunks) + offset
+        chunk = rng.permutation(table.search(strata * step))
+        ra, dec = geometry.xyz_to_radec(polygons.sample(chunk, rng))
+        lost = mangle.polyid(ra, dec) != polygons.ids[chunk]
+        nlost = np.count_nonzero(lost)
+        if nlost:
+            ra[lost], dec[lost] = _collect(
+                _uniform_chunks(mangle, nlost, rng), nlost
+            )
+        yield ra, dec
+
+
+def _density_chunks(mangle, polygons, density, bound, size, rng):
+    """Yield chunks of random points following a density map.
+
+    The polygons are chosen with probability proportional to their area
+    times weight times the bound of the map in them, a point is drawn
+    uniformly inside and kept with the ratio of the map at the point to
+    the bound. Points in the area that mangle assigns to an overlapping
+    polygon are dropped, as that polygon draws them.
+    """
+    nside = int(np.sqrt(len(density) / 12))
+    areas = np.asarray(mangle.areas, dtype=float)
+    weights = keep_probability(mangle)
+    cumulative = np.cumsum(areas * weights * bound)
+
+    ngood = 0
+    while ngood < size:
+        u = rng.random(CHUNK_SIZE) * cumulative[-1]
+        index = np.searchsorted(cumulative, u, "right")
+        index = np.minimum(index, len(cumulative) - 1)
+        ra, dec = geometry.xyz_to_radec(polygons.sample(index, rng))
+        value = density[geometry.radec_to_healpix(nside, ra, dec)]
+        keep = rng.random(CHUNK_SIZE) * bound[index] < value
+        keep[keep] = mangle.polyid(ra[keep], dec[keep]) == polygons.ids[
+            index[keep]
+        ]
+
+        ra, dec = ra[keep][: size - ngood], dec[keep][: size - ngood]
+        ngood += len(ra)
+        yield ra, dec
+
+
+def _polygon_chunks(mangle, polygons, table, size, rng):
+    """Yield chunks of random points and the positions of their polygons.
+
+    The polygons are chosen with the sampling table, by area times weight,
+    and a point is drawn uniformly inside. Points in the area that mangle
+    assigns to an overlapping polygon are dropped, as that polygon draws
+    them.
+    """
+    ngood = 0
+    while ngood < size:
+        index = table.search(rng.random(CHUNK_SIZE) * table.total)
+        ra, dec = geometry.xyz_to_radec(polygons.sample(index, rng))
+        keep = mangle.polyid(ra, dec) == polygons.ids[index]
+
+        index = index[keep][: size - ngood]
+        ra, dec = ra[keep][: size - ngood], dec[keep][: size - ngood]
+        ngood += len(ra)
+        yield ra, dec, index
+
+
+def _aperture_points(polygons, weights, center, radius, size, rng):
+    """Draw random points of the weighted mask inside some caps.
+
+    Candidates are drawn in rounds of at most 4 CHUNK_SIZE, each cap as
+    many as its missing points times its candidates over its accepted
+    points so far (both plus one), and kept with the weight of their
+    polygon. A cap is given up after APERTURE_TRIALS candidates without
+    any accepted.
+
+    Returns
+    -------
+    xyz: numpy.ndarray
+        Array of shape (N, 3) with the points, grouped by cap.
+    count: numpy.ndarray
+        Number of points of each cap, size unless given up.
+    """
+    ncaps = len(center)
+    need = np.array(size, dtype=np.int64)
+    drawn = np.zeros(ncaps, dtype=np.int64)
+    accepted = np.zeros(ncaps, dtype=np.int64)
+    caps, points = [np.zeros(0, np.intp)], [np.zeros((0, 3))]
+    while True:
+        hopeful = (accepted > 0) | (drawn < APERTURE_TRIALS)
+        todo = np.flatnonzero((need > 0) & hopeful)
+        if not len(todo):
+            break
+        ndraw = np.ceil(need[todo] * (drawn[todo] + 1) / (accepted[todo] + 1))
+        ndraw = np.minimum(ndraw, APERTURE_TRIALS).astype(np.int64)
+        fits = np.cumsum(ndraw) <= 4 * CHUNK_SIZE
+        fits[0] = True
+        todo, ndraw = todo[fits], ndraw[fits]
+
+        cap = np.repeat(todo, ndraw)
+        xyz = geometry.sample_caps(center[cap], radius[cap], rng)
+        position = polygons.locate(*geometry.xyz_to_radec(xyz), xyz=xyz)
+        keep = position >= 0
+        keep[keep] = rng.random(np.count_nonzero(keep)) < weights[
+            position[keep]
+        ]
+        drawn[todo] += ndraw
+        accepted += np.bincount(cap[keep], minlength=ncaps)
+
+        # the first missing points of each cap, as cap is sorted
+        kept = np.flatnonzero(keep)
+        rank = np.arange(len(kept)) - np.searchsorted(cap[kept], cap[kept])
+        kept = kept[rank < need[cap[kept]]]
+        need -= np.bincount(cap[kept], minlength=ncaps)
+        caps.append(cap[kept])
+        points.append(xyz[kept])
+
+    caps = np.concatenate(caps)
+    order = np.argsort(caps, kind="stable")
+    return np.concatenate(points)[order], np.bincount(caps, minlength=ncaps)
+
+
+def _pymangle_chunks(genrand, size, accept, *args):
+    """Yield chunks of random points from a pymangle generator.
+
+    The number of points of each call is chosen so that about CHUNK_SIZE
+    candidates are tested, given the expected acceptance fraction.
+    """
+    step = max(int(CHUNK_SIZE * min(accept, 1.0)), 1)
+    for start in range(0, size, step):
+        yield genrand(min(step, size - start), *args)
+
+
+def _collect(
+    chunks,
+    size,
+    out=None,
+    dtype=np.float64,
+    output="radec",
+    labels=None,
+    cancel=None,
+):
+    """Write chunks of RA, DEC points to the output arrays.
+
+    Parameters
+    ----------
+    chunks: iterable
+        Pairs of RA, DEC arrays adding up to size points.
+    size: int
+        Total number of points.
+    out: sequence of numpy.ndarray, optional
+        Arrays of length size to fill, one per output column.
+    dtype: numpy.dtype
+        Data type of the arrays created when out is not given.
+    output: str
+        "radec" for RA, DEC in degrees or "xyz" for unit vectors.
+    labels: callable, optional
+        Function of the RA, DEC of a chunk whose integer result is written
+        to an extra last column.
+    cancel: threading.Event, optional
+        If set while collecting, stop and raise CancelledError.
+
+    Return
+    ------
+    out: tuple of numpy.ndarray
+        The filled arrays.
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output {output}. Choose from {OUTPUTS}.")
+    ncols = (2 if output == "radec" else 3) + (labels is not None)
+    if out is None:
+        out = tuple(np.empty(size, dtype=dtype) for _ in range(ncols))
+        if labels is not None:
+            out = out[:-1] + (np.empty(size, dtype=np.int32),)
+    elif len(out) != ncols or any(np.shape(col) != (size,) for col in out):
+        raise ValueError(
+            f"out must be {ncols} arrays of shape ({size},) for {output}."
+        )
+
+    start = 0
+    for ra, dec in chunks:
+        if cancel is not None and cancel.is_set():
+            from concurrent.futures import CancelledError
+
+            raise CancelledError("Random generation was cancelled.")
+        stop = start + len(ra)
+        if output == "radec":
+            columns = (ra, dec)
+        else:
+            columns = geometry.radec_to_xyz(ra, dec).T
+        if labels is not None:
+            columns = (*columns, labels(ra, dec))
+        for col, values in zip(out, columns):
+            col[start:stop] = values
+        start = stop
+    return tuple(out)
+
+
+def _pdf_cells(pdf, size, rng):
+    """Yield chunks of cells of a PDF drawn with its inverse CDF.
+
+    The PDF can have any number of dimensions; the cells are positions
+    in the flattened array.
+    """
+    cdf = np.cumsum(pdf, dtype=float)
     cdf /= cdf[-1]
-    # randoms
+    # randoms, in chunks to keep temporary arrays small
+    for start in range(0, size, CHUNK_SIZE):
+        urand = rng.random(min(CHUNK_SIZE, size - start))
+        yield start, np.searchsorted(cdf, urand)
+
+
+def _random_from_pdf(pdf, x_grid, size, seed=None, out=None, dtype=np.float64):
+    """Generate random numbers from a Probability Distribution Function."""
+    if out is None:
+        out = np.empty(size, dtype=dtype)
+    elif np.shape(out) != (size,):
+        raise ValueError(f"out must be an array of shape ({size},).")
     rng = np.random.default_rng(seed)
-    urand = rng.random(size)
-    bins = np.searchsorted(cdf, urand)
-    return x_grid[bins]
+    for start, bins in _pdf_cells(pdf, size, rng):
+        out[start:start + len(bins)] = x_grid[bins]
+    return out
 
 
-def z_random(z, size=10_000, weights=None, seed=None):
-    """Generate random redshift values following the input distribution.
+def _random_from_histogram(hist, edges, size, rng, out):
+    """Generate random points uniformly within the cells of a histogram.
+
+    The cells are drawn with ``_pdf_cells`` and each coordinate is spread
+    uniformly within the bin, so the cost grows linearly with size and
+    doesn't depend on the number of dimensions of the histogram.
+    """
+    widths = [np.diff(edge) for edge in edges]
+    for start, cells in _pdf_cells(hist.ravel(), size, rng):
+        stop = start + len(cells)
+        index = np.unravel_index(cells, hist.shape)
+        for col, edge, width, i in zip(out, edges, widths, index):
+            col[start:stop] = edge[i] + rng.random(len(cells)) * width[i]
+    return out
+
 
-    This function uses scipy.stats.gaussian_kde to compute the Probability
-    Density Distribution (PDF).
+def _random_from_sample(
+    z, size, weights, rng, out, bins=None, z_region=None, region=None
+):
+    """Draw values of z with probability proportional to their weights.
+
+    See ``_sample_chunks``.
+    """
+    for start, values in _sample_chunks(
+        z, size, weights, rng, bins=bins, z_region=z_region, region=region
+    ):
+        out[start:start + len(values)] = values
+    return out
+
+
+def _sample_chunks(
+    z, size, weights, rng, bins=None, z_region=None, region=None
+):
+    """Yield chunks of values of z drawn proportional to their weights.
+
+    With bins, each value drawn is replaced by a uniform value within its
+    bin, which is the same as drawing from the weighted histogram. With
+    regions, each random point draws only among the values of its region.
+    The items of each region are contiguous in the cumulative sum of the
+    weights, so a single searchsorted serves all the regions.
+    """
+    z = np.asarray(z, dtype=float)
+    weights = np.ones(len(z)) if weights is None else np.asarray(weights)
+    if (z_region is None) != (region is None):
+        raise ValueError("z_region and region must be given together.")
+    if region is not None and np.shape(region) != (size,):
+        raise ValueError(f"region must be an array of shape ({size},).")
+    if z_region is None:
+        z_region = np.zeros(len(z), dtype=np.intp)
+    else:
+        region = np.asarray(region)
+
+    labels, group = np.unique(z_region, return_inverse=True)
+    order = np.argsort(group, kind="stable")
+    cumsum = np.cumsum(weights[order], dtype=float)
+    stop = np.searchsorted(group[order], np.arange(len(labels)), "right")
+    low = np.concatenate([[0.0], cumsum])[stop - np.bincount(group)]
+    width = cumsum[stop - 1] - low
+    if not np.all(width > 0):
+        empty = labels[~(width > 0)]
+        raise ValueError(f"No redshift with weight in regions {empty}.")
+
+    if bins is not None:
+        edges = np.histogram_bin_edges(z, bins)
+        index = np.searchsorted(edges, z, "right") - 1
+        index = np.clip(index, 0, len(edges) - 2)  # the last edge is closed
+        z_low, z_width = edges[index], np.diff(edges)[index]
+
+    for start in range(0, size, CHUNK_SIZE):
+        n = min(CHUNK_SIZE, size - start)
+        if region is None:
+            groups = np.zeros(n, dtype=np.intp)
+        else:
+            chunk_region = region[start:start + n]
+            groups = np.searchsorted(labels, chunk_region)
+            groups = np.minimum(groups, len(labels) - 1)
+            missing = np.unique(chunk_region[labels[groups] != chunk_region])
+            if missing.size:
+                raise ValueError(f"No redshifts in regions {missing}.")
+        target = low[groups] + rng.random(n) * width[groups]
+        item = np.searchsorted(cumsum, target, "right")
+        item = order[np.minimum(item, stop[groups] - 1)]
+        if bins is None:
+            yield start, z[item]
+        else:
+            yield start, z_low[item] + rng.random(n) * z_width[item]
+
+
+def z_random(
+    z,
+    size=10_000,
+    weights=None,
+    seed=None,
+    out=None,
+    dtype=np.float64,
+    method="kde",
+    bins="auto",
+    z_region=None,
+    region=None,
+):
+    """Generate random redshift values following the input distribution.
 
     Parameters
     ----------
@@ -337,20 +2732,130 @@ def z_random(z, size=10_000, weights=None, seed=None):
         Weigths of each redshift value to compute a weigthed PDF.
     seed: int
         Set random seed.
+    out: numpy.ndarray, optional
+        Array of length size to fill with the random redshifts.
+    dtype: numpy.dtype
+        Data type of the returned array when out is not given.
+    method: str
+        "kde" draws from the PDF estimated with scipy.stats.gaussian_kde.
+        "shuffle" draws redshifts of the sample, with probability
+        proportional to their weights. "histogram" draws uniformly within
+        the bins of the weighted histogram of the sample. The last two
+        cost O(size) and are generated in chunks.
+    bins: int, sequence or str
+        Bins of the "histogram" method, as in ``numpy.histogram``.
+    z_region: numpy.ndarray, optional
+        Region label of each redshift of the sample, e.g. its jackknife
+        region. Only with the "shuffle" and "histogram" methods.
+    region: numpy.ndarray, optional
+        Region label of each random point, of length size. Each point
+        draws from the redshifts of its own region.
 
     Return
     ------
     z_rand: numpy.ndarray
         Random redshifts.
     """
+    if method not in Z_METHODS:
+        raise ValueError(f"Unknown method {method}. Choose from {Z_METHODS}.")
+    if out is None:
+        out = np.empty(size, dtype=dtype)
+    elif np.shape(out) != (size,):
+        raise ValueError(f"out must be an array of shape ({size},).")
+
+    if method != "kde":
+        return _random_from_sample(
+            z,
+            size,
+            weights,
+            np.random.default_rng(seed),
+            out,
+            bins=bins if method == "histogram" else None,
+            z_region=z_region,
+            region=region,
+        )
+    if z_region is not None or region is not None:
+        raise ValueError("The kde method doesn't support regions.")
+
     z_grid = np.linspace(z.min(), z.max(), size)
+    from scipy.stats import gaussian_kde
+
     kde = gaussian_kde(z, weights=weights)
     pdf = kde(z_grid)
-    z_rand = _random_from_pdf(pdf, z_grid, size, seed)
+    z_rand = _random_from_pdf(pdf, z_grid, size, seed, out=out, dtype=dtype)
     return z_rand
 
 
-def sky_random(dr="DR16", catalog="SDSS", size=10_000):
+def joint_random(
+    columns,
+    size=10_000,
+    weights=None,
+    bins=32,
+    seed=None,
+    out=None,
+    dtype=np.float64,
+):
+    """Generate random values of several properties from their joint PDF.
+
+    The PDF is the weighted histogram of the sample, as computed by
+    ``numpy.histogramdd``. Cells are drawn with the inverse CDF of the
+    flattened histogram, as the KDE grid of ``z_random``, and the values
+    uniformly within them, in chunks. The cost grows linearly with size,
+    unlike a KDE in several dimensions.
+
+    Parameters
+    ----------
+    columns: sequence of numpy.ndarray
+        Properties of the sample, e.g. ``(z, stellar_mass)``, one array
+        per property. Two to four properties are typical; the number of
+        cells grows as bins to the number of properties.
+    size: int
+        Number of random points to generate.
+    weights: numpy.ndarray, optional
+        Weight of each object of the sample.
+    bins: int or sequence
+        Bins of the histogram, as in ``numpy.histogramdd``: the number of
+        bins of every property, or the number or edges of each one.
+    seed: int, optional
+        Set random seed.
+    out: sequence of numpy.ndarray, optional
+        Arrays of length size to fill, one for each property.
+    dtype: numpy.dtype
+        Data type of the returned arrays when out is not given.
+
+    Return
+    ------
+    values: tuple of numpy.ndarray
+        Random values of each property.
+    """
+    columns = [np.asarray(col, dtype=float) for col in columns]
+    if out is None:
+        out = tuple(np.empty(size, dtype=dtype) for _ in columns)
+    elif len(out) != len(columns) or any(
+        np.shape(col) != (size,) for col in out
+    ):
+        raise ValueError(
+            f"out must be {len(columns)} arrays of shape ({size},)."
+        )
+
+    hist, edges = np.histogramdd(columns, bins=bins, weights=weights)
+    if not np.sum(hist) > 0:
+        raise ValueError("The sample has no weight.")
+    rng = np.random.default_rng(seed)
+    return tuple(_random_from_histogram(hist, edges, size, rng, out))
+
+
+def sky_random(
+    dr="DR16",
+    catalog="SDSS",
+    size=10_000,
+    seed=None,
+    method="uniform",
+    out=None,
+    dtype=None,
+    output="radec",
+    weighted=False,
+):
     """Generate random RA, DEC values within the specified DR and catalog.
 
     Parameters
@@ -361,6 +2866,20 @@ def sky_random(dr="DR16", catalog="SDSS", size=10_000):
         Catalog name within the specified data release: e.g. BOSS.
     size: int
         Number of random points to generate.
+    seed: int, optional
+        Set random seed. See ``DR.sky_random``.
+    method: str
+        How to fill the footprint. See ``DR.sky_random``.
+    out: sequence of numpy.ndarray, optional
+        Arrays to fill with the points. See ``DR.sky_random``.
+    dtype: numpy.dtype, optional
+        Data type of the returned arrays when out is not given. See
+        ``DR.sky_random``.
+    output: str
+        "radec" or "xyz". See ``DR.sky_random``.
+    weighted: bool
+        Keep the points by weight also without seed. See
+        ``DR.sky_random``.
 
     Return
     ------
@@ -370,5 +2889,12 @@ def sky_random(dr="DR16", catalog="SDSS", size=10_000):
         Declination in degrees.
     """
     ply = DR(dr=dr, catalog=catalog)
-    ra, dec = ply.sky_random(size)
-    return ra, dec
+    return ply.sky_random(
+        size,
+        seed=seed,
+        method=method,
+        out=out,
+        dtype=dtype,
+        output=output,
+        weighted=weighted,
+    )
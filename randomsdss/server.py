@@ -0,0 +1,592 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Local server keeping footprints loaded between jobs.
+
+The server loads the footprints once and answers requests over HTTP, on a
+TCP port or a Unix socket:
+
+- ``GET /`` lists the loaded footprints as JSON.
+- ``GET /<dr>/<catalog>`` returns the area and number of polygons.
+- ``POST /<dr>/<catalog>/<method>?<parameters>`` calls a method of
+  ``DR``. Scalar parameters go in the query string and the ra, dec arrays
+  of the point queries in the body. The body and the response are in
+  the NumPy ``.npz`` format, so arrays travel as raw buffers.
+
+``Client`` talks to a running server with the same API as ``DR``.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import http.client
+import http.server
+import io
+import json
+import os
+import socket
+import socketserver
+import threading
+import urllib.parse
+import zipfile
+
+import numpy as np
+
+from . import store
+from .data import PLY_PATH
+from .randomsdss import DR
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+DEFAULT_PORT = 8765
+
+CONTENT_TYPE = "application/x-npz"
+
+# Query parameters of the random generators and their types
+GENERATOR_PARAMS = {
+    "sky_random": {
+        "size": int,
+        "seed": int,
+        "method": str,
+        "dtype": str,
+        "output": str,
+        "weighted": int,
+    },
+    "box_random": {
+        "ra_min": float,
+        "ra_max": float,
+        "dec_min": float,
+        "dec_max": float,
+        "size": int,
+        "seed": int,
+        "dtype": str,
+        "output": str,
+        "weighted": int,
+    },
+}
+
+# Methods taking ra, dec arrays. True if they return a single array.
+POINT_METHODS = {
+    "contains": True,
+    "polyid": True,
+    "weight": True,
+    "polyid_and_weight": False,
+}
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# PAYLOADS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def encode_arrays(*arrays):
+    """Pack arrays in the .npz format.
+
+    Parameters
+    ----------
+    *arrays: numpy.ndarray
+        Arrays to pack.
+
+    Return
+    ------
+    payload: bytes
+        Uncompressed .npz archive.
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer, *arrays)
+    return buffer.getvalue()
+
+
+def decode_arrays(payload):
+    """Unpack the arrays of a .npz payload, in order.
+
+    Parameters
+    ----------
+    payload: bytes
+        Archive created by ``encode_arrays``.
+
+    Return
+    ------
+    arrays: list of numpy.ndarray
+        The unpacked arrays.
+
+    Raises
+    ------
+    ValueError
+        If the payload is not such an archive.
+    """
+    try:
+        with np.load(io.BytesIO(payload), allow_pickle=False) as npz:
+            return [npz[f"arr_{i}"] for i in range(len(npz.files))]
+    except (zipfile.BadZipFile, OSError, EOFError, KeyError) as err:
+        raise ValueError(f"Invalid .npz payload: {err!r}") from err
+
+
+def _float_dtype(name):
+    dtype = np.dtype(name)
+    if dtype.kind != "f":
+        raise ValueError(f"dtype must be a floating point type, not {name}.")
+    return dtype
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# SERVER
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def available_footprints():
+    """List the footprints whose .ply file can be read without downloading.
+
+    Return
+    ------
+    footprints: list of tuple
+        (dr, catalog) pairs.
+    """
+    return [
+        (dr, catalog)
+        for dr, catalogs in PLY_PATH.items()
+        for catalog in catalogs
+        if store.is_available(dr, catalog)
+    ]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Answer the requests of one connection."""
+
+    # keep the connection open between requests of the same client
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def address_string(self):
+        # Unix sockets have no client address
+        return str(self.client_address[0]) if self.client_address else "-"
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_json(self, status, obj):
+        self._send(status, json.dumps(obj).encode(), "application/json")
+
+    def _footprint(self, dr, catalog):
+        footprint = self.server.footprints.get((dr, catalog))
+        if footprint is None:
+            raise LookupError(f"Footprint {dr}/{catalog} is not loaded.")
+        return footprint
+
+    def _parts(self):
+        url = urllib.parse.urlsplit(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        return parts, query
+
+    def _answer(self, handle):
+        try:
+            status, payload, content_type = handle()
+        except LookupError as err:
+            self._send_json(404, {"error": str(err)})
+        except (ValueError, TypeError) as err:
+            self._send_json(400, {"error": str(err)})
+        except Exception as err:
+            self.log_error("%s while answering %s", repr(err), self.path)
+            self._send_json(500, {"error": repr(err)})
+        else:
+            self._send(status, payload, content_type)
+
+    def do_GET(self):
+        """List the footprints or describe one of them."""
+        self._answer(self._get)
+
+    def do_POST(self):
+        """Call a method of a footprint."""
+        self._answer(self._post)
+
+    def _get(self):
+        parts, _ = self._parts()
+        if not parts:
+            content = [f"{dr}/{cat}" for dr, cat in self.server.footprints]
+        elif len(parts) == 2:
+            footprint = self._footprint(*parts)
+            content = {
+                "area": float(footprint.area),
+                "npoly": int(footprint.npoly),
+            }
+        else:
+            raise LookupError(f"Unknown path {self.path}.")
+        return 200, json.dumps(content).encode(), "application/json"
+
+    def _post(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+
+        parts, query = self._parts()
+        if len(parts) != 3:
+            raise LookupError(f"Unknown path {self.path}.")
+        dr, catalog, method = parts
+        footprint = self._footprint(dr, catalog)
+
+        if method in GENERATOR_PARAMS:
+            types = GENERATOR_PARAMS[method]
+            unknown = set(query) - set(types)
+            if unknown:
+                raise ValueError(f"Unknown parameters {sorted(unknown)}.")
+            kwargs = {key: types[key](value) for key, value in query.items()}
+            if "dtype" in kwargs:
+                kwargs["dtype"] = _float_dtype(kwargs["dtype"])
+            if "weighted" in kwargs:
+                kwargs["weighted"] = bool(kwargs["weighted"])
+            result = getattr(footprint, method)(**kwargs)
+        elif method in POINT_METHODS:
+            ra, dec = decode_arrays(body)
+            result = getattr(footprint, method)(ra, dec)
+            if POINT_METHODS[method]:
+                result = (result,)
+        else:
+            raise LookupError(f"Unknown method {method}.")
+
+        return 200, encode_arrays(*result), CONTENT_TYPE
+
+
+class Server(http.server.ThreadingHTTPServer):
+    """HTTP server on a TCP port holding the loaded footprints.
+
+    Parameters
+    ----------
+    address: tuple
+        (host, port) to listen on. Port 0 picks a free port.
+    footprints: dict
+        ``DR`` instances by (dr, catalog).
+    verbose: bool
+        Log every request to stderr.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, footprints, verbose=False):
+        self.footprints = footprints
+        self.verbose = verbose
+        super().__init__(address, _Handler)
+
+    @property
+    def url(self):
+        """Address of the server, to be used by ``Client``."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """HTTP server on a Unix socket holding the loaded footprints.
+
+    Parameters
+    ----------
+    path: str
+        Path of the socket. It is removed when the server is closed.
+    footprints: dict
+        ``DR`` instances by (dr, catalog).
+    verbose: bool
+        Log every request to stderr.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, footprints, verbose=False):
+        self.footprints = footprints
+        self.verbose = verbose
+        super().__init__(str(path), _Handler)
+
+    @property
+    def url(self):
+        """Address of the server, to be used by ``Client``."""
+        return f"unix://{self.server_address}"
+
+    def server_close(self):
+        """Close the socket and remove its file."""
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def make_server(
+    footprints=None,
+    host="127.0.0.1",
+    port=DEFAULT_PORT,
+    unix_socket=None,
+    verbose=False,
+):
+    """Load the footprints and create a server, without starting it.
+
+    Parameters
+    ----------
+    footprints: list of tuple, optional
+        (dr, catalog) pairs to load. Defaults to every footprint whose
+        .ply file is present.
+    host: str
+        Interface to listen on.
+    port: int
+        TCP port. 0 picks a free port.
+    unix_socket: str, optional
+        Listen on this Unix socket instead of a TCP port.
+    verbose: bool
+        Log every request to stderr.
+
+    Return
+    ------
+    server: randomsdss.server.Server or randomsdss.server.UnixServer
+        Call ``serve_forever`` to start answering requests.
+    """
+    if footprints is None:
+        footprints = available_footprints()
+    loaded = {
+        (dr, catalog): DR(dr=dr, catalog=catalog) for dr, catalog in footprints
+    }
+    if unix_socket is not None:
+        return UnixServer(unix_socket, loaded, verbose=verbose)
+    return Server((host, port), loaded, verbose=verbose)
+
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CLIENT
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix socket."""
+
+    def __init__(self, path, **kwargs):
+        super().__init__("localhost", **kwargs)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class Client:
+    """Connection to a running server.
+
+    Each thread uses its own connection, kept open between requests.
+
+    Parameters
+    ----------
+    url: str
+        "http://host:port" or "unix:///path/to/socket".
+    timeout: float, optional
+        Timeout of the requests in seconds.
+    """
+
+    def __init__(self, url=f"http://127.0.0.1:{DEFAULT_PORT}", timeout=None):
+        self.url = url
+        parsed = urllib.parse.urlsplit(url)
+        kwargs = {} if timeout is None else {"timeout": timeout}
+        if parsed.scheme == "unix":
+            self._connect = lambda: _UnixHTTPConnection(parsed.path, **kwargs)
+        elif parsed.scheme == "http":
+            self._connect = lambda: http.client.HTTPConnection(
+                parsed.hostname, parsed.port or DEFAULT_PORT, **kwargs
+            )
+        else:
+            raise ValueError(f"Unsupported url {url}.")
+        self._local = threading.local()
+
+    def __repr__(self):
+        """Representation of the client."""
+        return f"Client(url={self.url!r})"
+
+    def request(self, method, path, body=None):
+        """Send a request and return the body of the response.
+
+        Parameters
+        ----------
+        method: str
+            "GET" or "POST".
+        path: str
+            Path and query of the request.
+        body: bytes, optional
+            Body of a POST request.
+
+        Return
+        ------
+        payload: bytes
+            Body of the response.
+        """
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = self._connect()
+        connection = self._local.connection
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            payload = response.read()
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            self._local.connection = None
+            raise
+
+        if response.status >= 400:
+            error = json.loads(payload)["error"]
+            raise ValueError(f"{response.status} {response.reason}: {error}")
+        return payload
+
+    def footprints(self):
+        """List the footprints loaded in the server.
+
+        Return
+        ------
+        footprints: list of tuple
+            (dr, catalog) pairs.
+        """
+        names = json.loads(self.request("GET", "/"))
+        return [tuple(name.split("/")) for name in names]
+
+    def DR(self, dr, catalog):
+        """Return a footprint of the server, with the API of ``DR``.
+
+        Parameters
+        ----------
+        dr: str
+            Data Release name: e.g DR16.
+        catalog: str
+            Catalog name within the specified data release: e.g. BOSS.
+
+        Return
+        ------
+        footprint: randomsdss.server.RemoteDR
+            Proxy to the footprint.
+        """
+        return RemoteDR(self, dr, catalog)
+
+
+class RemoteDR:
+    """Footprint loaded in a server, used like ``DR``.
+
+    Parameters
+    ----------
+    client: randomsdss.server.Client
+        Connection to the server.
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+    """
+
+    def __init__(self, client, dr, catalog):
+        self.client = client
+        self.dr = dr
+        self.catalog = catalog
+        info = json.loads(client.request("GET", f"/{dr}/{catalog}"))
+        self.area = info["area"]
+        self.npoly = info["npoly"]
+
+    def __repr__(self):
+        """Representation of the footprint."""
+        return (
+            f"RemoteDR(dr={self.dr!r}, catalog={self.catalog!r}, "
+            f"url={self.client.url!r})"
+        )
+
+    def _call(self, name, body=None, **params):
+        params = {k: v for k, v in params.items() if v is not None}
+        path = f"/{self.dr}/{self.catalog}/{name}"
+        if params:
+            path += "?" + urllib.parse.urlencode(params)
+        return decode_arrays(self.client.request("POST", path, body=body))
+
+    def sky_random(
+        self,
+        size,
+        seed=None,
+        method="uniform",
+        dtype=np.float64,
+        output="radec",
+        weighted=False,
+    ):
+        """Generate random points in the server. See ``DR.sky_random``.
+
+        The seed must be an int, as it is sent in the query string.
+        """
+        if seed is not None and not isinstance(seed, (int, np.integer)):
+            raise TypeError("The seed of a remote footprint must be an int.")
+        return tuple(
+            self._call(
+                "sky_random",
+                size=size,
+                seed=seed,
+                method=method,
+                dtype=np.dtype(dtype).name,
+                output=output,
+                weighted=1 if weighted else None,
+            )
+        )
+
+    def box_random(
+        self,
+        ra_min,
+        ra_max,
+        dec_min,
+        dec_max,
+        size,
+        seed=None,
+        dtype=np.float64,
+        output="radec",
+        weighted=False,
+    ):
+        """Generate random points in the server. See ``DR.box_random``.
+
+        The seed must be an int, as it is sent in the query string.
+        """
+        if seed is not None and not isinstance(seed, (int, np.integer)):
+            raise TypeError("The seed of a remote footprint must be an int.")
+        return tuple(
+            self._call(
+                "box_random",
+                ra_min=ra_min,
+                ra_max=ra_max,
+                dec_min=dec_min,
+                dec_max=dec_max,
+                size=size,
+                seed=seed,
+                dtype=np.dtype(dtype).name,
+                output=output,
+                weighted=1 if weighted else None,
+            )
+        )
+
+    def _points(self, method, ra, dec):
+        body = encode_arrays(np.atleast_1d(ra), np.atleast_1d(dec))
+        result = self._call(method, body=body)
+        return result[0] if POINT_METHODS[method] else tuple(result)
+
+    def contains(self, ra, dec):
+        """Check if points are inside the footprint. See ``DR.contains``."""
+        return self._points("contains", ra, dec)
+
+    def polyid_and_weight(self, ra, dec):
+        """Get polygon id and weight. See ``DR.polyid_and_weight``."""
+        return self._points("polyid_and_weight", ra, dec)
+
+    def polyid(self, ra, dec):
+        """Get polygon id of input points. See ``DR.polyid``."""
+        return self._points("polyid", ra, dec)
+
+    def weight(self, ra, dec):
+        """Get polygon weight of input points. See ``DR.weight``."""
+        return self._points("weight", ra, dec)
@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of the RandomSDSS Project
+# https://github.com/mchalela/RandomSDSS
+# Copyright (c) 2021, Martin Chalela
+# License: MIT
+# Full Text: https://github.com/mchalela/RandomSDSS/LICENSE
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# DOCS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+"""Local store of the polygon files.
+
+A footprint is read from the first of these places holding its file:
+
+1. The plain .ply file in ``PLY_PATH``.
+2. The store in ``data.CACHE_PATH / "ply"``.
+3. A gzip or xz compressed copy next to the ``PLY_PATH`` file, which is
+   decompressed into the store the first time.
+4. A download from the mirror, or from the original SDSS address if no
+   mirror is set, only if ``auto_fetch`` is on or ``fetch`` is called.
+
+pymangle can only read plain files, so the store always holds them
+decompressed. Files are checked against the SHA-256 of the decompressed
+.ply listed in ``data/manifest.json`` before entering the store. A
+download whose checksum is not in the manifest is refused, unless
+verification is turned off with ``verify=False`` or
+``RANDOMSDSS_VERIFY=0``, in which case it is stored with a warning. A mirror
+holds the files as ``<mirror>/<dr>/<DR.CATALOG>.ply`` (lower case dr
+directory, like the package), optionally with a .xz or .gz suffix.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# IMPORTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+import gzip
+import hashlib
+import json
+import lzma
+import os
+import pathlib
+import shutil
+import warnings
+from functools import lru_cache
+
+from . import data
+from .data import DR_PATH, PLY_PATH
+
+# urllib.request and concurrent.futures are imported on first use, as
+# most sessions only read files that are already in place.
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# CONSTANTS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# Compressed suffixes that can be read, in order of preference
+COMPRESSIONS = {".xz": lzma.open, ".gz": gzip.open}
+
+MANIFEST_PATH = DR_PATH / "manifest.json"
+
+_CONFIG = {
+    "mirror": os.environ.get("RANDOMSDSS_MIRROR") or None,
+    "auto_fetch": os.environ.get("RANDOMSDSS_AUTO_FETCH", "0") != "0",
+    "timeout": 60.0,
+    "verify": os.environ.get("RANDOMSDSS_VERIFY", "1") != "0",
+}
+
+_BUFFER_SIZE = 2**20
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+# FUNCTIONS
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+
+def configure(
+    mirror=None, auto_fetch=None, timeout=None, cache_path=None, verify=None
+):
+    """Set the options of the store.
+
+    Parameters
+    ----------
+    mirror: str, optional
+        Base URL of a mirror. Defaults to ``RANDOMSDSS_MIRROR``; without
+        a mirror the files are downloaded from their original address.
+    auto_fetch: bool, optional
+        Download missing files when a footprint is loaded. Defaults to
+        ``RANDOMSDSS_AUTO_FETCH``, off.
+    timeout: float, optional
+        Timeout of the downloads in seconds.
+    cache_path: str or pathlib.Path, optional
+        Directory of the cache, replacing ``RANDOMSDSS_CACHE``.
+    verify: bool, optional
+        Refuse downloads without a checksum in the manifest. Defaults to
+        ``RANDOMSDSS_VERIFY``, on.
+    """
+    if mirror is not None:
+        _CONFIG["mirror"] = mirror.rstrip("/")
+    if auto_fetch is not None:
+        _CONFIG["auto_fetch"] = auto_fetch
+    if timeout is not None:
+        _CONFIG["timeout"] = timeout
+    if cache_path is not None:
+        data.CACHE_PATH = pathlib.Path(cache_path)
+    if verify is not None:
+        _CONFIG["verify"] = verify
+
+
+@lru_cache(maxsize=None)
+def manifest():
+    """Return the original URL and checksum of every polygon file.
+
+    Return
+    ------
+    manifest: dict
+        ``{dr: {catalog: {"url": str, "sha256": str}}}``. Either value
+        may be None if unknown.
+    """
+    with open(MANIFEST_PATH) as fp:
+        return json.load(fp)
+
+
+def store_path(dr, catalog):
+    """Return the path of a polygon file in the store.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+
+    Return
+    ------
+    path: pathlib.Path
+        Path of the plain .ply file in the cache.
+    """
+    return data.CACHE_PATH / "ply" / dr.lower() / PLY_PATH[dr][catalog].name
+
+
+def _compressed(dr, catalog):
+    """Compressed copy shipped next to the PLY_PATH file, if any."""
+    path = PLY_PATH[dr][catalog]
+    for suffix in COMPRESSIONS:
+        compressed = path.with_name(path.name + suffix)
+        if compressed.is_file():
+            return compressed
+    return None
+
+
+def is_available(dr, catalog):
+    """Check if a polygon file can be read without downloading it.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+
+    Return
+    ------
+    available: bool
+        True if the plain file, a compressed copy or the stored file
+        exists.
+    """
+    return (
+        PLY_PATH[dr][catalog].is_file()
+        or store_path(dr, catalog).is_file()
+        or _compressed(dr, catalog) is not None
+    )
+
+
+def ply_file(dr, catalog):
+    """Return the path of a plain .ply file of a footprint.
+
+    See the module documentation for the places searched.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+
+    Return
+    ------
+    path: pathlib.Path
+        Path of a plain .ply file.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the file is nowhere and can't be downloaded.
+    """
+    path = PLY_PATH[dr][catalog]
+    if path.is_file():
+        return path
+    stored = store_path(dr, catalog)
+    if stored.is_file():
+        return stored
+    compressed = _compressed(dr, catalog)
+    if compressed is not None:
+        # shipped with the package, checked if its checksum is known
+        _install(compressed, dr, catalog, compressed.name, verify=False)
+        return stored
+    if _CONFIG["auto_fetch"]:
+        return fetch(dr, catalog)
+    raise FileNotFoundError(
+        f"{dr}/{catalog} is not in the store. Download it with "
+        "randomsdss.store.fetch, 'randomsdss fetch' or set "
+        "RANDOMSDSS_AUTO_FETCH=1."
+    )
+
+
+def _install(source, dr, catalog, name, verify=True):
+    """Decompress and verify source, then move it into the store."""
+    opener = COMPRESSIONS.get(os.path.splitext(name)[1], open)
+    stored = store_path(dr, catalog)
+    stored.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = stored.with_name(f".{stored.name}.{os.getpid()}.tmp")
+
+    digest = hashlib.sha256()
+    try:
+        with opener(source, "rb") as src, open(tmp_path, "wb") as dst:
+            for block in iter(lambda: src.read(_BUFFER_SIZE), b""):
+                digest.update(block)
+                dst.write(block)
+        _verify(digest.hexdigest(), dr, catalog, name, verify)
+        os.replace(tmp_path, stored)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+    return stored
+
+
+def _verify(sha256, dr, catalog, name, required):
+    expected = manifest().get(dr, {}).get(catalog, {}).get("sha256")
+    if expected is None and required:
+        raise ValueError(
+            f"No checksum known for {dr}/{catalog}, {name} can't be "
+            f"verified. Its SHA-256 is {sha256}. Add it to the manifest "
+            "or fetch with verify=False."
+        )
+    elif expected is None:
+        warnings.warn(
+            f"No checksum known for {dr}/{catalog}, {name} was not "
+            f"verified. Its SHA-256 is {sha256}."
+        )
+    elif sha256 != expected:
+        raise ValueError(
+            f"Checksum mismatch for {dr}/{catalog} from {name}: "
+            f"expected {expected}, got {sha256}."
+        )
+
+
+def _urls(dr, catalog, mirror):
+    if mirror:
+        name = PLY_PATH[dr][catalog].name
+        base = f"{mirror.rstrip('/')}/{dr.lower()}/{name}"
+        return [base + suffix for suffix in COMPRESSIONS] + [base]
+    url = manifest().get(dr, {}).get(catalog, {}).get("url")
+    return [url] if url else []
+
+
+def fetch(dr, catalog, mirror=None, force=False, verify=None):
+    """Download a polygon file into the store.
+
+    The compressed variants on the mirror are tried first. The file is
+    decompressed and checked against the manifest checksum before it
+    replaces the stored one.
+
+    Parameters
+    ----------
+    dr: str
+        Data Release name: e.g DR16.
+    catalog: str
+        Catalog name within the specified data release: e.g. BOSS.
+    mirror: str, optional
+        Base URL of the mirror. Defaults to the configured one.
+    force: bool
+        Download even if the file is already stored.
+    verify: bool, optional
+        Refuse the file if the manifest has no checksum for it. With
+        False it is stored with a warning, but a known checksum is still
+        checked. Defaults to the configured value, on.
+
+    Return
+    ------
+    path: pathlib.Path
+        Path of the stored file.
+
+    Raises
+    ------
+    FileNotFoundError
+        If no URL could be downloaded.
+    ValueError
+        If the checksum doesn't match, or is unknown and verify is on.
+    """
+    import urllib.error
+    import urllib.request
+
+    stored = store_path(dr, catalog)
+    if stored.is_file() and not force:
+        return stored
+    if verify is None:
+        verify = _CONFIG["verify"]
+
+    errors = []
+    stored.parent.mkdir(parents=True, exist_ok=True)
+    download = stored.with_name(f".{stored.name}.{os.getpid()}.download")
+    for url in _urls(dr, catalog, mirror or _CONFIG["mirror"]):
+        try:
+            with urllib.request.urlopen(
+                url, timeout=_CONFIG["timeout"]
+            ) as response, open(download, "wb") as fp:
+                shutil.copyfileobj(response, fp, _BUFFER_SIZE)
+        except (urllib.error.URLError, OSError) as err:
+            errors.append(f"{url}: {err}")
+            continue
+        try:
+            name = url.rsplit("/", 1)[-1]
+            return _install(download, dr, catalog, name, verify)
+        finally:
+            download.unlink()
+
+    if download.exists():
+        download.unlink()
+    raise FileNotFoundError(
+        f"Could not download {dr}/{catalog}. "
+        + ("; ".join(errors) or "No URL is known.")
+    )
+
+
+def prefetch(footprints=None, mirror=None, max_workers=4, verify=None):
+    """Download several polygon files at once.
+
+    Parameters
+    ----------
+    footprints: sequence of tuple, optional
+        (dr, catalog) pairs. Defaults to every footprint of PLY_PATH.
+    mirror: str, optional
+        Base URL of the mirror. Defaults to the configured one.
+    max_workers: int
+        Number of downloads running at once.
+    verify: bool, optional
+        Refuse files without a known checksum. See ``fetch``.
+
+    Return
+    ------
+    paths: dict
+        Path of each footprint file by (dr, catalog). Files already
+        available are not downloaded.
+
+    Raises
+    ------
+    FileNotFoundError
+        After every download finished, if some of them failed or could
+        not be verified.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    if footprints is None:
+        footprints = [(dr, cat) for dr in PLY_PATH for cat in PLY_PATH[dr]]
+
+    def get(footprint):
+        if is_available(*footprint):
+            return ply_file(*footprint)
+        return fetch(*footprint, mirror=mirror, verify=verify)
+
+    paths, errors = {}, []
+    with ThreadPoolExecutor(max_workers) as executor:
+        futures = {fp: executor.submit(get, fp) for fp in footprints}
+        for footprint, future in futures.items():
+            try:
+                paths[footprint] = future.result()
+            except (FileNotFoundError, ValueError) as err:
+                errors.append(str(err))
+    if errors:
+        raise FileNotFoundError("\n".join(errors))
+    return paths
@@ -68,6 +68,9 @@ def do_setup():
             "randomsdss.data",
         ],
         include_package_data=True,
+        entry_points={
+            "console_scripts": ["randomsdss=randomsdss.cli:main"],
+        },
         license="MIT",
         keywords=["random", "sdss", "sky", "pymangle", "mangle"],
         classifiers=[
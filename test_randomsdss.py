@@ -11,8 +11,19 @@
 # IMPORTS
 # =============================================================================
 
+import asyncio
+import functools
+import gzip
+import http.server
+import json
+import lzma
 import os
 import pathlib
+import re
+import subprocess
+import sys
+import threading
+import tracemalloc
 from unittest.mock import PropertyMock, patch
 
 import numpy as np
@@ -23,6 +34,8 @@ import pytest
 
 import randomsdss
 from randomsdss import DR, DR10, DR11, DR12, DR13, DR14, DR15, DR16, DR8, DR9
+from randomsdss import cli, cosmology, geometry, masking, pairs, server
+from randomsdss import store
 
 # ============================================================================
 # CONSTANTS
@@ -32,6 +45,9 @@ PATH = os.path.abspath(os.path.dirname(__file__))
 
 DR_PATH = pathlib.Path(PATH) / "randomsdss" / "data"
 
+# Maximum time in seconds of "import randomsdss", most of it numpy
+IMPORT_TIME_BUDGET = 1.0
+
 DRX = {
     8: DR8,
     9: DR9,
@@ -44,6 +60,25 @@ DRX = {
     16: DR16,
 }
 
+# ============================================================================
+# FIXTURES
+# ============================================================================
+
+
+@pytest.fixture(scope="session")
+def session_cache(tmp_path_factory):
+    """Cache shared by the tests, so polygons are decompressed once."""
+    return tmp_path_factory.mktemp("cache")
+
+
+@pytest.fixture(autouse=True)
+def cache_path(session_cache, monkeypatch):
+    """Keep the caches of the tests and their subprocesses out of home."""
+    monkeypatch.setattr(randomsdss.data, "CACHE_PATH", session_cache)
+    monkeypatch.setenv("RANDOMSDSS_CACHE", str(session_cache))
+    return session_cache
+
+
 # ============================================================================
 # TEST INITIALIZATIONS
 # ============================================================================
@@ -151,6 +186,118 @@ def test_get_polygon_error():
         exists.assert_called_once()
 
 
+# ============================================================================
+# TEST DATA STORE
+# ============================================================================
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    """HTTP mirror holding DR14/LRG_S compressed, and an empty store."""
+    root = tmp_path / "mirror"
+    (root / "dr14").mkdir(parents=True)
+    shipped = DR_PATH / "dr14" / "DR14.LRG_S.ply.xz"
+    (root / "dr14" / shipped.name).write_bytes(shipped.read_bytes())
+    monkeypatch.setattr(randomsdss.data, "CACHE_PATH", tmp_path / "cache")
+
+    handler = functools.partial(_QuietHandler, directory=str(root))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield root, f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def test_store_compressed(tmp_path, monkeypatch):
+    monkeypatch.setattr(randomsdss.data, "CACHE_PATH", tmp_path)
+    assert store.is_available("DR14", "LRG_S")
+    assert not store.store_path("DR14", "LRG_S").exists()
+
+    path = store.ply_file("DR14", "LRG_S")
+    assert path == store.store_path("DR14", "LRG_S")
+    assert Mangle(str(path)).npoly == DR14("LRG_S").npoly
+
+
+def test_read_ply_compressed(tmp_path):
+    plain = store.ply_file("DR14", "LRG_S")
+    with (
+        open(plain, "rb") as src,
+        gzip.open(tmp_path / "s.ply.gz", "wb") as dst,
+    ):
+        dst.write(src.read())
+
+    polygons = geometry.read_ply(plain)
+    for path in (
+        DR_PATH / "dr14" / "DR14.LRG_S.ply.xz",
+        tmp_path / "s.ply.gz",
+    ):
+        compressed = geometry.read_ply(path)
+        np.testing.assert_array_equal(compressed.caps, polygons.caps)
+        np.testing.assert_array_equal(compressed.weights, polygons.weights)
+
+
+def test_store_fetch(mirror):
+    root, url = mirror
+    path = store.fetch("DR14", "LRG_S", mirror=url)
+    assert path == store.store_path("DR14", "LRG_S")
+    assert Mangle(str(path)).npoly == DR14("LRG_S").npoly
+
+    # already stored: no download, even if the mirror is gone
+    assert store.fetch("DR14", "LRG_S", mirror=url + "/missing") == path
+
+
+def test_store_fetch_checksum(mirror):
+    root, url = mirror
+    corrupt = root / "dr14" / "DR14.LRG_S.ply.xz"
+    corrupt.write_bytes(lzma.compress(b"polygon 0 ( 0 caps, 1 weight )\n"))
+
+    with pytest.raises(ValueError, match="Checksum mismatch"):
+        store.fetch("DR14", "LRG_S", mirror=url)
+    assert not store.store_path("DR14", "LRG_S").exists()
+    assert list(store.store_path("DR14", "LRG_S").parent.iterdir()) == []
+
+
+def test_store_fetch_unknown_checksum(mirror, monkeypatch):
+    root, url = mirror
+    entries = json.loads(json.dumps(store.manifest()))
+    entries["DR14"]["LRG_S"]["sha256"] = None
+    monkeypatch.setattr(store, "manifest", lambda: entries)
+
+    with pytest.raises(ValueError, match="No checksum known"):
+        store.fetch("DR14", "LRG_S", mirror=url)
+    assert not store.store_path("DR14", "LRG_S").exists()
+
+    with pytest.warns(UserWarning, match="not verified"):
+        path = store.fetch("DR14", "LRG_S", mirror=url, verify=False)
+    assert Mangle(str(path)).npoly == DR14("LRG_S").npoly
+
+
+def test_store_prefetch_errors(mirror):
+    root, url = mirror
+    with pytest.raises(FileNotFoundError, match="DR14/QSO_N") as err:
+        store.prefetch(
+            [("DR14", "LRG_S"), ("DR14", "QSO_N"), ("DR14", "QSO_S")],
+            mirror=url,
+        )
+    assert "DR14/QSO_S" in str(err.value)
+
+    paths = store.prefetch([("DR14", "LRG_N"), ("DR14", "LRG_S")], mirror=url)
+    assert all(path.is_file() for path in paths.values())
+
+
+def test_cli_fetch(mirror, capsys):
+    root, url = mirror
+    assert cli.main(["fetch", "DR14/LRG_S", "--mirror", url]) == 0
+    assert str(store.store_path("DR14", "LRG_S")) in capsys.readouterr().out
+
+
 # ============================================================================
 # TEST RANDOM GENERATION FUNCTIONS
 # ============================================================================
@@ -165,6 +312,686 @@ def test_sky_random(release):
     assert np.all(dr_obj.mangle_.contains(ra, dec))
 
 
+def test_sky_random_seed():
+    dr14 = DR14("LRG_N")
+    ra, dec = dr14.sky_random(500, seed=42)
+    ra2, dec2 = randomsdss.sky_random("DR14", "LRG_N", size=500, seed=42)
+
+    assert len(ra) == 500
+    assert np.all(dr14.contains(ra, dec))
+    np.testing.assert_array_equal(ra, ra2)
+    np.testing.assert_array_equal(dec, dec2)
+
+
+def test_sky_random_weights():
+    dr14 = DR14("LRG_S")
+    # most polygons of LRG_S have weight 0
+    assert np.mean(dr14.weights == 0) > 0.5
+    size = 20_000
+    # pymangle genrand ignores the weights unless weighted is given
+    ra, dec = dr14.sky_random(size)
+    assert np.mean(dr14.weight(ra, dec) == 0) > 0.5
+    ra, dec = dr14.sky_random(size, dtype=np.float64)
+    assert ra.dtype == dec.dtype == np.float64
+    assert np.mean(dr14.weight(ra, dec) == 0) > 0.5
+    unseeded = dr14.sky_random(size, weighted=True)
+    seeded = dr14.sky_random(size, seed=3)
+    for ra, dec in (unseeded, seeded):
+        assert np.all(dr14.contains(ra, dec))
+        assert np.mean(dr14.weight(ra, dec) == 0) == 0
+
+    # both follow the weights: half of the polygons with a lower weight
+    positive = dr14.polygons_.ids[dr14.weights > 0]
+    dr14.set_weights(lambda p: 0.2 * p.weight, polyids=positive[::2])
+    fractions = [
+        np.isin(dr14.polyid(*points), positive[::2]).mean()
+        for points in (
+            dr14.sky_random(size, weighted=True),
+            dr14.sky_random(size, seed=4),
+        )
+    ]
+    assert fractions[0] == pytest.approx(fractions[1], abs=0.02)
+
+    # weights above 1 count as 1
+    np.testing.assert_array_equal(
+        randomsdss.keep_probability([-1.0, 0.5, 2.0]), [0.0, 0.5, 1.0]
+    )
+
+
+def test_sky_random_seed_zero_weight():
+    dr14 = DR14("LRG_N")
+    dr14.set_weights(0.0)
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=42)
+
+
+def test_random_stream():
+    dr14 = DR14("LRG_S")
+    stream = randomsdss.RandomStream(dr14, seed=11, block_size=1_000)
+    ra, dec = stream.points(0, 4_500)
+    assert np.all(dr14.contains(ra, dec))
+
+    first = stream.points(0, 1_700)
+    extra = stream.extend(first, 2_800)
+    np.testing.assert_array_equal(np.concatenate([first[0], extra[0]]), ra)
+    np.testing.assert_array_equal(np.concatenate([first[1], extra[1]]), dec)
+    middle = stream[2_345:3_456]
+    np.testing.assert_array_equal(middle[0], ra[2_345:3_456])
+    np.testing.assert_array_equal(middle[1], dec[2_345:3_456])
+    xyz = stream.extend(4_000, 500, output="xyz")
+    np.testing.assert_allclose(
+        np.column_stack(xyz), geometry.radec_to_xyz(ra[4_000:], dec[4_000:])
+    )
+
+    # the same seed and block size give the same stream
+    again = randomsdss.RandomStream(DR14("LRG_S"), seed=11, block_size=1_000)
+    np.testing.assert_array_equal(again[:100][0], ra[:100])
+    other = randomsdss.RandomStream(dr14, seed=11, block_size=2_000)
+    assert not np.array_equal(other[:1_500][0], ra[:1_500])
+    fresh = randomsdss.RandomStream(dr14)
+    np.testing.assert_array_equal(
+        randomsdss.RandomStream(dr14, seed=fresh.seed)[:10][0],
+        fresh[:10][0],
+    )
+
+    with pytest.raises(TypeError):
+        stream[::2]
+    with pytest.raises(ValueError):
+        stream[10:]
+    with pytest.raises(ValueError):
+        stream.points(5, 2)
+    with pytest.raises(ValueError):
+        randomsdss.RandomStream(dr14, block_size=0)
+    dr14.set_weights(0.5, polyids=dr14.polygons_.ids[:10])
+    with pytest.raises(ValueError):
+        stream.points(0, 10)
+
+
+def test_random_bank(tmp_path, monkeypatch):
+    monkeypatch.setattr(randomsdss.data, "CACHE_PATH", tmp_path)
+    dr14 = DR14("LRG_S")
+    bank = randomsdss.RandomBank(dr14, size=20_000, seed=3)
+    assert len(list((tmp_path / "banks").glob("*.npy"))) == 1
+    ra, dec = bank.sky_random(1_500)
+    assert bank.cursor == 1_500
+    assert np.all(dr14.contains(ra, dec))
+    np.testing.assert_array_equal(ra, bank.points_["ra"][:1_500])
+    following = bank.sky_random(500, output="xyz")
+    np.testing.assert_allclose(
+        np.column_stack(following),
+        geometry.radec_to_xyz(
+            bank.points_["ra"][1_500:2_000], bank.points_["dec"][1_500:2_000]
+        ),
+    )
+    same = bank.sky_random(1_000, seed=7)
+    np.testing.assert_array_equal(same, bank.sky_random(1_000, seed=7))
+
+    # the file is read again, and new points complete a request
+    again = randomsdss.RandomBank(DR14("LRG_S"), size=20_000, seed=3)
+    np.testing.assert_array_equal(again.points_, bank.points_)
+    again.cursor = 19_000
+    ra, dec, region = again.sky_random(3_000, jackknife=4)
+    np.testing.assert_array_equal(ra[:1_000], bank.points_["ra"][19_000:])
+    assert np.all(dr14.contains(ra, dec))
+    np.testing.assert_array_equal(region, dr14.jackknife_region(ra, dec, 4))
+    assert again.cursor == 20_000
+
+    # lower weights thin the bank to follow them
+    weights = np.asarray(dr14.weights, dtype=float)
+    half = dr14.polygons_.ids[np.flatnonzero(weights > 0)[::2]]
+    dr14.set_weights(lambda p: 0.25 * p.weight, polyids=half)
+    assert bank.usable
+    ra, dec = bank.sky_random(10_000, seed=1)
+    fresh = dr14.sky_random(10_000, seed=1)
+    assert np.isin(dr14.polyid(ra, dec), half).mean() == pytest.approx(
+        np.isin(dr14.polyid(*fresh), half).mean(), abs=0.03
+    )
+
+    # weight where the bank has no points: all the points are new
+    dr14.set_weights(1.0)
+    assert not bank.usable
+    ra, dec = bank.sky_random(1_000, seed=1)
+    assert not np.any(np.isin(ra, bank.points_["ra"]))
+    assert np.all(dr14.contains(ra, dec))
+
+    with pytest.raises(ValueError):
+        randomsdss.RandomBank(dr14, size=0)
+    with pytest.raises(ValueError):
+        bank.sky_random(-1)
+
+
+def test_sampling_table():
+    rng = np.random.default_rng(0)
+    values = rng.random(1000) * (rng.random(1000) > 0.3)
+    table = randomsdss.SamplingTable(values)
+    positions = rng.choice(1000, 100, replace=False)
+    values[positions] = rng.random(100)
+    table.update(positions, values[positions])
+
+    cumsum = np.cumsum(values)
+    np.testing.assert_allclose(table.prefix(np.arange(1, 1001)), cumsum)
+    assert table.total == pytest.approx(cumsum[-1])
+    for size in (100, 10_000):
+        targets = rng.uniform(0, cumsum[-1], size)
+        np.testing.assert_array_equal(
+            table.search(targets), np.searchsorted(cumsum, targets, "right")
+        )
+    assert values[table.search([cumsum[-1]])] > 0
+
+
+def test_set_weights_polyids():
+    dr14 = DR14("LRG_N")
+    table = dr14.sampling_table_
+    polyids = dr14.polygons_.ids[[5, 17, 4000]]
+    dr14.set_weights([0.5, 0.0, 0.25], polyids=polyids)
+
+    assert dr14.sampling_table_ is table
+    np.testing.assert_array_equal(
+        dr14.weights[[5, 17, 4000]], [0.5, 0.0, 0.25]
+    )
+    fresh = randomsdss.SamplingTable.from_mangle(dr14.mangle_)
+    np.testing.assert_allclose(table.values, fresh.values)
+    assert table.total == pytest.approx(fresh.total)
+
+    dr14.set_weights(1.0)
+    assert dr14.sampling_table_.total == pytest.approx(dr14.area, rel=1e-3)
+
+
+def test_set_weights_callable():
+    dr14 = DR14("LRG_S")
+    weights = dr14.weights.astype(float)
+    small = dr14.polygon_properties().area < 1e-6
+    dr14.set_weights(lambda p: np.where(p.area < 1e-6, 0.0, p.weight))
+    np.testing.assert_array_equal(dr14.weights, np.where(small, 0, weights))
+
+    polyids = dr14.polygons_.ids[:10]
+    dr14.set_weights(lambda p: 2 * p.weight, polyids=polyids)
+    np.testing.assert_allclose(
+        dr14.weights[:10], 2 * np.where(small, 0, weights)[:10]
+    )
+    with pytest.raises(ValueError, match="Unknown polygon ids"):
+        dr14.set_weights(1.0, polyids=[-3])
+
+
+def test_count_per_polygon():
+    dr14 = DR14("LRG_S")
+    rng = np.random.default_rng(1)
+    ra, dec = rng.uniform(0, 360, 200_000), rng.uniform(-20, 40, 200_000)
+    weights = rng.random(200_000)
+
+    pid = dr14.polyid(ra, dec)
+    inside = pid >= 0
+    expected = np.bincount(pid[inside], minlength=dr14.npoly)
+    counts = dr14.count_per_polygon(ra, dec, max_workers=2)
+    assert counts.dtype == np.int64
+    np.testing.assert_array_equal(counts, expected)
+
+    weighted = dr14.count_per_polygon(ra, dec, weights=weights)
+    np.testing.assert_allclose(
+        weighted,
+        np.bincount(pid[inside], weights[inside], minlength=dr14.npoly),
+    )
+
+
+def test_coherent_lookup(monkeypatch):
+    dr14 = DR14("LRG_S")
+    weights = dr14.weights
+    weights[::5] = 0.25
+    dr14.set_weights(weights)
+    rng = np.random.default_rng(4)
+    ra, dec = dr14.sky_random(30_000, seed=5)
+    ra = np.concatenate([ra, rng.uniform(0, 360, 30_000)])
+    dec = np.concatenate([dec, rng.uniform(-20, 40, 30_000)])
+    # small blocks, so that several are sorted and scattered back
+    monkeypatch.setattr(randomsdss.randomsdss, "COHERENT_BLOCK", 7_000)
+
+    np.testing.assert_array_equal(
+        dr14.contains(ra, dec, coherent=True), dr14.contains(ra, dec)
+    )
+    pid, weight = dr14.polyid_and_weight(ra, dec, coherent=True)
+    expected_pid, expected_weight = dr14.polyid_and_weight(ra, dec)
+    np.testing.assert_array_equal(pid, expected_pid)
+    np.testing.assert_array_equal(weight, expected_weight)
+    np.testing.assert_array_equal(dr14.polyid(ra, dec, coherent=True), pid)
+    np.testing.assert_array_equal(
+        dr14.weight(ra, dec, coherent=True), weight
+    )
+    order = geometry.curve_order(ra, dec)
+    np.testing.assert_array_equal(np.sort(order), np.arange(len(ra)))
+    near = np.abs(np.diff(dec[order]))
+    assert np.median(near) < np.median(np.abs(np.diff(dec)))
+
+
+def test_coherent_lookup_sorted(monkeypatch):
+    dr14 = DR14("LRG_N")
+    ra, dec = dr14.sky_random(20_000, seed=6)
+    shuffled = np.random.default_rng(6).permutation(len(ra))
+    by_dec = np.lexsort((ra, dec))
+    assert not geometry.is_coherent(dec[shuffled])
+    assert geometry.is_coherent(dec[by_dec])
+    assert geometry.is_coherent(dec[geometry.curve_order(ra, dec)])
+    assert geometry.is_coherent(dec[:1])
+
+    # sorted blocks are looked up as given
+    monkeypatch.setattr(randomsdss.randomsdss, "COHERENT_BLOCK", 7_000)
+    sorted_ra, sorted_dec = ra[by_dec], dec[by_dec]
+    expected = dr14.polyid_and_weight(sorted_ra, sorted_dec)
+    with patch.object(geometry, "curve_order") as curve_order:
+        pid, weight = dr14.polyid_and_weight(
+            sorted_ra, sorted_dec, coherent=True
+        )
+        curve_order.assert_not_called()
+    np.testing.assert_array_equal(pid, expected[0])
+    np.testing.assert_array_equal(weight, expected[1])
+
+
+def test_to_pixel_map(tmp_path, monkeypatch):
+    monkeypatch.setattr(randomsdss.data, "CACHE_PATH", tmp_path)
+    dr14 = DR14("LRG_S")
+    weights = dr14.weights
+    weights[::3] = 0.5
+    dr14.set_weights(weights)
+    nside, level = 16, 2
+    fraction, weight = dr14.to_pixel_map(nside, level=level, max_workers=2)
+    assert fraction.shape == weight.shape == (12 * nside**2,)
+    assert randomsdss.pixel_map_path("DR14", "LRG_S", nside, level).exists()
+
+    # every sub-pixel of the sky, checked with pymangle
+    nsub = 4**level
+    ra, dec = geometry.healpix_to_radec(
+        nside * 2**level, np.arange(12 * nside**2 * nsub)
+    )
+    nudge = 1e-6 * np.rad2deg(np.sqrt(np.pi / 3) / (nside * 2**level))
+    pid, sub_weight = dr14.polyid_and_weight(ra + nudge, dec + nudge)
+    inside = (pid >= 0).reshape(-1, nsub)
+    sub_weight = np.where(pid >= 0, sub_weight, 0).astype(float)
+    sub_weight = sub_weight.reshape(-1, nsub)
+    np.testing.assert_allclose(fraction, inside.mean(axis=1))
+    covered = inside.sum(axis=1)
+    np.testing.assert_allclose(
+        weight[covered > 0],
+        sub_weight.sum(axis=1)[covered > 0] / covered[covered > 0],
+    )
+    assert np.all(weight[covered == 0] == 0)
+
+    # the counts come from the cache, new weights are used
+    def fail(*args):
+        raise AssertionError("sampled again")
+
+    monkeypatch.setattr(DR, "_sample_pixels", fail)
+    dr14.set_weights(1.0)
+    cached, new_weight = dr14.to_pixel_map(nside, level=level)
+    np.testing.assert_array_equal(cached, fraction)
+    np.testing.assert_array_equal(new_weight, np.where(covered > 0, 1, 0))
+
+    with pytest.raises(ValueError):
+        dr14.to_pixel_map(12)
+    with pytest.raises(ValueError):
+        dr14.to_pixel_map(16, level=-1)
+
+
+def test_edge_distance():
+    dr14 = DR14("LRG_S")
+    ra, dec = dr14.sky_random(100, seed=6)
+    distance = dr14.edge_distance(ra, dec, max_distance=2.0)
+    assert np.all((distance >= 0) & (distance <= 2.0))
+    assert np.any(distance < 0.1)
+
+    # the disc closer than the distance, minus a step, is weighted
+    rng = np.random.default_rng(0)
+    near = distance > 2 * randomsdss.EDGE_STEP
+    center = geometry.radec_to_xyz(ra[near], dec[near])
+    radius = np.deg2rad(distance[near] - randomsdss.EDGE_STEP)
+    disc = geometry.sample_caps(
+        np.repeat(center, 200, axis=0), np.repeat(radius, 200), rng
+    )
+    assert np.all(dr14.weight(*geometry.xyz_to_radec(disc)) > 0)
+
+    # points far from the footprint
+    np.testing.assert_array_equal(
+        dr14.edge_distance([0.0, 180.0], [-89.0, 89.0], max_distance=0.5),
+        0.5,
+    )
+
+    # zero weights make new edges
+    inside = np.flatnonzero(distance > 0.5)[:1]
+    dr14.set_weights(0.0, polyids=dr14.polyid(ra[inside], dec[inside]))
+    new = dr14.edge_distance(ra[inside], dec[inside], max_distance=2.0)
+    assert new[0] < distance[inside][0]
+
+    with pytest.raises(ValueError):
+        dr14.edge_distance(ra, dec, max_distance=0)
+    with pytest.raises(ValueError):
+        dr14.edge_distance(ra, dec[:10])
+
+
+def test_set_completeness():
+    dr14 = DR14("LRG_S")
+    ra, dec = dr14.sky_random(20_000, seed=2)
+    observed = np.random.default_rng(3).random(20_000) < 0.7
+
+    completeness = dr14.set_completeness(
+        (ra, dec), (ra[observed], dec[observed])
+    )
+    pid = dr14.polyid(ra, dec)
+    n_targets = np.bincount(pid, minlength=dr14.npoly)
+    n_observed = np.bincount(pid[observed], minlength=dr14.npoly)
+    has_targets = n_targets > 0
+    np.testing.assert_allclose(
+        completeness[has_targets],
+        n_observed[has_targets] / n_targets[has_targets],
+    )
+    assert np.all(completeness[~has_targets] == 0)
+    np.testing.assert_allclose(dr14.weights.astype(float), completeness)
+
+
+def test_equal_area_regions():
+    rng = np.random.default_rng(4)
+    xyz = geometry.radec_to_xyz(
+        rng.uniform(0, 60, 5000), rng.uniform(0, 30, 5000)
+    )
+    areas = rng.random(5000) * (rng.random(5000) > 0.1)
+
+    labels = geometry.equal_area_regions(xyz, areas, 13)
+    assert np.all(labels[areas == 0] == -1)
+    assert np.all(labels[areas > 0] >= 0)
+    region_areas = np.bincount(labels[areas > 0], areas[areas > 0])
+    assert len(region_areas) == 13
+    np.testing.assert_allclose(region_areas, areas.sum() / 13, atol=1.0)
+
+    with pytest.raises(ValueError):
+        geometry.equal_area_regions(xyz[:3], areas[:3], 5)
+
+
+def test_jackknife_region():
+    dr14 = DR14("LRG_S")
+    regions = dr14.jackknife_regions(10)
+    assert dr14.jackknife_regions(10) is regions
+    assert set(regions[dr14.weights > 0]) == set(range(10))
+    assert np.all(regions[dr14.weights == 0] == -1)
+
+    ra, dec, region = dr14.sky_random(20_000, seed=6, jackknife=10)
+    np.testing.assert_array_equal(region, dr14.jackknife_region(ra, dec, 10))
+    np.testing.assert_array_equal(region, regions[dr14.polyid(ra, dec)])
+    counts = np.bincount(region)
+    assert counts.min() > 0.8 * counts.mean()
+    assert dr14.jackknife_region([0.0], [-80.0], 10)[0] == -1
+
+    out = [np.empty(100), np.empty(100), np.empty(100), np.empty(100, int)]
+    dr14.sky_random(100, seed=6, out=out, output="xyz", jackknife=10)
+    assert np.all(out[3] >= 0)
+
+    dr14.set_weights(1.0)
+    assert dr14.jackknife_regions(10) is not regions
+
+
+@pytest.mark.parametrize("method", ["sobol", "stratified"])
+def test_sky_random_method(method):
+    dr14 = DR14("LRG_S")
+    ra, dec = dr14.sky_random(1_000, seed=3, method=method)
+    ra2, dec2 = dr14.sky_random(1_000, seed=3, method=method)
+
+    assert len(ra) == len(dec) == 1_000
+    assert np.all(dr14.contains(ra, dec))
+    np.testing.assert_array_equal(ra, ra2)
+    np.testing.assert_array_equal(dec, dec2)
+
+
+def test_sky_random_stratified_counts():
+    dr14 = DR14("LRG_N")
+    size = 20_000
+    ra, dec = dr14.sky_random(size, seed=5, method="stratified")
+
+    counts = np.bincount(dr14.polyid(ra, dec), minlength=dr14.npoly)
+    weighted = np.asarray(dr14.mangle_.areas * dr14.weights, dtype=float)
+    expected = size * weighted / weighted.sum()
+    # only the few points replaced in overlapping polygons can move away
+    assert np.mean(np.abs(counts - expected) < 1) > 0.99
+
+
+def test_sky_random_stratified_chunks(monkeypatch):
+    monkeypatch.setattr(randomsdss.randomsdss, "CHUNK_SIZE", 500)
+    dr14 = DR14("LRG_N")
+    size = 200_000
+    dr14.sky_random(10, seed=1, method="stratified")  # build the indexes
+    out = np.empty((2, size))
+    tracemalloc.start()
+    try:
+        dr14.sky_random(size, seed=5, method="stratified", out=out)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    # well below a single array of size values
+    assert peak < 8 * size / 2
+
+    assert np.all(dr14.contains(*out))
+    # every chunk spans the footprint, so the first points do too
+    weighted = np.asarray(dr14.mangle_.areas * dr14.weights, dtype=float)
+    position = dr14._positions(dr14.polyid(*out[:, :500]))
+    cumulative = np.cumsum(weighted)
+    deciles = np.histogram(cumulative[position] / cumulative[-1], 10, (0, 1))
+    assert np.all(np.abs(deciles[0] - 50) <= 3)
+
+
+def test_sky_random_density():
+    dr14 = DR14("LRG_S")
+    nside, size = 8, 20_000
+    density = np.array([0.0, 1.0, 4.0])[np.arange(12 * nside**2) % 3]
+    ra, dec = dr14.sky_random(size, seed=1, density=density)
+    ra2, dec2 = dr14.sky_random(size, seed=1, density=density)
+
+    assert len(ra) == size
+    assert np.all(dr14.contains(ra, dec))
+    np.testing.assert_array_equal(ra, ra2)
+    np.testing.assert_array_equal(dec, dec2)
+
+    label = geometry.radec_to_healpix(nside, ra, dec) % 3
+    assert not np.any(label == 0)
+    uniform = dr14.sky_random(4 * size, seed=2, method="stratified")
+    n = np.bincount(geometry.radec_to_healpix(nside, *uniform) % 3)
+    expected = 4 * n[2] / (4 * n[2] + n[1])
+    assert abs(np.mean(label == 2) - expected) < 0.015
+
+
+def test_sky_random_density_invalid():
+    dr14 = DR14("LRG_S")
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, density=np.ones(100))
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, density=-np.ones(12))
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, density=np.zeros(12))
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, method="sobol", density=np.ones(12))
+
+
+def test_sky_random_invalid_method():
+    with pytest.raises(ValueError):
+        DR14("LRG_N").sky_random(10, method="halton")
+
+
+@pytest.mark.parametrize("method", ["uniform", "stratified"])
+def test_sky_random_float32_xyz(method):
+    dr14 = DR14("LRG_N")
+    x, y, z = dr14.sky_random(
+        500, seed=2, method=method, dtype=np.float32, output="xyz"
+    )
+    ra, dec = dr14.sky_random(500, seed=2, method=method)
+
+    assert x.dtype == np.float32
+    np.testing.assert_allclose(
+        np.stack([x, y, z], axis=1), geometry.radec_to_xyz(ra, dec), atol=1e-6
+    )
+
+
+def test_sky_random_out_memmap(tmp_path):
+    dr14 = DR14("LRG_N")
+    buffer = np.lib.format.open_memmap(
+        tmp_path / "randoms.npy", mode="w+", dtype=np.float32, shape=(2, 300)
+    )
+    ra, dec = dr14.sky_random(300, seed=4, out=buffer)
+    buffer.flush()
+
+    assert np.shares_memory(ra, buffer)
+    saved = np.load(tmp_path / "randoms.npy")
+    assert np.all(dr14.contains(saved[0], saved[1]))
+
+    # without seed pymangle fills the buffer in chunks
+    ra, dec = randomsdss.sky_random("DR14", "LRG_N", size=300, out=buffer)
+    assert np.all(dr14.contains(ra, dec))
+
+
+def test_sky_random_out_invalid():
+    dr14 = DR14("LRG_N")
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, out=(np.empty(10),))
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, out=(np.empty(9), np.empty(9)))
+    with pytest.raises(ValueError):
+        dr14.sky_random(10, seed=1, output="lonlat")
+
+
+def test_box_random_xyz():
+    dr14 = DR14("LRG_N")
+    x, y, z = dr14.box_random(180, 200, 30, 40, size=50, output="xyz")
+    ra, dec = geometry.xyz_to_radec(np.stack([x, y, z], axis=1))
+    assert np.all((ra >= 180) & (ra <= 200) & (dec >= 30) & (dec <= 40))
+    assert np.all(dr14.contains(ra, dec))
+
+
+def test_box_random_seed_wrap():
+    dr14 = DR14("LRG_S")
+    ra, dec = dr14.box_random(350, 10, -5, 5, size=2_000, seed=7)
+    expected = dr14.box_random(350, 10, -5, 5, size=2_000, seed=7)
+
+    np.testing.assert_array_equal(ra, expected[0])
+    assert np.all(((ra - 350) % 360 <= 20) & (dec >= -5) & (dec <= 5))
+    assert np.all(dr14.contains(ra, dec))
+    # both sides of RA 0 are sampled
+    assert np.any(ra > 350) and np.any(ra < 10)
+
+    ra, dec = dr14.box_random(350, 10, -5, 5, size=2_000)
+    assert np.all(((ra - 350) % 360 <= 20) & (dec >= -5) & (dec <= 5))
+
+
+def test_box_random_weights():
+    dr14 = DR14("LRG_S")
+    box = (10, 30, -20, 40)
+    size = 20_000
+    ra, dec = dr14.box_random(*box, size=size)
+    assert np.all((ra >= 10) & (ra <= 30) & (dec >= -20) & (dec <= 40))
+    assert np.any(dr14.weight(ra, dec) == 0)
+    unseeded = dr14.box_random(*box, size=size, weighted=True)
+    seeded = dr14.box_random(*box, size=size, seed=1)
+    for ra, dec in (unseeded, seeded):
+        assert np.all((ra >= 10) & (ra <= 30) & (dec >= -20) & (dec <= 40))
+        assert np.all(dr14.weight(ra, dec) > 0)
+    # both sample the same weighted footprint
+    for ra_min in (15, 20, 25):
+        assert np.mean(unseeded[0] > ra_min) == pytest.approx(
+            np.mean(seeded[0] > ra_min), abs=0.02
+        )
+    assert np.mean(unseeded[1] > 20) == pytest.approx(
+        np.mean(seeded[1] > 20), abs=0.02
+    )
+
+
+def test_box_random_no_footprint():
+    dr14 = DR14("LRG_N")
+    # polygons of the south galactic cap in LRG_N have zero weight
+    with pytest.raises(ValueError):
+        dr14.box_random(350, 10, -5, 5, size=10)
+    with pytest.raises(ValueError):
+        dr14.box_random(0, 360, 80, 90, size=10, seed=1)
+    with pytest.raises(ValueError):
+        dr14.box_random(180, 200, 40, 30, size=10)
+
+
+def test_polygons_in_box():
+    dr14 = DR14("LRG_S")
+    ra, dec = dr14.sky_random(20_000, seed=2)
+    pid = dr14.polyid(ra, dec)
+    for box in [(10, 30, -5, 5), (350, 10, -5, 5), (0, 360, 20, 90)]:
+        ra_min, ra_max, dec_min, dec_max = box
+        width = (ra_max - ra_min) % 360 or 360
+        in_box = ((ra - ra_min) % 360 <= width) & (dec >= dec_min)
+        in_box &= dec <= dec_max
+        assert np.all(np.isin(pid[in_box], dr14.polygons_in_box(*box)))
+
+
+def test_box_area():
+    dr14 = DR14("LRG_N")
+    np.testing.assert_allclose(dr14.box_area(0, 360, -90, 90), dr14.area)
+    assert dr14.box_area(0, 360, 80, 90) == 0
+
+    rng = np.random.default_rng(0)
+    size = 1_000_000
+    ra = rng.uniform(180, 200, size)
+    sin_dec = rng.uniform(np.sin(np.deg2rad(30)), np.sin(np.deg2rad(40)), size)
+    dec = np.rad2deg(np.arcsin(sin_dec))
+    box_area = 20 * np.rad2deg(sin_dec.max() - sin_dec.min())
+    expected = box_area * np.mean(dr14.contains(ra, dec))
+    np.testing.assert_allclose(
+        dr14.box_area(180, 200, 30, 40), expected, rtol=0.01
+    )
+
+
+def test_aperture_random():
+    dr14 = DR14("LRG_S")
+    ra_c, dec_c = dr14.sky_random(300, seed=1)
+    radius = np.linspace(0.1, 1.0, 300)
+    size = np.arange(300) % 7
+    ra, dec, center = dr14.aperture_random(
+        ra_c, dec_c, radius, size, seed=3, max_workers=1
+    )
+    np.testing.assert_array_equal(np.bincount(center, minlength=300), size)
+    assert np.all(np.diff(center) >= 0)
+    pid, weight = dr14.polyid_and_weight(ra, dec)
+    assert np.all(pid >= 0) and np.all(weight.astype(float) > 0)
+    cos = np.sum(
+        geometry.radec_to_xyz(ra, dec)
+        * geometry.radec_to_xyz(ra_c[center], dec_c[center]),
+        axis=1,
+    )
+    assert np.all(cos >= np.cos(np.deg2rad(radius[center])) - 1e-12)
+
+    # the blocks don't depend on the number of threads
+    threaded = dr14.aperture_random(
+        ra_c, dec_c, radius, size, seed=3, max_workers=4
+    )
+    for expected, column in zip((ra, dec, center), threaded):
+        np.testing.assert_array_equal(column, expected)
+
+    # uniform in the area of the caps, and none outside the footprint
+    x, y, z, center = dr14.aperture_random(
+        np.append(ra_c[:20], 0.0),
+        np.append(dec_c[:20], 89.0),
+        0.3,
+        1_000,
+        seed=4,
+        output="xyz",
+    )
+    np.testing.assert_array_equal(
+        np.bincount(center, minlength=21), [1_000] * 20 + [0]
+    )
+    cos = np.sum(
+        np.column_stack([x, y, z])
+        * geometry.radec_to_xyz(ra_c[center], dec_c[center]),
+        axis=1,
+    )
+    fraction = (1 - cos) / (1 - np.cos(np.deg2rad(0.3)))
+    assert np.mean(fraction < 0.5) == pytest.approx(0.5, abs=0.03)
+
+    with pytest.raises(ValueError):
+        dr14.aperture_random(ra_c, dec_c[:10], 1.0, 10)
+    with pytest.raises(ValueError):
+        dr14.aperture_random(ra_c, dec_c, 0.0, 10)
+    with pytest.raises(ValueError):
+        dr14.aperture_random(ra_c, dec_c, 1.0, -1)
+    with pytest.raises(ValueError):
+        dr14.aperture_random(ra_c, dec_c, 1.0, 1.5)
+
+
 def test_z_random():
     rng = np.random.default_rng(seed=42)
     z_dist = rng.normal(0.5, 0.1, size=5_000)
@@ -177,6 +1004,614 @@ def test_z_random():
     assert np.all(z_rand > 0.4)
 
 
+def test_z_random_out():
+    z_dist = np.random.default_rng(seed=42).normal(0.5, 0.1, size=1_000)
+    expected = randomsdss.z_random(z_dist, size=200, seed=1)
+
+    out = np.zeros(200, dtype=np.float32)
+    z_rand = randomsdss.z_random(z_dist, size=200, seed=1, out=out)
+    assert z_rand is out
+    np.testing.assert_allclose(out, expected, rtol=1e-6)
+
+    z_rand = randomsdss.z_random(z_dist, size=200, dtype=np.float32)
+    assert z_rand.dtype == np.float32
+
+    with pytest.raises(ValueError):
+        randomsdss.z_random(z_dist, size=200, out=np.zeros(100))
+
+
+def test_z_random_shuffle():
+    rng = np.random.default_rng(seed=42)
+    z_dist = rng.normal(0.5, 0.1, size=1_000)
+    weights = np.where(z_dist > 0.5, 2.0, 0.0)
+
+    z_rand = randomsdss.z_random(
+        z_dist, size=50_000, weights=weights, seed=1, method="shuffle"
+    )
+    assert np.all(np.isin(z_rand, z_dist[z_dist > 0.5]))
+    np.testing.assert_array_equal(
+        z_rand,
+        randomsdss.z_random(
+            z_dist, size=50_000, weights=weights, seed=1, method="shuffle"
+        ),
+    )
+
+    z_rand = randomsdss.z_random(z_dist, size=100_000, method="shuffle")
+    assert z_rand.mean() == pytest.approx(z_dist.mean(), abs=2e-3)
+
+
+def test_z_random_histogram():
+    rng = np.random.default_rng(seed=42)
+    z_dist = rng.uniform(0.2, 0.6, size=2_000)
+    weights = np.where(z_dist < 0.4, 3.0, 1.0)
+
+    z_rand = randomsdss.z_random(
+        z_dist,
+        size=100_000,
+        weights=weights,
+        seed=2,
+        method="histogram",
+        bins=np.linspace(0.2, 0.6, 5),
+    )
+    assert z_rand.min() >= 0.2 and z_rand.max() <= 0.6
+    assert np.mean(z_rand < 0.4) == pytest.approx(0.75, abs=0.02)
+    assert not np.any(np.isin(z_rand, z_dist))
+
+    with pytest.raises(ValueError):
+        randomsdss.z_random(z_dist, size=10, method="spline")
+
+
+def test_z_random_regions():
+    rng = np.random.default_rng(seed=42)
+    z_dist = rng.uniform(0.2, 0.6, size=2_000)
+    z_region = np.where(z_dist < 0.4, 7, 3)
+    region = rng.choice([3, 7], size=10_000)
+
+    for method in ("shuffle", "histogram"):
+        z_rand = randomsdss.z_random(
+            z_dist,
+            size=10_000,
+            seed=3,
+            method=method,
+            bins=np.linspace(0.2, 0.6, 9),
+            z_region=z_region,
+            region=region,
+        )
+        np.testing.assert_array_equal(z_rand < 0.4, region == 7)
+
+    with pytest.raises(ValueError, match="No redshifts"):
+        randomsdss.z_random(
+            z_dist,
+            size=3,
+            method="shuffle",
+            z_region=z_region,
+            region=[3, 5, 7],
+        )
+    with pytest.raises(ValueError):
+        randomsdss.z_random(z_dist, size=3, z_region=z_region, region=[3] * 3)
+
+
+def test_joint_random():
+    rng = np.random.default_rng(seed=42)
+    z = rng.uniform(0.2, 0.6, size=20_000)
+    mass = 10 + 2 * z + rng.normal(0, 0.1, size=20_000)
+    weights = np.where(z < 0.4, 3.0, 1.0)
+
+    bins = (np.linspace(0.2, 0.6, 21), 40)
+    z_rand, mass_rand = randomsdss.joint_random(
+        (z, mass), size=100_000, weights=weights, bins=bins, seed=5
+    )
+    assert z_rand.min() >= 0.2 and z_rand.max() <= 0.6
+    assert mass_rand.min() >= mass.min() and mass_rand.max() <= mass.max()
+    assert np.mean(z_rand < 0.4) == pytest.approx(0.75, abs=0.01)
+    cov = np.cov(z, mass, aweights=weights)
+    assert np.corrcoef(z_rand, mass_rand)[0, 1] == pytest.approx(
+        cov[0, 1] / np.sqrt(cov[0, 0] * cov[1, 1]), abs=0.02
+    )
+
+    out = (np.zeros(100_000, np.float32), np.zeros(100_000, np.float32))
+    result = randomsdss.joint_random(
+        (z, mass), size=100_000, weights=weights, bins=bins, seed=5, out=out
+    )
+    assert result[0] is out[0]
+    np.testing.assert_allclose(out[1], mass_rand, rtol=1e-6)
+
+    with pytest.raises(ValueError):
+        randomsdss.joint_random((z, mass), size=10, out=(np.zeros(10),))
+    with pytest.raises(ValueError):
+        randomsdss.joint_random((z, mass), size=10, weights=np.zeros(20_000))
+
+
+def test_comoving_distance():
+    from scipy.integrate import quad
+
+    z = np.array([0.0, 0.05, 0.5, 1.0, 3.0, cosmology.Z_MAX])
+    expected = [
+        cosmology.SPEED_OF_LIGHT
+        / 67.0
+        * quad(lambda x: (0.31 * (1 + x) ** 3 + 0.69) ** -0.5, 0, zi)[0]
+        for zi in z
+    ]
+    distance = cosmology.comoving_distance(z, H0=67.0, Om0=0.31)
+    np.testing.assert_allclose(distance, expected, rtol=1e-9, atol=1e-6)
+    assert cosmology.distance_table(67.0, 0.31) is cosmology.distance_table(
+        67, 0.31
+    )
+    out = np.empty((2, 3), dtype=np.float32)
+    cosmology.comoving_distance(np.full((2, 3), 0.5), out=out)
+    np.testing.assert_allclose(out, cosmology.comoving_distance(0.5))
+    with pytest.raises(ValueError):
+        cosmology.comoving_distance([0.5, -0.1])
+    with pytest.raises(ValueError):
+        cosmology.comoving_distance([cosmology.Z_MAX + 0.1])
+    with pytest.raises(ValueError):
+        cosmology.distance_table(70.0, 1.5)
+
+
+def test_cartesian_random():
+    dr14 = DR14(catalog="LRG_N")
+    z = np.random.default_rng(0).normal(0.5, 0.05, 1_000)
+    x, y, z_cart, redshift = dr14.cartesian_random(2_000, z, seed=7)
+    distance = cosmology.comoving_distance(redshift)
+    np.testing.assert_allclose(np.sqrt(x**2 + y**2 + z_cart**2), distance)
+    xyz = np.column_stack([x, y, z_cart]) / distance[:, None]
+    assert np.all(dr14.contains(*geometry.xyz_to_radec(xyz)))
+    assert redshift.min() >= z.min() and redshift.max() <= z.max()
+
+    again = dr14.cartesian_random(2_000, z, seed=7)
+    for col, other in zip((x, y, z_cart, redshift), again):
+        np.testing.assert_array_equal(col, other)
+
+    out = tuple(np.empty(2_000, dtype=np.float32) for _ in range(4))
+    result = dr14.cartesian_random(
+        2_000, z, seed=7, z_method="shuffle", H0=100.0, out=out
+    )
+    assert all(a is b for a, b in zip(result, out))
+    assert np.all(np.isin(out[3], z.astype(np.float32)))
+    np.testing.assert_allclose(
+        np.sqrt(sum(col.astype(float) ** 2 for col in out[:3])),
+        cosmology.comoving_distance(out[3], H0=100.0),
+        rtol=1e-5,
+    )
+
+    with pytest.raises(ValueError):
+        dr14.cartesian_random(10, z, z_method="kde")
+    with pytest.raises(ValueError):
+        dr14.cartesian_random(10, z, out=out)
+
+
+# ============================================================================
+# TEST GEOMETRY
+# ============================================================================
+
+
+def test_radec_xyz_roundtrip():
+    ra = np.array([0.0, 45.0, 359.5, 180.0])
+    dec = np.array([0.0, -30.0, 89.0, -89.9])
+    xyz = geometry.radec_to_xyz(ra, dec)
+    np.testing.assert_allclose(np.linalg.norm(xyz, axis=1), 1.0)
+    np.testing.assert_allclose(geometry.xyz_to_radec(xyz), (ra, dec))
+
+
+def test_healpix():
+    for nside in (1, 4, 32):
+        pixels = np.arange(12 * nside**2)
+        ra, dec = geometry.healpix_to_radec(nside, pixels)
+        np.testing.assert_array_equal(
+            geometry.radec_to_healpix(nside, ra, dec), pixels
+        )
+    ra, dec = geometry.healpix_to_radec(1, np.arange(12))
+    np.testing.assert_allclose(ra[:8], [45, 135, 225, 315, 0, 90, 180, 270])
+    np.testing.assert_allclose(ra[8:], ra[:4])
+    np.testing.assert_allclose(
+        dec, np.repeat([1, 0, -1], 4) * np.rad2deg(np.arcsin(2 / 3))
+    )
+
+    # nested: the pixel of a point at 2 nside is a child of its pixel
+    rng = np.random.default_rng(8)
+    ra = rng.uniform(0, 360, 100_000)
+    dec = np.rad2deg(np.arcsin(rng.uniform(-1, 1, 100_000)))
+    pixels = geometry.radec_to_healpix(16, ra, dec)
+    children = geometry.radec_to_healpix(32, ra, dec)
+    np.testing.assert_array_equal(children // 4, pixels)
+    # equal areas: uniform points fill the pixels within Poisson noise
+    counts = np.bincount(pixels, minlength=12 * 16**2)
+    assert abs(counts.std() / np.sqrt(counts.mean()) - 1) < 0.1
+
+    with pytest.raises(ValueError):
+        geometry.healpix_to_radec(3, [0])
+    with pytest.raises(ValueError):
+        geometry.radec_to_healpix(0, [0.0], [0.0])
+
+
+def test_read_ply():
+    dr14 = DR14("LRG_N")
+    polygons = dr14.polygons_
+    assert polygons.npoly == dr14.npoly
+    assert polygons.caps.shape == (polygons.ncaps.sum(), 4)
+    np.testing.assert_allclose(polygons.weights, dr14.weights)
+    np.testing.assert_allclose(
+        polygons.areas * np.rad2deg(1) ** 2, dr14.mangle_.areas
+    )
+
+
+def test_read_ply_invalid(tmp_path):
+    path = tmp_path / "bad.ply"
+    path.write_text("1 polygons\npolygon 0 ( 2 caps, 1 weight):\n")
+    with pytest.raises(ValueError):
+        geometry.read_ply(path)
+
+
+def test_bounding_caps():
+    dr14 = DR14("LRG_S")
+    center, radius = dr14.polygons_.bounding_caps
+    ra, dec = dr14.sky_random(5_000)
+    pid = dr14.polyid(ra, dec)
+
+    cos_dist = np.sum(geometry.radec_to_xyz(ra, dec) * center[pid], axis=1)
+    assert np.all(cos_dist >= np.cos(radius[pid]))
+    # caps are tight: much smaller than the whole footprint
+    assert np.median(radius) < np.deg2rad(1)
+
+
+def test_bounding_caps_parallel_edges():
+    # polygon with two nearly parallel edges, whose vertices lose precision
+    polygons = DR14("LRG_N").polygons_
+    start, stop = polygons.offsets[8402], polygons.offsets[8403]
+    caps = polygons.caps[start:stop]
+    vertices = geometry._circle_intersections(caps[None])[0]
+    distance = vertices[2:4] @ caps[[0, 2], :3].T - 1 + np.abs(caps[[0, 2], 3])
+    assert np.all(np.abs(distance) < 1e-15)
+
+    center, radius = polygons.bounding_caps
+    rng = np.random.default_rng(0)
+    xyz = geometry.sample_caps(
+        np.repeat(center[[8402]], 10_000, axis=0),
+        np.full(10_000, 2 * radius[8402]),
+        rng,
+    )
+    xyz = xyz[polygons.contains_in(xyz, np.full(len(xyz), 8402))]
+    assert len(xyz) and np.all(xyz @ center[8402] >= np.cos(radius[8402]))
+
+
+def test_polygons_sample():
+    polygons = DR14("LRG_S").polygons_
+    rng = np.random.default_rng(0)
+    index = rng.integers(0, polygons.npoly, 2_000)
+    xyz = polygons.sample(index, rng)
+
+    assert np.all(polygons.contains_in(xyz, index))
+    np.testing.assert_allclose(np.linalg.norm(xyz, axis=1), 1.0)
+
+
+def test_caps_area():
+    caps = np.array(
+        [
+            [[0.0, 0.0, 1.0, 0.5], geometry._FULL_CAP],
+            [[0.0, 0.0, 1.0, -0.5], geometry._FULL_CAP],
+            [[0.0, 0.0, 1.0, 1.0], [1.0, 0.0, 0.0, 1.0]],
+            [[0.0, 0.0, 1.0, 1.0], [0.0, 0.0, -1.0, 1.0]],
+        ]
+    )
+    expected = [np.pi, 3 * np.pi, np.pi, 0.0]
+    np.testing.assert_allclose(geometry.caps_area(caps), expected, atol=1e-12)
+
+    polygons = DR14("LRG_S").polygons_
+    area = geometry.caps_area(polygons.padded_caps[:500])
+    np.testing.assert_allclose(
+        area, polygons.areas[:500], rtol=1e-5, atol=1e-11
+    )
+
+
+def test_radec_ranges():
+    polygons = DR14("LRG_S").polygons_
+    rng = np.random.default_rng(0)
+    index = rng.integers(0, polygons.npoly, 20_000)
+    ra, dec = geometry.xyz_to_radec(polygons.sample(index, rng))
+
+    ra_min, ra_width, dec_min, dec_max = polygons.radec_ranges
+    assert np.all((ra - ra_min[index]) % 360 <= ra_width[index])
+    assert np.all((dec >= dec_min[index]) & (dec <= dec_max[index]))
+
+
+def test_box_caps():
+    ra = np.array([355.0, 5.0, 100.0, 5.0])
+    dec = np.array([0.0, 0.0, 0.0, 20.0])
+    pieces = geometry.box_caps(350, 10, -5, 5)
+    xyz = geometry.radec_to_xyz(ra, dec)
+    inside = np.any(
+        [geometry._in_caps(xyz[:, None], caps).all(axis=1) for caps in pieces],
+        axis=0,
+    )
+    np.testing.assert_array_equal(inside, [True, True, False, False])
+
+    area = geometry.caps_area(geometry.box_caps(0, 270, 0, 90))
+    np.testing.assert_allclose(area.sum(), 1.5 * np.pi)
+    with pytest.raises(ValueError):
+        geometry.box_caps(0, 400, 0, 10)
+
+
+def test_polygon_edges():
+    caps = geometry.box_caps(10, 20, -5, 5)[0]
+    box = geometry.Polygons(
+        caps, np.array([0, 4]), [0], [1.0], [0], geometry.caps_area([caps])
+    )
+    arcs = geometry.polygon_edges(box)
+    assert len(arcs) == 4
+
+    ra = np.array([15.0, 12.0, 25.0, 25.0])
+    dec = np.array([0.0, 1.0, 0.0, 10.0])
+    xyz = geometry.radec_to_xyz(ra, dec)
+    corner = geometry.radec_to_xyz(20.0, 5.0)
+    expected = np.rad2deg(
+        [
+            np.deg2rad(5.0),
+            np.arcsin(np.cos(np.deg2rad(1)) * np.sin(np.deg2rad(2))),
+            np.deg2rad(5.0),
+            np.arccos(xyz[3] @ corner),
+        ]
+    )
+    for edges in (arcs, arcs.split(np.deg2rad(0.5))):
+        index = np.tile(np.arange(len(edges)), len(ra))
+        angle = edges.distance(np.repeat(xyz, len(edges), axis=0), index)
+        distance = np.rad2deg(angle.reshape(len(ra), -1).min(axis=1))
+        np.testing.assert_allclose(distance, expected, atol=1e-10)
+
+    pieces = arcs.split(np.deg2rad(0.5))
+    length = np.sin(pieces.radius) * (pieces.stop - pieces.start)
+    assert np.all(length <= np.deg2rad(0.5) + 1e-12)
+    perimeter = np.deg2rad(20 + 20 * np.cos(np.deg2rad(5)))
+    np.testing.assert_allclose(length.sum(), perimeter)
+    np.testing.assert_allclose(
+        np.einsum("ij,ij->i", pieces.middle(), pieces.pole),
+        np.cos(pieces.radius),
+        atol=1e-12,
+    )
+
+
+def test_write_ply(tmp_path):
+    path = store.ply_file("DR14", "LRG_S")
+    polygons = geometry.read_ply(path)
+    geometry.write_ply(polygons, tmp_path / "copy.ply")
+    copy = geometry.read_ply(tmp_path / "copy.ply")
+
+    assert copy.header == polygons.header
+    for name in ("caps", "offsets", "ids", "weights", "pixels", "areas"):
+        np.testing.assert_array_equal(
+            getattr(copy, name), getattr(polygons, name)
+        )
+    assert Mangle(str(tmp_path / "copy.ply")).area == Mangle(str(path)).area
+
+
+def test_simplify_drop_zero_weight(tmp_path):
+    path = store.ply_file("DR14", "LRG_S")
+    polygons = geometry.read_ply(path)
+    simplified = geometry.simplify(polygons, drop_zero_weight=True)
+    geometry.write_ply(simplified, tmp_path / "simple.ply")
+
+    # zero weight polygons are kept only if they may hide a later one
+    assert simplified.npoly < polygons.npoly / 2
+
+    original, simple = Mangle(str(path)), Mangle(str(tmp_path / "simple.ply"))
+    ra, dec = original.genrand(100_000)
+    np.testing.assert_array_equal(
+        simple.weight(ra, dec), original.weight(ra, dec)
+    )
+    contains = simple.contains(ra, dec)
+    assert np.all(contains[original.weight(ra, dec) > 0])
+    assert not np.any(contains[~original.contains(ra, dec)])
+
+
+# ============================================================================
+# TEST PAIRS
+# ============================================================================
+
+
+def _naive_pairs(a, b, bins, wa, wb, auto):
+    theta = np.degrees(np.arccos(np.clip(a @ b.T, -1, 1)))
+    weights = np.outer(wa, wb)
+    if auto:
+        upper = np.triu(np.ones(theta.shape, dtype=bool), 1)
+        theta, weights = theta[upper], weights[upper]
+    return np.histogram(theta.ravel(), bins, weights=weights.ravel())[0]
+
+
+def test_count_pairs():
+    dr14 = DR14(catalog="LRG_N")
+    ra, dec = dr14.sky_random(600, seed=1)
+    other_ra, other_dec = dr14.sky_random(250, seed=2)
+    xyz = geometry.radec_to_xyz(ra, dec)
+    other = geometry.radec_to_xyz(other_ra, other_dec)
+    weights = np.random.default_rng(3).uniform(0.5, 1.5, 600)
+    ones = np.ones(600)
+    bins = np.logspace(-1, 1.5, 9)
+
+    expected = _naive_pairs(xyz, xyz, bins, ones, ones, True)
+    for block_size in (None, 70, 600):
+        counts = pairs.count_pairs(xyz, bins, block_size=block_size)
+        assert counts.dtype == np.int64
+        np.testing.assert_array_equal(counts, expected)
+    counts = pairs.count_pairs(list(xyz.T), bins, block_size=70)
+    np.testing.assert_array_equal(counts, expected)
+
+    counts = pairs.count_pairs(xyz, bins, weights=weights, block_size=70)
+    np.testing.assert_allclose(
+        counts, _naive_pairs(xyz, xyz, bins, weights, weights, True)
+    )
+
+    counts = pairs.count_pairs(xyz, bins, others=other, block_size=70)
+    np.testing.assert_array_equal(
+        counts, _naive_pairs(xyz, other, bins, ones, np.ones(250), False)
+    )
+    counts = pairs.count_pairs(
+        xyz,
+        bins,
+        others=other,
+        weights=weights,
+        other_weights=np.full(250, 2.0),
+        max_workers=2,
+    )
+    np.testing.assert_allclose(
+        counts,
+        _naive_pairs(xyz, other, bins, weights, np.full(250, 2.0), False),
+    )
+
+
+def test_count_pairs_errors():
+    xyz = geometry.radec_to_xyz(np.array([0.0, 1.0]), np.array([0.0, 1.0]))
+    with pytest.raises(ValueError):
+        pairs.count_pairs(xyz, [1.0])
+    with pytest.raises(ValueError):
+        pairs.count_pairs(xyz, [2.0, 1.0])
+    with pytest.raises(ValueError):
+        pairs.count_pairs(xyz, [0.0, 200.0])
+    with pytest.raises(ValueError):
+        pairs.count_pairs(xyz[:, :2], [0.0, 2.0])
+    with pytest.raises(ValueError):
+        pairs.count_pairs(xyz, [0.0, 2.0], others=xyz, weights=np.ones(2))
+
+
+# ============================================================================
+# TEST ASYNC
+# ============================================================================
+
+
+def test_acreate():
+    dr = asyncio.run(DR14.acreate("LRG_N"))
+    assert dr.npoly == DR14("LRG_N").npoly
+
+    ra, dec = asyncio.run(dr.abox_random(180, 200, 30, 40, size=10))
+    assert np.all((ra >= 180) & (ra <= 200) & (dec >= 30) & (dec <= 40))
+
+
+def test_acontains():
+    dr14 = DR14("LRG_N")
+    rng = np.random.default_rng(3)
+    ra, dec = 360 * rng.random(100_000), 90 * rng.random(100_000)
+
+    async def main():
+        return await asyncio.gather(
+            dr14.acontains(ra, dec), dr14.apolyid_and_weight(ra, dec)
+        )
+
+    contains, (polyid, weight) = asyncio.run(main())
+
+    np.testing.assert_array_equal(contains, dr14.contains(ra, dec))
+    np.testing.assert_array_equal(polyid, dr14.polyid(ra, dec))
+    np.testing.assert_array_equal(weight, dr14.weight(ra, dec))
+
+
+def test_asky_random_seed():
+    dr14 = DR14("LRG_N")
+    ra, dec = asyncio.run(dr14.asky_random(1000, seed=42))
+    expected = dr14.sky_random(1000, seed=42)
+
+    np.testing.assert_array_equal(ra, expected[0])
+    np.testing.assert_array_equal(dec, expected[1])
+
+
+def test_asky_random_small_not_blocked():
+    dr14 = DR14("LRG_S")
+
+    async def main():
+        large = asyncio.create_task(dr14.asky_random(10**8, seed=0))
+        queued = asyncio.create_task(dr14.asky_random(10**8, seed=1))
+        small = await asyncio.gather(
+            *(dr14.asky_random(100, seed=i) for i in range(5)),
+            dr14.acontains(np.zeros(10), np.zeros(10)),
+        )
+        # the second large job waits for the heavy slot of the first one
+        done = large.done(), queued.done()
+        large.cancel()
+        queued.cancel()
+        await asyncio.gather(large, queued, return_exceptions=True)
+        return small, done
+
+    small, done = asyncio.run(main())
+
+    assert done == (False, False)
+    assert all(len(ra) == 100 for ra, _ in small[:-1])
+
+
+def test_asky_random_cancel():
+    dr14 = DR14("LRG_S")
+
+    async def main():
+        task = asyncio.create_task(dr14.asky_random(10**8, seed=0))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # the thread was released, so the pool can run a new job
+        return await dr14.asky_random(10)
+
+    ra, dec = asyncio.run(main())
+    assert len(ra) == 10
+
+
+# ============================================================================
+# TEST SIMPLIFIED FOOTPRINTS
+# ============================================================================
+
+
+def test_DR_simplified(tmp_path, monkeypatch):
+    monkeypatch.setattr(randomsdss.data, "CACHE_PATH", tmp_path)
+    dr14 = DR14("LRG_N")
+    simple = DR14("LRG_N", simplified=True)
+
+    assert randomsdss.simplified_path("DR14", "LRG_N").exists()
+    assert simple.npoly < dr14.npoly
+    assert simple.area == pytest.approx(dr14.area)
+
+    rng = np.random.default_rng(5)
+    ra, dec = dr14.sky_random(100_000)
+    ra = np.concatenate([ra, rng.uniform(0, 360, 100_000)])
+    dec = np.concatenate([dec, rng.uniform(-90, 90, 100_000)])
+    np.testing.assert_array_equal(
+        simple.contains(ra, dec), dr14.contains(ra, dec)
+    )
+    np.testing.assert_array_equal(simple.weight(ra, dec), dr14.weight(ra, dec))
+
+
+# ============================================================================
+# TEST FOOTPRINT SETS
+# ============================================================================
+
+
+def test_footprint_set_membership():
+    lrg_n, lrg_s = DR14("LRG_N"), DR14("LRG_S")
+    footprints = randomsdss.FootprintSet([lrg_n, lrg_s])
+    rng = np.random.default_rng(0)
+    ra, dec = lrg_n.sky_random(20_000, seed=1)
+    ra = np.concatenate([ra, rng.uniform(0, 360, 20_000)])
+    dec = np.concatenate(
+        [dec, np.rad2deg(np.arcsin(rng.uniform(-1, 1, 20_000)))]
+    )
+
+    member, polyid = footprints.membership(ra, dec, polyid=True, max_workers=2)
+    assert member.shape == polyid.shape == (40_000, 2)
+    for i, footprint in enumerate(footprints.footprints):
+        np.testing.assert_array_equal(
+            member[:, i], footprint.contains(ra, dec)
+        )
+        np.testing.assert_array_equal(polyid[:, i], footprint.polyid(ra, dec))
+
+    bitmask = footprints.membership(ra, dec, bitmask=True)
+    assert bitmask.dtype == np.uint8
+    np.testing.assert_array_equal(bitmask, member[:, 0] + 2 * member[:, 1])
+    assert footprints.names == ["DR14/LRG_N", "DR14/LRG_S"]
+
+
+def test_footprint_set_membership_invalid():
+    footprints = randomsdss.FootprintSet([DR14("LRG_N")])
+    with pytest.raises(ValueError):
+        footprints.membership([10.0, 20.0], [0.0])
+    with pytest.raises(ValueError):
+        randomsdss.FootprintSet(footprints.footprints * 65).membership(
+            [10.0], [0.0], bitmask=True
+        )
+
+
 # ============================================================================
 # TEST WRAP OF PYMANGLE
 # ============================================================================
@@ -264,3 +1699,382 @@ def test_DR_set_weights_array():
 
         expected = w.reshape((1, -1))
         np.testing.assert_array_equal(expected, method.call_args[0])
+
+
+# ============================================================================
+# TEST MASKING
+# ============================================================================
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    rng = np.random.default_rng(8)
+    table = np.zeros(
+        1_000, dtype=[("RA", ">f8"), ("DEC", "f4"), ("id", "i8")]
+    )
+    table["RA"] = rng.uniform(100, 280, len(table))
+    table["DEC"] = rng.uniform(-10, 70, len(table))
+    table["id"] = np.arange(len(table))
+    path = tmp_path / "catalog.npy"
+    np.save(path, table)
+    return path, table
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_mask_catalog(catalog, tmp_path, n_jobs):
+    path, table = catalog
+    output = tmp_path / "masked.npy"
+    footprints = [DR14("LRG_N"), ("DR14", "LRG_S")]
+    report = masking.mask_catalog(
+        path, output, footprints, "RA", "DEC", chunk_size=300, n_jobs=n_jobs
+    )
+    assert report["rows"] == len(table)
+    assert report["rows_per_second"] > 0
+
+    masked = np.load(output)
+    np.testing.assert_array_equal(masked["id"], table["id"])
+    np.testing.assert_array_equal(masked["RA"], table["RA"])
+    for name in ("LRG_N", "LRG_S"):
+        pid, weight = DR14(name).polyid_and_weight(table["RA"], table["DEC"])
+        prefix = f"DR14_{name}_"
+        np.testing.assert_array_equal(masked[prefix + "polyid"], pid)
+        np.testing.assert_array_equal(masked[prefix + "contains"], pid >= 0)
+        np.testing.assert_array_equal(
+            masked[prefix + "weight"], weight.astype(float)
+        )
+    assert masked["DR14_LRG_N_contains"].any()
+    assert not any(p.name.endswith(".tmp") for p in tmp_path.iterdir())
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_mask_catalog_custom_weights(catalog, tmp_path, n_jobs):
+    path, table = catalog
+    footprint = DR14("LRG_N")
+    pid = footprint.polyid(table["RA"], table["DEC"])
+    inside = np.unique(pid[pid >= 0])
+    footprint.set_weights(0.5)
+    footprint.set_weights(0.0, polyids=inside[::2])
+    output = tmp_path / "masked.npy"
+    masking.mask_catalog(
+        path,
+        output,
+        [footprint],
+        "RA",
+        "DEC",
+        columns=["weight"],
+        chunk_size=300,
+        n_jobs=n_jobs,
+    )
+
+    masked = np.load(output)["DR14_LRG_N_weight"]
+    expected = footprint.weight(table["RA"], table["DEC"]).astype(float)
+    np.testing.assert_array_equal(masked, expected)
+    assert set(np.unique(masked[pid >= 0])) == {0.0, 0.5}
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_mask_catalog_polygon_file(catalog, tmp_path, monkeypatch, n_jobs):
+    path, table = catalog
+    plain = store.ply_file("DR14", "LRG_N")
+    copy = tmp_path / "copy.ply"
+    copy.write_bytes(plain.read_bytes())
+    footprint = DR14("LRG_N", ply_path=copy)
+    assert footprint.mangle_.filename == str(copy)
+
+    # the workers load the caller's file, not the default one
+    def missing(dr, catalog):
+        raise randomsdss.randomsdss.PolygonNotFoundError(f"{dr}/{catalog}")
+
+    monkeypatch.setattr(randomsdss.randomsdss, "get_polygon", missing)
+    output = tmp_path / "masked.npy"
+    masking.mask_catalog(
+        path, output, [footprint], "RA", "DEC", ["polyid"], n_jobs=n_jobs
+    )
+    np.testing.assert_array_equal(
+        np.load(output)["DR14_LRG_N_polyid"],
+        footprint.polyid(table["RA"], table["DEC"]),
+    )
+
+
+def test_mask_catalog_errors(catalog, tmp_path):
+    path, _ = catalog
+    output = tmp_path / "masked.npy"
+    footprints = [("DR14", "LRG_N")]
+    with pytest.raises(ValueError):
+        masking.mask_catalog(path, output, footprints)  # no "ra" column
+    with pytest.raises(ValueError):
+        masking.mask_catalog(path, tmp_path / "masked.csv", footprints)
+    with pytest.raises(ValueError):
+        masking.mask_catalog(
+            path, output, footprints, "RA", "DEC", columns=["area"]
+        )
+    assert not output.exists()
+
+    masking.mask_catalog(path, output, footprints, "RA", "DEC")
+    with pytest.raises(FileExistsError):
+        masking.mask_catalog(path, output, footprints, "RA", "DEC")
+    with pytest.raises(ValueError):  # the columns are already there
+        masking.mask_catalog(
+            output, tmp_path / "twice.npy", footprints, "RA", "DEC"
+        )
+
+
+# ============================================================================
+# TEST COMMAND LINE
+# ============================================================================
+
+
+def test_shard_sizes():
+    assert cli.shard_sizes(10, 3) == [4, 3, 3]
+    assert sum(cli.shard_sizes(1_001, 7)) == 1_001
+
+
+def test_cli_mask(catalog, tmp_path, capsys):
+    path, table = catalog
+    output = tmp_path / "masked.npy"
+    argv = ["mask", str(path), str(output), "--footprint", "DR14/LRG_N"]
+    argv += ["--ra", "RA", "--dec", "DEC", "--columns", "weight"]
+
+    assert cli.main(argv) == 0
+    assert "1000 rows" in capsys.readouterr().out
+    masked = np.load(output)
+    assert masked.dtype.names == ("RA", "DEC", "id", "DR14_LRG_N_weight")
+
+    with pytest.raises(SystemExit):
+        cli.main(argv)
+
+
+def test_cli_generate(tmp_path):
+    z_file = tmp_path / "z.npy"
+    np.save(z_file, np.random.default_rng(42).normal(0.5, 0.1, size=500))
+    out = tmp_path / "run"
+    argv = ["generate", str(out), "--dr", "DR14", "--catalog", "LRG_S"]
+    argv += ["--size", "100", "--shards", "3", "--seed", "7"]
+    argv += ["--z-file", str(z_file)]
+
+    assert cli.main(argv) == 0
+
+    with open(out / cli.MANIFEST_NAME) as fp:
+        manifest = json.load(fp)
+    assert manifest["seed"] == 7
+    assert [s["size"] for s in manifest["shards"]] == [34, 33, 33]
+
+    shard = np.load(out / "shard-00001.npz")
+    assert len(shard["ra"]) == len(shard["z"]) == 33
+    assert np.all(DR14("LRG_S").contains(shard["ra"], shard["dec"]))
+
+    with pytest.raises(SystemExit):
+        cli.main(argv)
+
+
+def test_cli_generate_resume(tmp_path):
+    kwargs = dict(dr="DR14", catalog="LRG_N", size=60, n_shards=3, seed=1)
+    cli.generate_shards(tmp_path, **kwargs)
+    expected = np.load(tmp_path / "shard-00002.npz")["ra"]
+    first = (tmp_path / "shard-00000.npz").stat().st_mtime_ns
+
+    (tmp_path / "shard-00002.npz").unlink()
+    cli.generate_shards(tmp_path, resume=True, n_jobs=2, **kwargs)
+
+    np.testing.assert_array_equal(
+        expected, np.load(tmp_path / "shard-00002.npz")["ra"]
+    )
+    assert (tmp_path / "shard-00000.npz").stat().st_mtime_ns == first
+
+    with pytest.raises(ValueError):
+        cli.generate_shards(tmp_path, resume=True, **dict(kwargs, size=61))
+
+
+def test_cli_generate_resume_z(tmp_path):
+    z = np.random.default_rng(3).normal(0.5, 0.1, size=200)
+    kwargs = dict(dr="DR14", catalog="LRG_N", size=60, n_shards=3, seed=1)
+    manifest = cli.generate_shards(tmp_path, z=z, z_method="shuffle", **kwargs)
+    assert manifest["z_sha256"] == cli.z_checksum(z)
+    expected = np.load(tmp_path / "shard-00001.npz")["z"]
+    assert np.all(np.isin(expected, z))
+
+    # a run of another version of the package can be resumed
+    with open(tmp_path / cli.MANIFEST_NAME) as fp:
+        previous = json.load(fp)
+    with open(tmp_path / cli.MANIFEST_NAME, "w") as fp:
+        json.dump(dict(previous, version="0.0.1"), fp)
+    (tmp_path / "shard-00001.npz").unlink()
+    cli.generate_shards(
+        tmp_path, z=z, z_method="shuffle", resume=True, n_jobs=2, **kwargs
+    )
+    np.testing.assert_array_equal(
+        expected, np.load(tmp_path / "shard-00001.npz")["z"]
+    )
+
+    # but not with another redshift sample or method
+    with pytest.raises(ValueError, match="z_sha256"):
+        cli.generate_shards(
+            tmp_path, z=z + 0.1, z_method="shuffle", resume=True, **kwargs
+        )
+    with pytest.raises(ValueError, match="z_method"):
+        cli.generate_shards(
+            tmp_path, z=z, z_method="histogram", resume=True, **kwargs
+        )
+
+
+def test_cli_generate_z_method(tmp_path):
+    z_file = tmp_path / "z.npy"
+    np.save(z_file, np.random.default_rng(42).normal(0.5, 0.1, size=500))
+    out = tmp_path / "run"
+    argv = ["generate", str(out), "--dr", "DR14", "--catalog", "LRG_S"]
+    argv += ["--size", "100", "--seed", "7", "--z-file", str(z_file)]
+
+    assert cli.main(argv + ["--z-method", "shuffle"]) == 0
+    shard = np.load(out / "shard-00000.npz")
+    assert np.all(np.isin(shard["z"], np.load(z_file)))
+    with pytest.raises(SystemExit):
+        cli.create_parser().parse_args(argv + ["--z-method", "spline"])
+
+
+def test_cli_serve_footprint():
+    parser = cli.create_parser()
+    args = parser.parse_args(["serve", "--footprint", "DR14/LRG_N"])
+    assert args.footprint == [("DR14", "LRG_N")]
+
+    with pytest.raises(SystemExit):
+        parser.parse_args(["serve", "--footprint", "DR14"])
+
+
+# ============================================================================
+# TEST SERVER
+# ============================================================================
+
+
+@pytest.fixture(params=["tcp", "unix"])
+def footprint_server(request, tmp_path):
+    unix_socket = (
+        tmp_path / "randomsdss.sock" if request.param == "unix" else None
+    )
+    httpd = server.make_server(
+        footprints=[("DR14", "LRG_N")], port=0, unix_socket=unix_socket
+    )
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+
+
+def test_server_footprints(footprint_server):
+    client = server.Client(footprint_server.url)
+    remote = client.DR("DR14", "LRG_N")
+    local = footprint_server.footprints[("DR14", "LRG_N")]
+
+    assert client.footprints() == [("DR14", "LRG_N")]
+    assert remote.npoly == local.npoly
+    assert remote.area == pytest.approx(local.area)
+
+
+def test_server_sky_random(footprint_server):
+    remote = server.Client(footprint_server.url).DR("DR14", "LRG_N")
+    local = footprint_server.footprints[("DR14", "LRG_N")]
+
+    ra, dec = remote.sky_random(500, seed=3, method="sobol", dtype=np.float32)
+    expected = local.sky_random(500, seed=3, method="sobol", dtype=np.float32)
+    np.testing.assert_array_equal(ra, expected[0])
+    np.testing.assert_array_equal(dec, expected[1])
+
+    x, y, z = remote.box_random(180, 200, 30, 40, size=20, output="xyz")
+    np.testing.assert_allclose(x**2 + y**2 + z**2, 1.0)
+
+    ra, dec = remote.sky_random(500, weighted=True)
+    assert ra.dtype == np.float64
+    assert np.all(local.weight(ra, dec) > 0)
+
+
+def test_server_points(footprint_server):
+    remote = server.Client(footprint_server.url).DR("DR14", "LRG_N")
+    local = footprint_server.footprints[("DR14", "LRG_N")]
+    rng = np.random.default_rng(1)
+    ra, dec = 360 * rng.random(1000), 90 * rng.random(1000)
+
+    np.testing.assert_array_equal(
+        remote.contains(ra, dec), local.contains(ra, dec)
+    )
+    np.testing.assert_array_equal(
+        remote.polyid(ra, dec), local.polyid(ra, dec)
+    )
+    polyid, weight = remote.polyid_and_weight(ra, dec)
+    np.testing.assert_array_equal(weight, local.weight(ra, dec))
+
+
+def test_server_errors(footprint_server):
+    client = server.Client(footprint_server.url)
+    with pytest.raises(ValueError, match="404"):
+        client.DR("DR14", "LRG_S")
+
+    remote = client.DR("DR14", "LRG_N")
+    with pytest.raises(ValueError, match="400.*method"):
+        remote.sky_random(10, seed=0, method="bad")
+    with pytest.raises(ValueError, match="dtype"):
+        remote.sky_random(10, dtype=np.int64)
+    with pytest.raises(TypeError):
+        remote.sky_random(10, seed=np.random.SeedSequence(0))
+    # the connection is still usable after the errors
+    assert len(remote.sky_random(10)[0]) == 10
+
+
+def test_server_bad_payload(footprint_server, monkeypatch):
+    client = server.Client(footprint_server.url)
+    path = "/DR14/LRG_N/contains"
+    for body in [b"PK\x03\x04garbage", b"", b"not an archive"]:
+        with pytest.raises(ValueError, match="400"):
+            client.request("POST", path, body=body)
+    with pytest.raises(ValueError, match="400.*npz"):
+        client.request("POST", path, body=b"PK\x03\x04garbage")
+    with pytest.raises(ValueError, match="400"):
+        client.request("POST", path, body=server.encode_arrays(np.ones(3)))
+    objects = np.array([None, 1], dtype=object)
+    with pytest.raises(ValueError, match="400"):
+        client.request(
+            "POST", path, body=server.encode_arrays(objects, objects)
+        )
+
+    local = footprint_server.footprints[("DR14", "LRG_N")]
+
+    def fail(ra, dec):
+        raise RuntimeError("broken")
+
+    monkeypatch.setattr(local, "contains", fail)
+    with pytest.raises(ValueError, match="500.*broken"):
+        client.DR("DR14", "LRG_N").contains([10.0], [20.0])
+    assert len(client.DR("DR14", "LRG_N").polyid([10.0], [20.0])) == 1
+
+
+# ============================================================================
+# TEST IMPORT
+# ============================================================================
+
+
+def test_import_defers_dependencies():
+    code = (
+        "import sys, randomsdss; "
+        "print(*[m for m in ('scipy', 'pymangle', 'asyncio') "
+        "if m in sys.modules])"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=PATH,
+    )
+    assert result.stdout.strip() == ""
+
+
+def test_import_time_budget():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import randomsdss"],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=PATH,
+    )
+    total = re.search(r"\|\s*(\d+) \| randomsdss$", result.stderr, re.M)
+    assert int(total.group(1)) * 1e-6 < IMPORT_TIME_BUDGET